@@ -0,0 +1,390 @@
+"""
+Load generator that replays incident streams against the API.
+
+Incidents arrive as an open-loop Poisson process at --rate per second (with an
+optional surge window at --surge-factor times the rate). Each arrival reports
+an incident (POST /api/incidents) and, with probability --plan-ratio, requests
+an action plan (POST /generate-plan). Meanwhile --dashboards virtual dashboards
+poll the endpoints the frontend polls. Incident inputs are replayed from
+data/incidents.json and the plan archive, or synthesized with --synthetic.
+
+Reports throughput, latency percentiles, status codes and error rates per
+endpoint, plus SQLite lock contention ("database is locked" responses, and in
+--in-process mode also logged lock errors), to stdout and a JSON file.
+
+Usage (from backend/):
+    python benchmarks/load_replay.py --url http://localhost:5001 --rate 5 --duration 60
+    python benchmarks/load_replay.py --in-process --rate 20 --duration 30 --surge-factor 5
+"""
+import os
+import sys
+import json
+import time
+import glob
+import random
+import shutil
+import sqlite3
+import logging
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from routing_benchmark import BACKEND_DIR, INCIDENT_LAT, INCIDENT_LON, summarize, _git_commit
+
+DEFAULT_OUT = os.path.join(BACKEND_DIR, "benchmarks", "results", "load_replay.json")
+DASHBOARD_ENDPOINTS = ["/api/hospitals", "/api/alerts/recent", "/api/incidents/latest", "/status", "/health"]
+SCENARIOS = (1, 2, 3, 4)
+LOCK_MARKER = "database is locked"
+
+
+# -----------------------------------------------------------------------------
+# Incident sources
+# -----------------------------------------------------------------------------
+def _scenario_id(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return 1
+    return value if value in SCENARIOS else 1
+
+
+def load_replay_incidents():
+    """Incident inputs from data/incidents.json and archived plans (location, critical, stable, scenario)."""
+    incidents = []
+    path = os.path.join(BACKEND_DIR, "data", "incidents.json")
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for item in json.load(f):
+                incidents.append({
+                    "location": item.get("location", "Marine Drive"),
+                    "critical": int(item.get("critical", 0) or 0),
+                    "stable": int(item.get("stable", item.get("patients", 1)) or 0),
+                    "scenario": 1,
+                })
+
+    plans_dir = os.getenv("PLANS_DIR", os.path.join(BACKEND_DIR, "plans"))
+    archive = os.path.join(plans_dir, "plan_archive.db")
+    if os.path.exists(archive):
+        conn = sqlite3.connect(archive)
+        try:
+            rows = conn.execute(
+                "SELECT location, total_critical, total_stable, scenario FROM plans ORDER BY id DESC LIMIT 5000"
+            ).fetchall()
+        finally:
+            conn.close()
+        incidents += [
+            {"location": loc or "Marine Drive", "critical": crit or 0, "stable": stab or 0,
+             "scenario": _scenario_id(scen)}
+            for loc, crit, stab, scen in rows
+        ]
+    else:
+        for path in sorted(glob.glob(os.path.join(plans_dir, "routing_*.json")))[-5000:]:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    plan = json.load(f)
+            except (OSError, ValueError):
+                continue
+            incidents.append({
+                "location": plan.get("incident_location") or "Marine Drive",
+                "critical": int(plan.get("total_critical") or 0),
+                "stable": int(plan.get("total_stable") or 0),
+                "scenario": _scenario_id(plan.get("scenario")),
+            })
+    return incidents
+
+
+def synthetic_incident(rng):
+    """Mostly small incidents with a heavy tail of mass-casualty events."""
+    total = min(500, max(1, int(rng.paretovariate(1.3))))
+    critical = int(round(total * rng.uniform(0.1, 0.5)))
+    return {
+        "location": rng.choice(["Marine Drive", "Dadar", "Andheri", "Bandra", "Kurla", "Colaba", "Thane"]),
+        "critical": critical,
+        "stable": total - critical,
+        "scenario": rng.choice(SCENARIOS),
+    }
+
+
+# -----------------------------------------------------------------------------
+# Targets
+# -----------------------------------------------------------------------------
+class HttpTarget:
+    def __init__(self, base_url, timeout):
+        import requests
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+        self._requests = requests
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        return session
+
+    def request(self, method, path, body=None):
+        resp = self._session().request(method, self.base_url + path, json=body, timeout=self.timeout)
+        return resp.status_code, resp.text
+
+
+class InProcessTarget:
+    """The Flask app via its test client, on a scratch database and plans directory."""
+
+    def __init__(self, workdir):
+        os.environ.setdefault("WARMUP_ON_START", "0")
+        os.environ["PLANS_DIR"] = os.path.join(workdir, "plans")
+        os.environ["PLAN_ARCHIVE_PATH"] = os.path.join(workdir, "plans", "plan_archive.db")
+        os.environ["TRACE_EXPORT_PATH"] = os.path.join(workdir, "spans.jsonl")
+        os.makedirs(os.environ["PLANS_DIR"], exist_ok=True)
+
+        from src import database
+        database.DB_PATH = os.path.join(workdir, "hospital.db")
+        from src import step5_agent_logic as step5
+        step5.geocode_location = lambda address, *a, **k: (INCIDENT_LAT, INCIDENT_LON)
+        from src import app as app_module
+        app_module.forecast_service.stop()
+        self.app_module = app_module
+        self.app = app_module.app
+
+    def request(self, method, path, body=None):
+        # one client per call: the test client is not meant to be shared across threads
+        resp = self.app.test_client().open(path, method=method, json=body)
+        return resp.status_code, resp.get_data(as_text=True)
+
+    def close(self):
+        self.app_module.simulation.stop()
+        self.app_module.history_maintainer.stop()
+        self.app_module.simulation_lease.stop()
+
+
+class _LockLogCounter(logging.Handler):
+    """Counts server-side log records that mention SQLite lock errors."""
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.count = 0
+
+    def emit(self, record):
+        if LOCK_MARKER in record.getMessage():
+            self.count += 1
+
+
+# -----------------------------------------------------------------------------
+# Runner
+# -----------------------------------------------------------------------------
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+        self.lock_errors = defaultdict(int)
+        self.lag = []  # how late requests started vs their scheduled arrival (client saturation)
+
+    def record(self, name, latency, status, body, lag=None):
+        with self._lock:
+            self.latencies[name].append(latency)
+            self.statuses[name][str(status)] += 1
+            if status == "exception" or (isinstance(status, int) and status >= 500):
+                self.errors[name] += 1
+            if body and LOCK_MARKER in body:
+                self.lock_errors[name] += 1
+            if lag is not None:
+                self.lag.append(lag)
+
+
+def _call(target, recorder, name, method, path, body=None, scheduled=None):
+    start = time.perf_counter()
+    lag = start - scheduled if scheduled is not None else None
+    try:
+        status, text = target.request(method, path, body)
+    except Exception as e:
+        status, text = "exception", str(e)
+    recorder.record(name, time.perf_counter() - start, status, text, lag)
+
+
+def _incident_requests(incident, rng, plan_ratio, async_plans):
+    patients = incident["critical"] + incident["stable"]
+    report = {
+        "location": incident["location"],
+        "latitude": INCIDENT_LAT + rng.gauss(0, 0.05),
+        "longitude": INCIDENT_LON + rng.gauss(0, 0.05),
+        "patient_count": max(1, patients),
+        "severity": "Critical" if incident["critical"] else "Stable",
+        "booking_type": "Emergency",
+    }
+    calls = [("POST /api/incidents", "POST", "/api/incidents", report)]
+    if rng.random() < plan_ratio:
+        plan = {
+            "location": incident["location"],
+            "critical_patients": incident["critical"],
+            "stable_patients": incident["stable"],
+            "scenario": incident["scenario"],
+        }
+        if async_plans:
+            plan["async"] = True
+        calls.append(("POST /generate-plan", "POST", "/generate-plan", plan))
+    return calls
+
+
+def run_load(target, incidents, args, log):
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    pool = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="load")
+    stop = threading.Event()
+    t0 = time.perf_counter()
+
+    def rate_at(elapsed):
+        in_surge = args.surge_at is not None and args.surge_at <= elapsed < args.surge_at + args.surge_duration
+        return args.rate * (args.surge_factor if in_surge else 1.0)
+
+    def dashboard(idx):
+        drng = random.Random(args.seed + idx + 1)
+        time.sleep(drng.uniform(0, args.poll_interval))
+        while not stop.is_set():
+            for path in DASHBOARD_ENDPOINTS:
+                _call(target, recorder, f"GET {path}", "GET", path)
+            stop.wait(args.poll_interval)
+
+    pollers = [threading.Thread(target=dashboard, args=(i,), daemon=True) for i in range(args.dashboards)]
+    for t in pollers:
+        t.start()
+
+    arrivals = 0
+    next_at = 0.0
+    while True:
+        next_at += rng.expovariate(max(rate_at(next_at), 1e-9))
+        if next_at >= args.duration:
+            break
+        delay = t0 + next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        incident = rng.choice(incidents) if incidents and not args.synthetic else synthetic_incident(rng)
+        for name, method, path, body in _incident_requests(incident, rng, args.plan_ratio, args.async_plans):
+            pool.submit(_call, target, recorder, name, method, path, body, t0 + next_at)
+        arrivals += 1
+        if arrivals % max(1, int(args.rate * 10)) == 0:
+            log(f"  t={next_at:5.1f}s arrivals={arrivals}")
+
+    stop.set()
+    pool.shutdown(wait=True)
+    for t in pollers:
+        t.join()
+    return recorder, arrivals, time.perf_counter() - t0
+
+
+def build_report(recorder, arrivals, elapsed, args, server_lock_logs, incident_source):
+    endpoints = {}
+    for name, lat in sorted(recorder.latencies.items()):
+        count = len(lat)
+        endpoints[name] = {
+            **summarize(lat),
+            "throughput_rps": round(count / elapsed, 2),
+            "errors": recorder.errors[name],
+            "error_rate": round(recorder.errors[name] / count, 4) if count else 0.0,
+            "lock_errors": recorder.lock_errors[name],
+            "status_codes": dict(recorder.statuses[name]),
+        }
+    total = sum(len(v) for v in recorder.latencies.values())
+    lag_ms = sorted(l * 1000 for l in recorder.lag)
+    return {
+        "benchmark": "load_replay",
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "target": "in-process" if args.in_process else args.url,
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "verbose")},
+        "incident_source": incident_source,
+        "elapsed_s": round(elapsed, 2),
+        "arrivals": arrivals,
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "errors": sum(recorder.errors.values()),
+        "sqlite_lock_contention": {
+            "locked_responses": sum(recorder.lock_errors.values()),
+            "server_lock_log_records": server_lock_logs,
+        },
+        "client_start_lag_ms": {
+            "p50": round(lag_ms[len(lag_ms) // 2], 2) if lag_ms else None,
+            "p99": round(lag_ms[min(len(lag_ms) - 1, int(len(lag_ms) * 0.99))], 2) if lag_ms else None,
+        },
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report, log):
+    log(f"\n{report['requests']} requests in {report['elapsed_s']}s "
+        f"({report['throughput_rps']} req/s, {report['arrivals']} incidents, {report['errors']} errors)")
+    log(f"{'endpoint':<28}{'count':>7}{'rps':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}{'err%':>7}{'locked':>8}")
+    for name, e in report["endpoints"].items():
+        log(f"{name:<28}{e['n']:>7}{e['throughput_rps']:>8}{e['p50_ms']:>9.1f}{e['p90_ms']:>9.1f}"
+            f"{e['p99_ms']:>9.1f}{e['max_ms']:>9.1f}{e['error_rate'] * 100:>7.2f}{e['lock_errors']:>8}")
+    lock = report["sqlite_lock_contention"]
+    log(f"SQLite lock contention: {lock['locked_responses']} locked responses, "
+        f"{lock['server_lock_log_records']} server lock log records")
+    lag = report["client_start_lag_ms"]
+    log(f"Client start lag p50={lag['p50']}ms p99={lag['p99']}ms (high values: raise --concurrency)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay incident streams against the API.")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://localhost:5001", help="base URL of a running API")
+    target.add_argument("--in-process", action="store_true", help="drive the Flask app in this process (scratch DB)")
+    parser.add_argument("--rate", type=float, default=2.0, help="incident arrivals per second (Poisson)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of arrivals")
+    parser.add_argument("--surge-at", type=float, default=None, help="start of a surge window (seconds)")
+    parser.add_argument("--surge-duration", type=float, default=10.0, help="length of the surge window (seconds)")
+    parser.add_argument("--surge-factor", type=float, default=5.0, help="rate multiplier during the surge")
+    parser.add_argument("--plan-ratio", type=float, default=0.3, help="share of incidents that also request a plan")
+    parser.add_argument("--async-plans", action="store_true", help="request plans with async=true")
+    parser.add_argument("--dashboards", type=int, default=5, help="concurrent polling dashboards")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="seconds between dashboard polls")
+    parser.add_argument("--concurrency", type=int, default=32, help="max in-flight incident requests")
+    parser.add_argument("--timeout", type=float, default=60.0, help="HTTP timeout (seconds)")
+    parser.add_argument("--synthetic", action="store_true", help="synthesize incidents instead of replaying")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=DEFAULT_OUT, help="JSON report path")
+    parser.add_argument("--verbose", action="store_true", help="show pipeline prints (--in-process)")
+    args = parser.parse_args(argv)
+
+    def log(msg):
+        print(msg, file=sys.__stdout__, flush=True)
+
+    incidents = [] if args.synthetic else load_replay_incidents()
+    source = "synthetic" if not incidents else f"replay ({len(incidents)} incidents)"
+    log(f"Incident source: {source}")
+
+    lock_counter = None
+    workdir = None
+    if args.in_process:
+        workdir = tempfile.mkdtemp(prefix="load-replay-")
+        lock_counter = _LockLogCounter()
+        logging.getLogger().addHandler(lock_counter)
+        target = InProcessTarget(workdir)
+        logging.getLogger().setLevel(logging.WARNING)
+    else:
+        target = HttpTarget(args.url, args.timeout)
+
+    try:
+        with redirect_stdout(sys.stdout if args.verbose else open(os.devnull, "w")):
+            recorder, arrivals, elapsed = run_load(target, incidents, args, log)
+    finally:
+        if args.in_process:
+            target.close()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = build_report(recorder, arrivals, elapsed, args, lock_counter.count if lock_counter else None, source)
+    print_report(report, log)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    log(f"Wrote report to {args.out}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Offline benchmark for the routing pipeline.
+
+Times predict_surges, build_travel_minutes_from_geo, optimize_routing and the
+end-to-end /generate-plan request on synthetic snapshots of increasing size,
+and writes percentiles plus peak traced memory to a JSON file so runs can be
+compared before deploying.
+
+Synthetic snapshots replicate rows of dataset/clean_snapshot.csv (after
+feature engineering) with jittered load and coordinates, so every column the
+models and scorers read is present. Geocoding is stubbed and nothing touches
+the network; the end-to-end run uses a throwaway database and plans
+directory.
+
+Usage (from backend/):
+    python benchmarks/routing_benchmark.py
+    python benchmarks/routing_benchmark.py --sizes 10,100 --patients 1,50 --repeat 3 --out /tmp/bench.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+DEFAULT_PATIENTS = (1, 10, 100, 500)
+DEFAULT_OUT = os.path.join(BACKEND_DIR, "benchmarks", "results", "routing_benchmark.json")
+
+INCIDENT_LOCATION = "Benchmark Junction"
+INCIDENT_LAT, INCIDENT_LON = 19.0330, 72.8440
+CRITICAL_SHARE = 0.3
+
+
+def synthetic_snapshot(template: pd.DataFrame, n: int, seed: int = 0) -> pd.DataFrame:
+    """n hospitals built from template rows with jittered coordinates and load."""
+    rng = np.random.default_rng(seed)
+    df = template.iloc[rng.integers(0, len(template), n)].reset_index(drop=True).copy()
+    df["hospital_id"] = [f"B{i:05d}" for i in range(n)]
+    df["hospital_name"] = [f"Bench Hospital {i}" for i in range(n)]
+    df["latitude"] = INCIDENT_LAT + rng.normal(0, 0.08, n)
+    df["longitude"] = INCIDENT_LON + rng.normal(0, 0.08, n)
+    for col in ("admission", "occupied", "icu_occup", "ventilators_used", "trauma_cases"):
+        if col in df.columns:
+            jitter = rng.normal(1.0, 0.15, n).clip(0.5, 1.5)
+            df[col] = (pd.to_numeric(df[col], errors="coerce").fillna(0) * jitter).round()
+    if "occupied" in df.columns and "total_beds" in df.columns:
+        df["occupied"] = np.minimum(df["occupied"], df["total_beds"])
+    return df
+
+
+def summarize(samples_s):
+    ms = np.asarray(samples_s) * 1000.0
+    return {
+        "n": int(len(ms)),
+        "mean_ms": round(float(ms.mean()), 3),
+        "min_ms": round(float(ms.min()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def measure(fn, repeat, warmup=1):
+    """Time fn() `repeat` times, then run it once more under tracemalloc for the peak."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {**summarize(samples), "peak_mem_kb": round(peak / 1024, 1)}
+
+
+def split_patients(total):
+    critical = int(round(total * CRITICAL_SHARE))
+    return critical, total - critical
+
+
+def bench_pipeline(step5, template, sizes, patients, repeat, log):
+    results = []
+    for n in sizes:
+        latest = synthetic_snapshot(template, n)
+        travel, distances = step5.build_travel_minutes_from_geo(latest, INCIDENT_LAT, INCIDENT_LON)
+
+        cases = [
+            ("predict_surges", None, lambda: step5.predict_surges(latest.copy())),
+            ("build_travel_minutes_from_geo", None,
+             lambda: step5.build_travel_minutes_from_geo(latest, INCIDENT_LAT, INCIDENT_LON)),
+        ]
+        for total in patients:
+            crit, stable = split_patients(total)
+            cases.append((
+                "optimize_routing", total,
+                lambda crit=crit, stable=stable: step5.optimize_routing(
+                    latest, crit, stable, INCIDENT_LOCATION, travel, distances
+                ),
+            ))
+
+        for name, total, fn in cases:
+            stats = measure(fn, repeat)
+            results.append({"name": name, "hospitals": n, "patients": total, **stats})
+            log(f"{name:<32} hospitals={n:<6} patients={str(total or '-'):<4} "
+                f"p50={stats['p50_ms']:.1f}ms p90={stats['p90_ms']:.1f}ms peak={stats['peak_mem_kb']:.0f}KB")
+    return results
+
+
+def _use_workdir(workdir):
+    """
+    Point the app's plans, plan archive and span export at `workdir`. These
+    are read when the src modules are imported, so call this before any of them.
+    """
+    os.environ.setdefault("WARMUP_ON_START", "0")
+    os.environ["PLANS_DIR"] = os.path.join(workdir, "plans")
+    os.environ["PLAN_ARCHIVE_PATH"] = os.path.join(workdir, "plans", "plan_archive.db")
+    os.environ["TRACE_EXPORT_PATH"] = os.path.join(workdir, "spans.jsonl")
+    os.makedirs(os.environ["PLANS_DIR"], exist_ok=True)
+
+
+def bench_end_to_end(step5, template, sizes, patients, repeat, log, workdir):
+    """POST /generate-plan through the Flask test client against a scratch DB/plans dir."""
+    from src import database
+    database.DB_PATH = os.path.join(workdir, "hospital.db")
+    from src import app as app_module
+    from src.plan_archive import plan_writer
+    from src.tracing import collector as trace_collector
+    # only the request path should be measured
+    app_module.simulation.stop()
+    app_module.forecast_service.stop()
+    app_module.history_maintainer.stop()
+    client = app_module.app.test_client()
+
+    results = []
+    for n in sizes:
+        latest = synthetic_snapshot(template, n)
+        step5.load_latest_snapshot = lambda latest=latest: latest
+        for total in patients:
+            crit, stable = split_patients(total)
+            body = {
+                "location": INCIDENT_LOCATION, "critical_patients": crit,
+                "stable_patients": stable, "scenario": 1, "refresh": True,
+            }
+
+            def request_plan():
+                resp = client.post("/generate-plan", json=body)
+                if resp.status_code != 200:
+                    raise RuntimeError(f"/generate-plan returned {resp.status_code}: {resp.get_json()}")
+
+            stats = measure(request_plan, repeat)
+            plan_writer.flush()
+            results.append({"name": "generate_plan_e2e", "hospitals": n, "patients": total, **stats})
+            log(f"{'generate_plan_e2e':<32} hospitals={n:<6} patients={total:<4} "
+                f"p50={stats['p50_ms']:.1f}ms p90={stats['p90_ms']:.1f}ms peak={stats['peak_mem_kb']:.0f}KB")
+    # release the lease while the scratch database still exists, and finish
+    # exporting spans before the workdir is removed
+    app_module.simulation_lease.stop()
+    trace_collector.flush()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the routing pipeline offline.")
+    parser.add_argument("--sizes", type=_int_list, default=list(DEFAULT_SIZES), help="hospital counts, comma separated")
+    parser.add_argument("--patients", type=_int_list, default=list(DEFAULT_PATIENTS), help="patients per incident, comma separated")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--skip-e2e", action="store_true", help="skip the /generate-plan end-to-end cases")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="JSON results path")
+    parser.add_argument("--verbose", action="store_true", help="show pipeline prints")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="routing-bench-")
+    _use_workdir(workdir)
+    from src import step5_agent_logic as step5
+
+    # Offline: fixed incident coordinates, deterministic traffic fallback
+    step5.geocode_location = lambda address, *a, **k: (INCIDENT_LAT, INCIDENT_LON)
+    np.random.seed(0)
+
+    template = step5.load_latest_snapshot()
+    step5.load_model_and_features()
+
+    def log(msg):
+        print(msg, file=sys.__stdout__, flush=True)
+
+    started = time.perf_counter()
+    try:
+        with redirect_stdout(sys.stdout if args.verbose else open(os.devnull, "w")):
+            results = bench_pipeline(step5, template, args.sizes, args.patients, args.repeat, log)
+            if not args.skip_e2e:
+                results += bench_end_to_end(step5, template, args.sizes, args.patients, args.repeat, log, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "routing",
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "config": {"sizes": args.sizes, "patients": args.patients, "repeat": args.repeat,
+                   "e2e": not args.skip_e2e, "template_rows": len(template)},
+        "duration_s": round(time.perf_counter() - started, 2),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    log(f"Wrote {len(results)} results to {args.out}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
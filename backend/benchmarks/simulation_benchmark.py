@@ -0,0 +1,153 @@
+"""
+Benchmark for the vectorized hospital simulator.
+
+Times one simulation tick (simulation.step_state: the transition model plus a
+batched model prediction for the changed hospitals) on synthetic cities of
+increasing size, and the live loop's full step (read hospital_load, one
+incoming-count query, step, bulk update) against a throwaway database. Writes
+percentiles and the highest tick rate each size sustains to a JSON file.
+
+Usage (from backend/):
+    python benchmarks/simulation_benchmark.py
+    python benchmarks/simulation_benchmark.py --sizes 1000,10000,100000 --repeat 50 --skip-db
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+from routing_benchmark import BACKEND_DIR, INCIDENT_LAT, INCIDENT_LON, summarize, _git_commit, _int_list
+
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+DEFAULT_OUT = os.path.join(BACKEND_DIR, "benchmarks", "results", "simulation_benchmark.json")
+
+
+def synthetic_rows(n, seed=0):
+    """n hospital_load rows with plausible load around the benchmark incident."""
+    rng = np.random.default_rng(seed)
+    total_beds = rng.integers(50, 300, n)
+    return [
+        {
+            "hospital_id": f"S{i:06d}",
+            "hospital_name": f"Sim Hospital {i}",
+            "latitude": float(lat),
+            "longitude": float(lon),
+            "er_admissions": int(er),
+            "bed_availability": int(beds),
+            "ambulance_arrivals": int(amb),
+            "staff_capacity": int(staff),
+            "total_beds": int(total),
+            "status": "Green",
+        }
+        for i, (lat, lon, er, beds, amb, staff, total) in enumerate(zip(
+            INCIDENT_LAT + rng.normal(0, 0.08, n), INCIDENT_LON + rng.normal(0, 0.08, n),
+            rng.integers(0, 200, n), rng.integers(0, 50, n), rng.integers(0, 15, n),
+            rng.integers(50, 150, n), total_beds,
+        ))
+    ]
+
+
+def bench_steps(sizes, repeat, log):
+    from src.simulation import SimulationState, step_state
+
+    results = []
+    for n in sizes:
+        state = SimulationState.from_rows(synthetic_rows(n))
+        incoming = np.zeros(n, dtype=np.int64)
+        rng = np.random.default_rng(0)
+        step_state(state, incoming, rng, hour=12)  # warm-up (model load)
+        samples, changed = [], 0
+        for tick in range(repeat):
+            start = time.perf_counter()
+            idx, _ = step_state(state, incoming, rng, hour=tick % 24)
+            samples.append(time.perf_counter() - start)
+            changed += idx.size
+        stats = summarize(samples)
+        results.append({
+            "case": "step_state", "hospitals": n, **stats,
+            "changed_per_tick": round(changed / repeat, 1),
+            "max_ticks_per_s": round(1000.0 / stats["p90_ms"], 1) if stats["p90_ms"] else None,
+        })
+        log(f"step_state n={n}: p50 {stats['p50_ms']} ms, p90 {stats['p90_ms']} ms")
+    return results
+
+
+def bench_live_step(sizes, repeat, log, workdir):
+    from src import database
+    from src.simulation import HospitalSimulation
+
+    database.DB_PATH = os.path.join(workdir, "hospital.db")
+    results = []
+    for n in sizes:
+        if os.path.exists(database.DB_PATH):
+            os.remove(database.DB_PATH)
+        database.seed_default_hospitals = lambda: 0  # init_db seeds an empty table otherwise
+        database.HOSPITAL_CSV_PATH = os.path.join(workdir, "missing.csv")
+        database.init_db()
+        conn = database.get_db_connection()
+        with conn:
+            conn.executemany(database._UPSERT_SQL, [
+                tuple(row[c] for c, _ in database._SEED_COLUMNS) + (datetime.now(),) for row in synthetic_rows(n)
+            ])
+        conn.close()
+
+        sim = HospitalSimulation(seed=0)
+        sim._simulate_step()  # warm-up
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            sim._simulate_step()
+            samples.append(time.perf_counter() - start)
+        stats = summarize(samples)
+        results.append({"case": "live_step", "hospitals": n, **stats})
+        log(f"live_step n={n}: p50 {stats['p50_ms']} ms, p90 {stats['p90_ms']} ms")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized hospital simulator.")
+    parser.add_argument("--sizes", type=_int_list, default=list(DEFAULT_SIZES), help="hospital counts, comma separated")
+    parser.add_argument("--repeat", type=int, default=20, help="timed ticks per size")
+    parser.add_argument("--skip-db", action="store_true", help="skip the live step against SQLite")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="JSON results path")
+    args = parser.parse_args(argv)
+
+    def log(msg):
+        print(msg, file=sys.__stdout__, flush=True)
+
+    workdir = tempfile.mkdtemp(prefix="simulation-bench-")
+    started = time.perf_counter()
+    try:
+        results = bench_steps(args.sizes, args.repeat, log)
+        if not args.skip_db:
+            results += bench_live_step(args.sizes, args.repeat, log, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "simulation",
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "config": {"sizes": args.sizes, "repeat": args.repeat, "db": not args.skip_db},
+        "duration_s": round(time.perf_counter() - started, 2),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    log(f"Wrote {len(results)} results to {args.out}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
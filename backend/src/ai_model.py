@@ -1,81 +1,181 @@
-import lightgbm as lgb
-import pandas as pd
 import numpy as np
 import os
+import threading
 import logging
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# lightgbm (and the sklearn/scipy stack it pulls in) and pandas are imported on
+# first use so importing the API stays cheap; warmup() loads them in the background.
+
 MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "lgb_model.txt")
+FEATURES = ['er_admissions', 'bed_availability', 'ambulance_arrivals', 'staff_capacity', 'hour']
+# Train on recorded load history once there is at least this much of it
+MIN_HISTORY_SAMPLES = int(os.getenv("MIN_HISTORY_SAMPLES", "500"))
 model = None
 
-def train_model():
-    """Train a simple LightGBM model on dummy data if no model exists."""
-    global model
-    
-    # Generate dummy historical data
-    logger.info("Training LightGBM model...")
-    data = []
-    for _ in range(1000):
-        er = random.randint(0, 200)
-        beds = random.randint(0, 100)
-        amb = random.randint(0, 20)
-        staff = random.randint(50, 150)
-        hour = random.randint(0, 23)
-        
-        # Target: Future ER admissions (simple formula for demo)
-        target = er * 0.8 + (100 - beds) * 0.5 + amb * 2 + (200 - staff) * 0.2
-        if hour > 18 or hour < 6: # Night time surge
-            target *= 1.1
-            
-        data.append([er, beds, amb, staff, hour, target])
-        
-    df = pd.DataFrame(data, columns=['er_admissions', 'bed_availability', 'ambulance_arrivals', 'staff_capacity', 'hour', 'target'])
-    
-    X = df.drop('target', axis=1)
+# Guards loading/swapping of the global booster; predictions only read the reference
+_model_lock = threading.Lock()
+# Serializes training so a background retrain and a first-use train don't overlap
+_train_lock = threading.RLock()
+
+def build_training_frame(n_rows=1000, seed=None):
+    """Generate dummy historical data (vectorized)."""
+    rng = np.random.default_rng(seed)
+    er = rng.integers(0, 201, n_rows)
+    beds = rng.integers(0, 101, n_rows)
+    amb = rng.integers(0, 21, n_rows)
+    staff = rng.integers(50, 151, n_rows)
+    hour = rng.integers(0, 24, n_rows)
+
+    # Target: Future ER admissions (simple formula for demo)
+    target = er * 0.8 + (100 - beds) * 0.5 + amb * 2 + (200 - staff) * 0.2
+    night = (hour > 18) | (hour < 6)  # Night time surge
+    target = np.where(night, target * 1.1, target)
+
+    import pandas as pd
+    return pd.DataFrame({
+        'er_admissions': er, 'bed_availability': beds, 'ambulance_arrivals': amb,
+        'staff_capacity': staff, 'hour': hour, 'target': target
+    })
+
+def build_history_frame(min_rows=None):
+    """
+    Training frame from real operational history (minute rollups; target is the
+    ER admissions average one hour later). Returns None if there is too little.
+    """
+    from .history import training_samples
+    try:
+        rows = training_samples()
+    except Exception as e:
+        logger.warning(f"Could not read load history: {e}")
+        return None
+    if len(rows) < (MIN_HISTORY_SAMPLES if min_rows is None else min_rows):
+        return None
+    import pandas as pd
+    df = pd.DataFrame(rows, columns=FEATURES + ['target'])
+    # shuffle so the 80/20 split below isn't split by time of day
+    return df.sample(frac=1.0, random_state=0).reset_index(drop=True)
+
+def validate_booster(booster, X_val, y_val):
+    """
+    Sanity-check a freshly trained booster on held-out rows.
+    Raises ValueError if predictions are not finite or no better than predicting the mean.
+    """
+    pred = booster.predict(X_val)
+    if not np.all(np.isfinite(pred)):
+        raise ValueError("Validation failed: model produced non-finite predictions")
+    rmse = float(np.sqrt(np.mean((pred - y_val) ** 2)))
+    baseline = float(np.sqrt(np.mean((y_val - y_val.mean()) ** 2)))
+    if rmse >= baseline:
+        raise ValueError(f"Validation failed: RMSE {rmse:.2f} is not better than baseline {baseline:.2f}")
+    return {"val_rmse": rmse, "baseline_rmse": baseline}
+
+def _fit(df, report):
+    """Train a booster on the first 80% of `df` and validate it on the rest."""
+    import lightgbm as lgb
+    X = df[FEATURES]
     y = df['target']
-    
-    train_data = lgb.Dataset(X, label=y)
+    split = int(len(df) * 0.8)
+
+    report(0.2, "Training booster")
+    train_data = lgb.Dataset(X.iloc[:split], label=y.iloc[:split])
     params = {
         'objective': 'regression',
         'metric': 'rmse',
         'verbosity': -1
     }
-    
-    model = lgb.train(params, train_data, num_boost_round=100)
-    
-    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-    model.save_model(MODEL_PATH)
-    logger.info("Model trained and saved.")
+    booster = lgb.train(params, train_data, num_boost_round=100)
 
-def load_model():
+    report(0.8, "Validating")
+    return booster, validate_booster(booster, X.iloc[split:], y.iloc[split:].to_numpy())
+
+def train_model(progress=None):
+    """
+    Train the LightGBM congestion model, validate it and atomically swap it in.
+
+    The new booster replaces the global `model` (and the file on disk) only after
+    it passes validation; until then predictions keep using the previous one.
+    With no model yet, a history-trained booster that fails validation falls back
+    to synthetic data, so predictions always have a model to start from.
+    `progress` is an optional callback(fraction, message) used by background jobs.
+    """
     global model
-    if os.path.exists(MODEL_PATH):
-        model = lgb.Booster(model_file=MODEL_PATH)
-        logger.info("Loaded existing LightGBM model.")
-    else:
-        train_model()
+    report = progress or (lambda *_: None)
+
+    with _train_lock:
+        logger.info("Training LightGBM model...")
+        report(0.05, "Building training data")
+        df = build_history_frame()
+        source = "history"
+        if df is None:
+            df = build_training_frame()
+            source = "synthetic"
+        logger.info(f"Training on {len(df)} {source} rows")
 
-import random # Needed for training dummy data
+        try:
+            booster, metrics = _fit(df, report)
+        except ValueError as e:
+            if model is not None or os.path.exists(MODEL_PATH) or source != "history":
+                raise  # keep the previous model
+            logger.warning(f"History-trained model rejected ({e}); training on synthetic data instead")
+            df = build_training_frame()
+            source = "synthetic"
+            booster, metrics = _fit(df, report)
+
+        report(0.9, "Saving and activating model")
+        os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+        tmp_path = f"{MODEL_PATH}.{os.getpid()}.tmp"
+        booster.save_model(tmp_path)
+        with _model_lock:
+            os.replace(tmp_path, MODEL_PATH)
+            model = booster
+        logger.info(f"Model trained and saved (val RMSE {metrics['val_rmse']:.2f}).")
+        return {**metrics, "training_source": source, "training_rows": len(df)}
+
+def load_model():
+    global model
+    import lightgbm as lgb
+    with _model_lock:
+        if model is None and os.path.exists(MODEL_PATH):
+            model = lgb.Booster(model_file=MODEL_PATH)
+            logger.info("Loaded existing LightGBM model.")
+    if model is None:
+        with _train_lock:
+            if model is None:
+                train_model()
+    return model
 
-def predict_congestion(hospital_data):
+def predict_congestion(hospital_data, hour=None):
     """
     Predict congestion score based on hospital data.
     Returns a float representing predicted ER admissions.
+    `hour` defaults to the current wall-clock hour (virtual-time runs pass their own).
     """
-    global model
-    if not model:
-        load_model()
-        
+    # Take one reference so a concurrent retrain swap can't change it mid-call
+    booster = model or load_model()
+
     # Extract features
     features = [
         hospital_data.get('er_admissions', 0),
         hospital_data.get('bed_availability', 0),
         hospital_data.get('ambulance_arrivals', 0),
         hospital_data.get('staff_capacity', 100),
-        pd.Timestamp.now().hour # Current hour
+        datetime.now().hour if hour is None else hour # Current hour
     ]
-    
+
     # Reshape for prediction
-    prediction = model.predict([features])[0]
+    prediction = booster.predict([features])[0]
     return prediction
+
+def predict_congestion_batch(features):
+    """
+    Vectorized predict_congestion for many hospitals: an (n, 5) array of rows in
+    FEATURES order -> array of n predicted ER admissions, in one model call.
+    """
+    features = np.asarray(features, dtype=np.float64).reshape(-1, len(FEATURES))
+    if not len(features):
+        return np.empty(0)
+    booster = model or load_model()
+    return booster.predict(features)
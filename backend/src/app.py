@@ -1,15 +1,23 @@
 import logging
-from flask import Flask, request, jsonify
+import threading
+
+# Installed first so the startup profile covers every import below
+from .startup_profile import startup_profile
+startup_profile.install_import_timer()
+
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
 import json
 import os
+import re
+import hmac
+import time
 import traceback
 import traceback
 from datetime import datetime
-import math
 
 # Import the main controller function
-from .logic_controller import run_full_simulation
+from .logic_controller import generate_action_plan, warmup as warmup_plan_pipeline
 
 # Import new modules
 from .database import (
@@ -18,7 +26,22 @@ from .database import (
     get_latest_incident, update_hospital_data, get_all_recent_alerts
 )
 from .simulation import simulation
-from .ai_model import predict_congestion, train_model
+from .status_worker import status_worker
+from .coordinator import LeaseCoordinator
+from .ai_model import predict_congestion, train_model, load_model
+from .jobs import JobManager, QueueFull
+from .forecast_service import forecast_service
+from .history import init_history, query_history, HistoryMaintainer
+from .plan_cache import plan_cache
+from .dispatch import calculate_distance, select_hospital
+from .plan_archive import init_archive, count_plans, get_plan, query_plans, plan_writer
+from .log_buffer import install as install_log_buffer, log_buffer
+from .profiler import profiler, ProfilerBusy
+from .tracing import (
+    begin as begin_trace, finish as finish_trace, span, capture as capture_trace,
+    continue_trace, collector as trace_collector, new_id,
+)
+from .metrics import REGISTRY, GaugeFunction, HTTP_REQUEST_SECONDS, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # Configure logging
 logging.basicConfig(
@@ -28,13 +51,16 @@ logging.basicConfig(
         logging.StreamHandler()
     ]
 )
+# Keep recent records in memory for /api/logs
+install_log_buffer()
 logger = logging.getLogger(__name__)
 
 # Initialize the Flask application
 app = Flask(__name__)
 
 # Allow requests from your Vercel app and local development server
-CORS(app,supports_credentials=True, origins="https://healthhive2.vercel.app")
+CORS(app,supports_credentials=True, origins="https://healthhive2.vercel.app",
+     expose_headers=["X-Log-Cursor", "X-Log-Truncated", "X-Request-ID"])
 
 # Configuration
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))  # backend/src/
@@ -48,10 +74,138 @@ logger.info(f"Current directory (src): {CURRENT_DIR}")
 logger.info(f"Backend directory: {BACKEND_DIR}")
 logger.info(f"Plans directory: {PLANS_DIR}")
 
+# Background jobs (one retrain at a time; requests never wait on training)
+retrain_jobs = JobManager("retrain", max_workers=1)
+# Async /generate-plan: bounded worker pool and queue so a surge can't exhaust HTTP workers
+PLAN_WORKERS = int(os.getenv("PLAN_WORKERS", "4"))
+PLAN_QUEUE_SIZE = int(os.getenv("PLAN_QUEUE_SIZE", "32"))
+plan_jobs = JobManager("plan", max_workers=PLAN_WORKERS, history=500, max_queue=PLAN_QUEUE_SIZE)
+
+# One simulator per deployment: every worker runs the loop, only the lease holder steps
+simulation_lease = LeaseCoordinator("simulation")
+simulation.coordinator = simulation_lease
+history_maintainer = HistoryMaintainer(coordinator=simulation_lease)
+
+# Warm ML modules and models off the startup path (WARMUP_ON_START=0 to disable)
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "1") == "1"
+
+
+def _warmup():
+    for name, fn in (("warmup: congestion model", load_model), ("warmup: plan pipeline", warmup_plan_pipeline)):
+        try:
+            with startup_profile.section(name):
+                fn()
+        except Exception as e:
+            logger.warning(f"{name} failed: {e}")
+    startup_profile.uninstall_import_timer()
+    logger.info("Warmup finished.")
+
+
 # Initialize Database and Simulation
 with app.app_context():
-    init_db()
-    simulation.start()
+    with startup_profile.section("init_db"):
+        init_db()
+    with startup_profile.section("init_history"):
+        init_history()
+    with startup_profile.section("init_archive"):
+        init_archive()
+    with startup_profile.section("simulation lease"):
+        simulation_lease.start()
+    with startup_profile.section("start background services"):
+        simulation.start()
+        forecast_service.start()
+        history_maintainer.start()
+        status_worker.start()
+    startup_profile.mark_ready()
+    if WARMUP_ON_START:
+        threading.Thread(target=_warmup, name="warmup", daemon=True).start()
+    else:
+        startup_profile.uninstall_import_timer()
+
+# Background state sampled at scrape time
+REGISTRY.register(GaugeFunction(
+    "job_queue_depth", "Queued jobs per job manager.",
+    lambda: {(m.name,): m.stats()["queue_depth"] for m in (plan_jobs, retrain_jobs)}, ("jobs",),
+))
+REGISTRY.register(GaugeFunction(
+    "job_running", "Running jobs per job manager.",
+    lambda: {(m.name,): m.stats()["running"] for m in (plan_jobs, retrain_jobs)}, ("jobs",),
+))
+REGISTRY.register(GaugeFunction(
+    "plans_pending_write", "Plans queued for the background plan writer.", lambda: {(): plan_writer.pending()},
+))
+REGISTRY.register(GaugeFunction(
+    "simulation_leader", "1 if this worker holds the simulation lease.",
+    lambda: {(): int(simulation.is_active)},
+))
+REGISTRY.register(GaugeFunction(
+    "simulation_tick_interval_seconds", "Current delay between simulator ticks (adaptive).",
+    lambda: {(): simulation.scheduler.interval},
+))
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+# Mutating requests (incidents, plans, updates) are traced; TRACE_ALL_ROUTES=1 adds the polled GETs
+TRACE_ALL_ROUTES = os.getenv("TRACE_ALL_ROUTES", "0") == "1"
+_TRACED_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+
+@app.before_request
+def _start_request_trace():
+    route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    sp = None
+    if TRACE_ALL_ROUTES or request.method in _TRACED_METHODS:
+        sp, token = begin_trace(f"{request.method} {route}", method=request.method, route=route)
+        g.trace = (sp, token)
+    # honour a caller-supplied id (load balancer, client) so logs correlate end to end
+    incoming = request.headers.get("X-Request-ID", "")
+    g.request_id = incoming if _REQUEST_ID.match(incoming) else (sp.trace_id if sp and sp.trace_id else new_id())
+    if sp is not None:
+        sp.set(request_id=g.request_id)
+
+
+@app.teardown_request
+def _end_request_trace(error=None):
+    trace = g.pop("trace", None)
+    if trace is not None:
+        finish_trace(*trace, error=error)
+
+
+@app.before_request
+def _maybe_profile_request():
+    # a single attribute check unless an admin started a profiling session
+    if profiler.active and request.url_rule is not None:
+        g.profiled = profiler.enter_request(request.url_rule.rule)
+
+
+@app.teardown_request
+def _end_profiled_request(error=None):
+    if g.pop("profiled", False):
+        profiler.exit_request()
+
+
+@app.after_request
+def _observe_request(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        # route template, not the raw path, so ids don't explode the label set
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method, route=route, status=response.status_code,
+        )
+    trace = g.get("trace")
+    if trace is not None:
+        trace[0].set(status_code=response.status_code)
+    if "request_id" in g:
+        response.headers["X-Request-ID"] = g.request_id
+    return response
+
 
 @app.route("/")
 def index():
@@ -72,22 +226,6 @@ def health_check():
         "service": "HealthHive AI Load Balancer"
     }), 200
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """
-    Calculate the great circle distance between two points 
-    on the earth (specified in decimal degrees)
-    """
-    # convert decimal degrees to radians 
-    lon1, lat1, lon2, lat2 = map(math.radians, [lon1, lat1, lon2, lat2])
-
-    # haversine formula 
-    dlon = lon2 - lon1 
-    dlat = lat2 - lat1 
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a)) 
-    r = 6371 # Radius of earth in kilometers. Use 3956 for miles
-    return c * r
-
 # --- New Endpoints for AI Load Balancer (Refined) ---
 
 @app.route("/api/hospitals", methods=["GET"])
@@ -136,14 +274,137 @@ def api_update_hospital(hospital_id):
 
 @app.route("/api/admin/retrain", methods=["POST"])
 def api_retrain_model():
-    """Trigger model retraining (System Admin)."""
+    """Trigger model retraining in the background (System Admin)."""
     try:
-        train_model()
-        return jsonify({"message": "Model retraining started"}), 200
+        # A retrain already queued or running covers this request too
+        job, created = retrain_jobs.submit_unique(train_model)
+        return jsonify({
+            "message": "Model retraining started" if created else "Model retraining already in progress",
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/api/admin/retrain/{job.id}"
+        }), 202 if created else 200
     except Exception as e:
         logger.error(f"Error retraining model: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/admin/startup-profile", methods=["GET"])
+def api_startup_profile():
+    """Import and initialization cost per module/step for this worker (System Admin)."""
+    top = request.args.get("top", default=25, type=int)
+    return jsonify(startup_profile.report(top=max(1, top))), 200
+
+# Optional shared secret for the profiling endpoints (X-Admin-Token header)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def _admin_denied():
+    if ADMIN_TOKEN and not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+        return jsonify({"error": "admin token required"}), 403
+    return None
+
+
+@app.route("/api/admin/profile", methods=["POST"])
+def api_start_profile():
+    """
+    Start a sampling profiler session (System Admin).
+
+    Body: {"requests": N} to profile the next N matching requests, or
+    {"seconds": S} for a time window. Optional: "routes" (default
+    ["/generate-plan"]; [] for all routes), "all_threads", "interval_ms".
+    """
+    denied = _admin_denied()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    try:
+        session = profiler.start(
+            requests=data.get("requests"),
+            seconds=data.get("seconds"),
+            routes=data.get("routes", ["/generate-plan"]),
+            all_threads=bool(data.get("all_threads", False)),
+            interval_ms=data.get("interval_ms"),
+        )
+    except ProfilerBusy as e:
+        return jsonify({"error": str(e), "profile": profiler.status()}), 409
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({**session, "stacks_url": "/api/admin/profile/stacks"}), 202
+
+
+@app.route("/api/admin/profile", methods=["GET"])
+def api_profile_report():
+    """Status and hot frames of the running or last profiling session (System Admin)."""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    report = profiler.report(top=max(1, request.args.get("top", default=20, type=int)))
+    if report is None:
+        return jsonify({"error": "No profiling session has run"}), 404
+    return jsonify(report), 200
+
+
+@app.route("/api/admin/profile", methods=["DELETE"])
+def api_stop_profile():
+    """Stop the running profiling session early (System Admin)."""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    if profiler.stop() is None:
+        return jsonify({"error": "No profiling session has run"}), 404
+    return jsonify(profiler.report()), 200
+
+
+@app.route("/api/admin/profile/stacks", methods=["GET"])
+def api_profile_stacks():
+    """Collapsed stacks (flamegraph.pl / speedscope input) of the running or last session (System Admin)."""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    if profiler.current() is None:
+        return jsonify({"error": "No profiling session has run"}), 404
+    return Response(profiler.collapsed(), content_type="text/plain; charset=utf-8"), 200
+
+
+@app.route("/api/admin/traces", methods=["GET"])
+def api_recent_traces():
+    """Recent traces (newest first) with their slowest span; filters: min_ms, name, limit (System Admin)."""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    traces = trace_collector.recent(
+        min_ms=request.args.get("min_ms", default=0.0, type=float),
+        name=request.args.get("name"),
+        limit=max(1, min(request.args.get("limit", default=50, type=int), 500)),
+    )
+    return jsonify(traces), 200
+
+
+@app.route("/api/admin/traces/<trace_id>", methods=["GET"])
+def api_get_trace(trace_id):
+    """All recorded spans of one trace, in start order (System Admin)."""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    spans = trace_collector.get_trace(trace_id)
+    if not spans:
+        return jsonify({"error": "Trace not found (or evicted)", "trace_id": trace_id}), 404
+    return jsonify({"trace_id": trace_id, "spans": spans}), 200
+
+
+@app.route("/api/admin/retrain/<job_id>", methods=["GET"])
+def api_retrain_status(job_id):
+    """Status and progress of a retraining job (System Admin)."""
+    job = retrain_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found", "job_id": job_id}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route("/api/admin/retrain", methods=["GET"])
+def api_list_retrain_jobs():
+    """Recent retraining jobs, newest first (System Admin)."""
+    return jsonify([job.to_dict(include_result=False) for job in reversed(retrain_jobs.list())]), 200
+
 @app.route("/api/incidents", methods=["POST"])
 def api_create_incident():
     """Report a new incident (Bystander/Patient)."""
@@ -160,70 +421,15 @@ def api_create_incident():
 
         # Logic to find nearest/best hospital
         if not assigned_hospital_id:
-            hospitals = get_all_hospitals()
-            
-            # Filter out hospitals with 0 beds
-            available_hospitals = [h for h in hospitals if h['bed_availability'] > 0]
+            with span("load_hospitals") as sp:
+                hospitals = get_all_hospitals()
+                sp.set(hospitals=len(hospitals))
             
-            if not available_hospitals:
-                # Fallback if ALL hospitals are full (should ideally trigger a different workflow)
-                available_hospitals = hospitals
-            
-            # Calculate distances and scores if user location is provided
-            if user_lat and user_lon:
-                try:
-                    user_lat = float(user_lat)
-                    user_lon = float(user_lon)
-                    
-                    for h in available_hospitals:
-                        # 1. Distance
-                        dist = calculate_distance(user_lat, user_lon, h['latitude'], h['longitude'])
-                        h['distance'] = dist
-                        
-                        # 2. Bed Score (Inverse: more beds = lower score)
-                        # Add 1 to avoid division by zero, though we filtered > 0 already
-                        bed_score = (1 / (h['bed_availability'] + 1)) * 10
-                        
-                        # 3. Status Penalty
-                        status_penalty = 0
-                        status = h.get('status', 'Green')
-                        
-                        # Logic: Allow Red hospitals if patient count is low (<= 2)
-                        # If few patients, we can squeeze them in even if busy, if it's much closer.
-                        is_small_incident = data.get('patient_count', 1) <= 2
-                        
-                        if status == 'Yellow':
-                            status_penalty = 5
-                        elif status == 'Red':
-                            if is_small_incident:
-                                status_penalty = 10 # Reduced penalty (similar to Yellow)
-                            else:
-                                status_penalty = 100 # Heavy penalty for larger groups
-                            
-                        # Total Score (Lower is better)
-                        # User requested Distance weight = 70%
-                        # We'll use 0.7 for distance and keep others as additive penalties
-                        h['total_score'] = (dist * 0.7) + bed_score + status_penalty
-                    
-                    # Sort by Total Score
-                    available_hospitals.sort(key=lambda x: x.get('total_score', float('inf')))
-                    
-                    # Pick the best one
-                    best_hospital = available_hospitals[0]
-                    assigned_hospital_id = best_hospital['hospital_id']
-                    assigned_hospital_name = best_hospital['hospital_name']
-                    distance_km = round(best_hospital['distance'], 1)
-                    
-                except (ValueError, TypeError):
-                    # Fallback if coords are invalid
-                    best_hospital = available_hospitals[0]
-                    assigned_hospital_id = best_hospital['hospital_id']
-                    assigned_hospital_name = best_hospital['hospital_name']
-            else:
-                # If no location, pick based on beds and status
-                # Simple score: Beds - StatusPenalty (Higher is better here, so we invert logic or just sort)
-                # Let's just sort by beds descending for now as fallback
-                best_hospital = max(available_hospitals, key=lambda x: x['bed_availability'])
+            with span("select_hospital", candidates=len(hospitals)):
+                best_hospital, distance_km = select_hospital(
+                    hospitals, user_lat, user_lon, data.get('patient_count', 1)
+                )
+            if best_hospital is not None:
                 assigned_hospital_id = best_hospital['hospital_id']
                 assigned_hospital_name = best_hospital['hospital_name']
 
@@ -238,13 +444,14 @@ def api_create_incident():
                      except:
                          pass
 
-        create_incident({**data, 'assigned_hospital_id': assigned_hospital_id})
-        
-        # Trigger alert for the assigned hospital
-        if assigned_hospital_id:
-            alert_msg = f"New Incoming Patient! Severity: {data.get('severity', 'Unknown')}, Count: {data.get('patient_count', 1)}"
-            severity = 'Critical' if data.get('severity') == 'Critical' else 'Warning'
-            create_alert(assigned_hospital_id, alert_msg, severity)
+        with span("record_incident", assigned_hospital_id=assigned_hospital_id, distance_km=distance_km):
+            create_incident({**data, 'assigned_hospital_id': assigned_hospital_id})
+
+            # Trigger alert for the assigned hospital
+            if assigned_hospital_id:
+                alert_msg = f"New Incoming Patient! Severity: {data.get('severity', 'Unknown')}, Count: {data.get('patient_count', 1)}"
+                severity = 'Critical' if data.get('severity') == 'Critical' else 'Warning'
+                create_alert(assigned_hospital_id, alert_msg, severity)
 
         return jsonify({
             "message": "Incident reported successfully",
@@ -288,24 +495,181 @@ def api_get_all_recent_alerts():
         logger.error(f"Error fetching recent alerts: {e}")
         return jsonify({"error": str(e)}), 500
 
+def _forecast_horizon():
+    """Parse ?horizon= (days), defaulting to 7."""
+    horizon = request.args.get("horizon", 7, type=int)
+    if horizon is None or horizon < 1:
+        raise ValueError("horizon must be a positive integer")
+    return horizon
+
+@app.route("/api/forecast", methods=["GET"])
+def api_get_forecast():
+    """Precomputed forecasts for all hospitals (served from memory)."""
+    try:
+        horizon = _forecast_horizon()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    data = forecast_service.get_all(horizon)
+    if data is None:
+        status = forecast_service.status()
+        if status["ready"]:
+            return jsonify({"error": f"horizon must be at most {max(status['horizons'])} days"}), 400
+        return jsonify({"error": "Forecasts are being computed", **status}), 503
+    return jsonify(data), 200
+
+@app.route("/api/hospital/<hospital_id>/forecast", methods=["GET"])
+def api_get_hospital_forecast(hospital_id):
+    """Precomputed forecast for one hospital (served from memory)."""
+    try:
+        horizon = _forecast_horizon()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not forecast_service.ready:
+        return jsonify({"error": "Forecasts are being computed", **forecast_service.status()}), 503
+    data = forecast_service.get_hospital(hospital_id, horizon)
+    if data is None:
+        return jsonify({"error": "No forecast for this hospital/horizon", "hospital_id": hospital_id}), 404
+    return jsonify(data), 200
+
+@app.route("/api/hospital/<hospital_id>/history", methods=["GET"])
+def api_get_hospital_history(hospital_id):
+    """Recorded load history for one hospital (raw samples or minute/hour/day rollups)."""
+    try:
+        rows = query_history(
+            hospital_id,
+            since=request.args.get("since"),
+            until=request.args.get("until"),
+            resolution=request.args.get("resolution", "hour"),
+            limit=request.args.get("limit", default=1000, type=int),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"hospital_id": hospital_id, "resolution": request.args.get("resolution", "hour"), "samples": rows}), 200
+
+@app.route("/api/admin/forecast/refresh", methods=["POST"])
+def api_refresh_forecast():
+    """Invalidate cached forecasts and recompute in the background (System Admin)."""
+    forecast_service.invalidate()
+    return jsonify({"message": "Forecast refresh scheduled", **forecast_service.status()}), 202
+
 @app.route("/api/logs", methods=["GET"])
 def get_logs():
-    """Get system logs (mock implementation for demo)."""
-    # In a real app, we'd read from a log file or DB table
-    return jsonify([
-        {"timestamp": datetime.now().isoformat(), "level": "INFO", "message": "System running normally"},
-        {"timestamp": datetime.now().isoformat(), "level": "INFO", "message": "Simulation cycle completed"},
-        {"timestamp": datetime.now().isoformat(), "level": "INFO", "message": "AI Model loaded successfully"}
-    ]), 200
+    """
+    Recent log records from the in-memory ring buffer, oldest first.
+
+    Filters: level (minimum, e.g. WARNING), since/until (ISO or epoch seconds),
+    logger (name prefix), limit (default 100). Without a cursor the newest
+    records are returned; pass the X-Log-Cursor response header back as
+    ?cursor= to page forward through newer records. X-Log-Truncated: 1 means
+    records after the cursor were already evicted.
+    """
+    try:
+        entries, next_cursor, truncated = log_buffer.query(
+            cursor=request.args.get("cursor", type=int),
+            level=request.args.get("level"),
+            since=request.args.get("since"),
+            until=request.args.get("until"),
+            logger=request.args.get("logger"),
+            limit=request.args.get("limit", default=100, type=int),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify(entries)
+    response.headers["X-Log-Cursor"] = str(next_cursor)
+    response.headers["X-Log-Truncated"] = "1" if truncated else "0"
+    return response, 200
 
 # ------------------------------------------
 
+def _validate_plan_request(data):
+    """Extract and validate /generate-plan fields. Returns (params, validation_errors)."""
+    location = str(data.get('location') or '').strip()
+    critical_patients = data.get('critical_patients')
+    stable_patients = data.get('stable_patients')
+    scenario = data.get('scenario')
+
+    validation_errors = []
+
+    if not location:
+        validation_errors.append("location is required and cannot be empty")
+    if critical_patients is None:
+        validation_errors.append("critical_patients is required")
+    elif not isinstance(critical_patients, int) or critical_patients < 0:
+        validation_errors.append("critical_patients must be a non-negative integer")
+
+    if stable_patients is None:
+        validation_errors.append("stable_patients is required")
+    elif not isinstance(stable_patients, int) or stable_patients < 0:
+        validation_errors.append("stable_patients must be a non-negative integer")
+
+    if scenario is None:
+        validation_errors.append("scenario is required")
+    elif not isinstance(scenario, int) or scenario not in [1, 2, 3, 4]:
+        validation_errors.append("scenario must be an integer between 1 and 4")
+
+    params = {
+        "location": location,
+        "critical_patients": critical_patients,
+        "stable_patients": stable_patients,
+        "scenario": scenario,
+        # bypass the plan cache and always recompute
+        "refresh": bool(data.get('refresh', False)),
+    }
+    return params, validation_errors
+
+
+def _build_plan_response(params, request_id):
+    """Run the plan pipeline and wrap the result with request metadata."""
+    result_data = generate_action_plan(
+        location=params["location"],
+        critical_patients=params["critical_patients"],
+        stable_patients=params["stable_patients"],
+        scenario=str(params["scenario"]),
+        use_cache=not params["refresh"]
+    )
+
+    # Ensure proper structure
+    if not isinstance(result_data, dict):
+        result_data = {"action_plan": result_data}
+
+    return {
+        **result_data,
+        "request_id": request_id,
+        "timestamp": datetime.now().isoformat(),
+        "incident_summary": {
+            "location": params["location"],
+            "critical_patients": params["critical_patients"],
+            "stable_patients": params["stable_patients"],
+            "total_patients": params["critical_patients"] + params["stable_patients"],
+            "scenario": params["scenario"]
+        }
+    }
+
+
+def _run_plan_job(params, request_id, trace_parent, profile_token, progress):
+    progress(0.1, "Generating plan")
+    with profiler.track("plan-job", route="/generate-plan", token=profile_token), continue_trace(trace_parent, "plan_job", request_id=request_id):
+        response = _build_plan_response(params, request_id)
+    logger.info(f"[{request_id}] Successfully generated plan (async)")
+    return response
+
+
+def _wants_async(data):
+    flag = request.args.get("async", data.get("async"))
+    return str(flag).strip().lower() in ("1", "true", "yes") if flag is not None else False
+
+
 @app.route("/generate-plan", methods=["POST"])
 def generate_plan():
     """
     Main API endpoint to generate an emergency action plan.
+
+    With "async": true in the body (or ?async=1) the plan is queued on the plan
+    worker pool and 202 is returned with a job id to poll; when the queue is
+    full the request is rejected with 503 and a Retry-After header.
     """
-    request_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    # unique per request (trace id or X-Request-ID), unlike the old second-resolution timestamp
+    request_id = g.get("request_id") or new_id()
     
     try:
         # Parse request data
@@ -320,32 +684,8 @@ def generate_plan():
         
         logger.info(f"[{request_id}] Received request data: {json.dumps(data)}")
 
-        # Extract and validate required fields
-        location = data.get('location', '').strip()
-        critical_patients = data.get('critical_patients')
-        stable_patients = data.get('stable_patients')
-        scenario = data.get('scenario')
-
-        # Validation
-        validation_errors = []
-        
-        if not location:
-            validation_errors.append("location is required and cannot be empty")
-        if critical_patients is None:
-            validation_errors.append("critical_patients is required")
-        elif not isinstance(critical_patients, int) or critical_patients < 0:
-            validation_errors.append("critical_patients must be a non-negative integer")
-            
-        if stable_patients is None:
-            validation_errors.append("stable_patients is required")
-        elif not isinstance(stable_patients, int) or stable_patients < 0:
-            validation_errors.append("stable_patients must be a non-negative integer")
-            
-        if scenario is None:
-            validation_errors.append("scenario is required")
-        elif not isinstance(scenario, int) or scenario not in [1, 2, 3, 4]:
-            validation_errors.append("scenario must be an integer between 1 and 4")
-
+        with span("validate"):
+            params, validation_errors = _validate_plan_request(data)
         if validation_errors:
             logger.warning(f"[{request_id}] Validation failed: {validation_errors}")
             return jsonify({
@@ -354,56 +694,34 @@ def generate_plan():
                 "request_id": request_id
             }), 400
 
-        # Run simulation
-        logger.info(f"[{request_id}] Starting simulation...")
-        success = run_full_simulation(
-            location=location,
-            critical_patients=critical_patients,
-            stable_patients=stable_patients,
-            scenario=str(scenario)
-        )
-
-        if not success:
-            error_msg = "Backend simulation script failed to execute"
-            logger.error(f"[{request_id}] ERROR: {error_msg}")
-            return jsonify({
-                "error": error_msg,
-                "request_id": request_id
-            }), 500
-
-        # Read output file
-        output_path = os.path.join(PLANS_DIR, "last_routing.json")
-        
-        if not os.path.exists(output_path):
-            error_msg = f"Output file not found at {output_path}"
-            logger.error(f"[{request_id}] ERROR: {error_msg}")
+        if _wants_async(data):
+            # a profiled request hands its session to the job that does the work
+            profile_token = profiler.hand_off() if g.get("profiled") else None
+            try:
+                job = plan_jobs.submit(_run_plan_job, params, request_id, capture_trace(), profile_token)
+            except QueueFull as e:
+                profiler.release(profile_token)
+                logger.warning(f"[{request_id}] Plan queue full, rejecting request")
+                response = jsonify({
+                    "error": "Plan queue is full, retry later",
+                    "retry_after": e.retry_after,
+                    "request_id": request_id
+                })
+                response.headers["Retry-After"] = str(e.retry_after)
+                return response, 503
+
+            logger.info(f"[{request_id}] Queued plan job {job.id}")
             return jsonify({
-                "error": "Simulation ran but output file was not found",
-                "details": error_msg,
-                "request_id": request_id
-            }), 500
-
-        # Parse and return result
-        with open(output_path, 'r', encoding='utf-8') as f:
-            result_data = json.load(f)
-
-        # Ensure proper structure
-        if not isinstance(result_data, dict):
-            result_data = {"action_plan": result_data}
-
-        # Add metadata
-        response = {
-            **result_data,
-            "request_id": request_id,
-            "timestamp": datetime.now().isoformat(),
-            "incident_summary": {
-                "location": location,
-                "critical_patients": critical_patients,
-                "stable_patients": stable_patients,
-                "total_patients": critical_patients + stable_patients,
-                "scenario": scenario
-            }
-        }
+                "message": "Plan generation queued",
+                "job_id": job.id,
+                "request_id": request_id,
+                "status_url": f"/api/plan-jobs/{job.id}",
+                "queue_position": plan_jobs.queue_position(job)
+            }), 202
+
+        # Synchronous mode: build the plan on this worker
+        logger.info(f"[{request_id}] Starting simulation...")
+        response = _build_plan_response(params, request_id)
 
         logger.info(f"[{request_id}] Successfully generated plan")
         
@@ -428,14 +746,77 @@ def generate_plan():
         }), 500
 
 
+@app.route("/api/plan-jobs/<job_id>", methods=["GET"])
+def api_plan_job(job_id):
+    """Status of a queued plan; includes the full plan once the job has succeeded."""
+    job = plan_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found", "job_id": job_id}), 404
+    data = job.to_dict()
+    data["queue_position"] = plan_jobs.queue_position(job)
+    return jsonify(data), 200
+
+
+@app.route("/api/plan-jobs/stats", methods=["GET"])
+def api_plan_job_stats():
+    """Plan queue depth, worker usage and wait times."""
+    return jsonify(plan_jobs.stats()), 200
+
+
+@app.route("/api/plans", methods=["GET"])
+def api_query_plans():
+    """Search archived plans by time range, location, scenario or hospital (newest first)."""
+    try:
+        plans = query_plans(
+            location=request.args.get("location"),
+            scenario=request.args.get("scenario"),
+            hospital_id=request.args.get("hospital_id"),
+            since=request.args.get("since"),
+            until=request.args.get("until"),
+            before_id=request.args.get("before_id", type=int),
+            limit=request.args.get("limit", 50, type=int),
+        )
+        return jsonify({
+            "plans": plans,
+            "next_before_id": plans[-1]["plan_id"] if plans else None
+        }), 200
+    except Exception as e:
+        logger.error(f"Error querying plans: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/plans/<int:plan_id>", methods=["GET"])
+def api_get_plan(plan_id):
+    """Full archived plan by id."""
+    try:
+        plan = get_plan(plan_id)
+        if not plan:
+            return jsonify({"error": "Plan not found", "plan_id": plan_id}), 404
+        return jsonify(plan), 200
+    except Exception as e:
+        logger.error(f"Error fetching plan {plan_id}: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text exposition of this worker's metrics."""
+    return Response(REGISTRY.exposition(), content_type=METRICS_CONTENT_TYPE)
+
+
 @app.route("/status", methods=["GET"])
 def get_status():
     """Get system status and statistics."""
     try:
-        plan_count = len([f for f in os.listdir(PLANS_DIR) if f.endswith('.json')])
+        plan_count = count_plans()
         return jsonify({
             "status": "operational",
             "plans_generated": plan_count,
+            "plans_pending_write": plan_writer.pending(),
+            "plan_queue": plan_jobs.stats(),
+            "plan_cache": plan_cache.stats(),
+            "tracing": trace_collector.stats(),
+            "simulation": {"active": simulation.is_active, **simulation.tick_status(), **simulation_lease.status()},
+            "status_worker": status_worker.status(),
             "plans_directory": PLANS_DIR,
             "timestamp": datetime.now().isoformat()
         }), 200
@@ -0,0 +1,164 @@
+"""
+Single-owner leases for background work shared by several app workers.
+
+Under gunicorn every worker imports app.py, so every worker would start its own
+simulator. A lease row in hospital.db elects one owner per lease name: the
+owner renews it every `heartbeat` seconds; if it stops renewing (process died,
+thread stuck) the lease expires after `ttl` seconds and another worker takes
+over on its next attempt.
+"""
+import os
+import time
+import uuid
+import socket
+import atexit
+import threading
+import logging
+
+from .database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+LEASE_TTL = float(os.getenv("SIMULATION_LEASE_TTL", "15"))
+LEASE_HEARTBEAT = float(os.getenv("SIMULATION_LEASE_HEARTBEAT", "5"))
+
+
+def init_leases():
+    conn = get_db_connection()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            acquired_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def try_acquire(name, owner, ttl):
+    """
+    Take or renew the lease if it is free, expired or already ours.
+    Returns the expiry time on success, None if another owner holds it.
+    """
+    now = time.time()
+    expires_at = now + ttl
+    conn = get_db_connection()
+    try:
+        with conn:
+            cur = conn.execute('''
+                INSERT INTO leases (name, owner, acquired_at, expires_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    owner = excluded.owner,
+                    acquired_at = CASE WHEN leases.owner = excluded.owner THEN leases.acquired_at ELSE excluded.acquired_at END,
+                    expires_at = excluded.expires_at
+                WHERE leases.owner = excluded.owner OR leases.expires_at < ?
+            ''', (name, owner, now, expires_at, now))
+            return expires_at if cur.rowcount == 1 else None
+    finally:
+        conn.close()
+
+
+def release(name, owner):
+    conn = get_db_connection()
+    try:
+        with conn:
+            conn.execute('DELETE FROM leases WHERE name = ? AND owner = ?', (name, owner))
+    finally:
+        conn.close()
+
+
+def get_lease(name):
+    conn = get_db_connection()
+    try:
+        row = conn.execute('SELECT * FROM leases WHERE name = ?', (name,)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+
+class LeaseCoordinator:
+    """
+    Keeps trying to hold the `name` lease from a daemon thread.
+
+    `is_leader` is only true while the lease is held and not past its local
+    expiry, so a worker whose heartbeat stalls stops acting as leader before
+    another worker can take over.
+    """
+
+    def __init__(self, name, ttl=LEASE_TTL, heartbeat=LEASE_HEARTBEAT):
+        if heartbeat >= ttl:
+            raise ValueError("heartbeat must be shorter than ttl")
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._expires_at = 0.0
+        self._wake = threading.Event()
+        self.thread = None
+        self.running = False
+
+    @property
+    def is_leader(self):
+        return time.time() < self._expires_at
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            init_leases()
+            self._beat()
+            self.thread = threading.Thread(target=self._run_loop, daemon=True)
+            self.thread.start()
+            atexit.register(self.stop)
+            logger.info(f"Lease coordinator '{self.name}' started as {self.owner}.")
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self._wake.set()
+        if self.thread:
+            self.thread.join()
+        if self._expires_at:
+            self._expires_at = 0.0
+            try:
+                release(self.name, self.owner)
+                logger.info(f"Released lease '{self.name}'.")
+            except Exception as e:
+                logger.warning(f"Could not release lease '{self.name}': {e}")
+
+    def _beat(self):
+        was_leader = self.is_leader
+        try:
+            expires_at = try_acquire(self.name, self.owner, self.ttl)
+        except Exception as e:
+            logger.warning(f"Lease '{self.name}' heartbeat failed: {e}")
+            expires_at = None
+            if was_leader:
+                return  # keep the local expiry; is_leader lapses on its own
+        self._expires_at = expires_at or 0.0
+        if expires_at and not was_leader:
+            logger.info(f"Acquired lease '{self.name}' ({self.owner}).")
+        elif was_leader and not expires_at:
+            logger.warning(f"Lost lease '{self.name}' ({self.owner}).")
+
+    def _run_loop(self):
+        while self.running:
+            self._wake.wait(self.heartbeat)
+            if not self.running:
+                break
+            self._beat()
+
+    def status(self):
+        lease = None
+        try:
+            lease = get_lease(self.name)
+        except Exception as e:
+            logger.warning(f"Could not read lease '{self.name}': {e}")
+        return {
+            "name": self.name,
+            "owner": self.owner,
+            "is_leader": self.is_leader,
+            "lease": lease,
+        }
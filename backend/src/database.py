@@ -1,15 +1,86 @@
 import sqlite3
-import pandas as pd
+import csv
 import os
+import sys
+import time
 from datetime import datetime
+from itertools import islice
 import logging
 
+from .metrics import DB_QUERY_SECONDS
+from .events import bus, INCIDENT_CREATED, HOSPITAL_UPDATED
+
 logger = logging.getLogger(__name__)
 
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "hospital.db")
+HOSPITAL_CSV_PATH = os.getenv(
+    "HOSPITAL_CSV_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dataset", "hospital_data.csv"),
+)
+# Re-sync registry fields from the CSV on every start, not only into an empty DB
+SYNC_REGISTRY_ON_START = os.getenv("HOSPITAL_SYNC_ON_START", "0") == "1"
+SEED_BATCH_SIZE = 5000
+
+_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH", "CREATE", "DROP", "PRAGMA", "BEGIN"}
+
+
+def _timed(method, sql, args, caller, operation=None):
+    """Run a statement and record it in db_query_duration_seconds."""
+    if operation is None:
+        head = sql.lstrip()[:8].split(None, 1)
+        operation = head[0].upper() if head else "OTHER"
+        if operation not in _OPERATIONS:
+            operation = "OTHER"
+    start = time.perf_counter()
+    try:
+        return method(sql, *args)
+    finally:
+        DB_QUERY_SECONDS.observe(time.perf_counter() - start, operation=operation, caller=caller)
+
+
+class _TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        return _timed(super().execute, sql, (parameters,), sys._getframe(1).f_code.co_name)
+
+    def executemany(self, sql, seq_of_parameters):
+        return _timed(super().executemany, sql, (seq_of_parameters,), sys._getframe(1).f_code.co_name)
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    sqlite3 connection that times execute/executemany/executescript/commit.
+
+    Only statement execution is measured (SELECT rows are stepped lazily by
+    fetch*), which is where lock waits and write costs show up.
+    """
+
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        cur = super().cursor()
+        _timed(cur.execute, sql, (parameters,), sys._getframe(1).f_code.co_name)
+        return cur
+
+    def executemany(self, sql, seq_of_parameters):
+        cur = super().cursor()
+        _timed(cur.executemany, sql, (seq_of_parameters,), sys._getframe(1).f_code.co_name)
+        return cur
+
+    def executescript(self, sql_script):
+        return _timed(super().executescript, sql_script, (), sys._getframe(1).f_code.co_name, "SCRIPT")
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - start, operation="COMMIT",
+                                     caller=sys._getframe(1).f_code.co_name)
+
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, factory=TimedConnection)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -59,58 +130,148 @@ def init_db():
             read BOOLEAN DEFAULT 0
         )
     ''')
+
+    # Version counter bumped by triggers on every hospital_load write, so caches
+    # can tell whether capacity changed without diffing rows
+    c.executescript('''
+        CREATE TABLE IF NOT EXISTS state_version (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO state_version (name, version) VALUES ('hospital_load', 0);
+        CREATE TRIGGER IF NOT EXISTS hospital_load_version_ins AFTER INSERT ON hospital_load
+        BEGIN UPDATE state_version SET version = version + 1 WHERE name = 'hospital_load'; END;
+        CREATE TRIGGER IF NOT EXISTS hospital_load_version_upd AFTER UPDATE ON hospital_load
+        BEGIN UPDATE state_version SET version = version + 1 WHERE name = 'hospital_load'; END;
+        CREATE TRIGGER IF NOT EXISTS hospital_load_version_del AFTER DELETE ON hospital_load
+        BEGIN UPDATE state_version SET version = version + 1 WHERE name = 'hospital_load'; END;
+    ''')
+    conn.commit()
     
     # Check if data exists
     c.execute('SELECT count(*) FROM hospital_load')
-    if c.fetchone()[0] == 0:
+    empty = c.fetchone()[0] == 0
+    conn.close()
+
+    if empty:
         logger.info("Initializing database...")
-        
-        csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dataset", "hospital_data.csv")
-        
-        if os.path.exists(csv_path):
-            logger.info(f"Loading data from {csv_path}")
-            df = pd.read_csv(csv_path)
-            for _, row in df.iterrows():
-                c.execute('''
-                    INSERT INTO hospital_load (
-                        hospital_id, hospital_name, latitude, longitude, 
-                        er_admissions, bed_availability, ambulance_arrivals, staff_capacity, total_beds, status, timestamp
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    row['hospital_id'], row['hospital_name'], row['latitude'], row['longitude'],
-                    row.get('er_admissions', 0), row.get('bed_availability', 0), 
-                    row.get('ambulance_arrivals', 0), row.get('staff_capacity', 100), 
-                    row.get('total_beds', 100), row.get('status', 'Green'), datetime.now()
-                ))
+        if os.path.exists(HOSPITAL_CSV_PATH):
+            sync_hospitals_from_csv(HOSPITAL_CSV_PATH)
         else:
             logger.info("CSV not found, using dummy data...")
-            # Real Mumbai Hospitals Data (Fallback)
-            hospitals = [
-                ("H001", "KEM Hospital", 19.002, 72.842, 50, 20, 5, 80, 100),
-                ("H002", "Sion Hospital", 19.046, 72.860, 30, 40, 2, 90, 80),
-                ("H003", "Tata Memorial Hospital", 19.003, 72.845, 80, 5, 10, 70, 120),
-                ("H004", "Lilavati Hospital", 19.051, 72.829, 40, 30, 3, 85, 90),
-                ("H005", "Nanavati Hospital", 19.096, 72.840, 60, 15, 6, 75, 110),
-                ("H006", "Breach Candy Hospital", 18.972, 72.804, 25, 50, 1, 95, 70),
-                ("H007", "Jaslok Hospital", 18.971, 72.809, 70, 10, 8, 65, 130),
-                ("H008", "P.D. Hinduja Hospital", 19.033, 72.838, 90, 2, 12, 60, 150),
-                ("H009", "Kokilaben Dhirubhai Ambani Hospital", 19.131, 72.822, 35, 35, 4, 88, 85),
-                ("H010", "Dr L H Hiranandani Hospital", 19.119, 72.917, 55, 18, 7, 78, 105),
-                ("H011", "Fortis Hospital Mulund", 19.161, 72.943, 45, 25, 5, 82, 95),
-                ("H012", "Sir J.J. Group of Hospitals", 18.962, 72.834, 20, 60, 0, 98, 60),
-            ]
-            
-            for h in hospitals:
-                c.execute('''
-                    INSERT INTO hospital_load (
-                        hospital_id, hospital_name, latitude, longitude, 
-                        er_admissions, bed_availability, ambulance_arrivals, staff_capacity, total_beds, timestamp
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (h[0], h[1], h[2], h[3], h[4], h[5], h[6], h[7], h[8], datetime.now()))
-            
-        conn.commit()
-        
+            seed_default_hospitals()
+    elif SYNC_REGISTRY_ON_START and os.path.exists(HOSPITAL_CSV_PATH):
+        sync_hospitals_from_csv(HOSPITAL_CSV_PATH)
+
+# Registry columns come from the CSV; live load columns are only set on first insert,
+# so a re-sync refreshes names/locations/capacity without resetting current load.
+_SEED_COLUMNS = [
+    # (column, default when missing/empty)
+    ('hospital_id', None),
+    ('hospital_name', None),
+    ('latitude', None),
+    ('longitude', None),
+    ('er_admissions', 0),
+    ('bed_availability', 0),
+    ('ambulance_arrivals', 0),
+    ('staff_capacity', 100),
+    ('total_beds', 100),
+    ('status', 'Green'),
+]
+_REGISTRY_COLUMNS = ['hospital_name', 'latitude', 'longitude', 'total_beds']
+
+_UPSERT_SQL = '''
+    INSERT INTO hospital_load ({cols}, timestamp) VALUES ({marks}, ?)
+    ON CONFLICT(hospital_id) DO UPDATE SET {updates}
+'''.format(
+    cols=", ".join(c for c, _ in _SEED_COLUMNS),
+    marks=", ".join("?" for _ in _SEED_COLUMNS),
+    updates=", ".join(f"{c} = excluded.{c}" for c in _REGISTRY_COLUMNS),
+)
+
+def _iter_seed_rows(f, timestamp):
+    """
+    Stream CSV rows as parameter tuples for _UPSERT_SQL (rows without an id are skipped).
+
+    Values are passed through as text; the REAL/INTEGER column affinities convert
+    numeric strings on insert, which is much cheaper than converting in Python.
+    """
+    reader = csv.reader(f)
+    header = [h.strip() for h in next(reader, [])]
+    pos = {name: i for i, name in enumerate(header)}
+    picks = [(pos.get(col), default) for col, default in _SEED_COLUMNS]
+    for row in reader:
+        n = len(row)
+        values = tuple(
+            (row[i].strip() or default) if i is not None and i < n else default
+            for i, default in picks
+        )
+        if values[0]:
+            yield values + (timestamp,)
+
+def _executemany_batched(conn, sql, rows, batch_size):
+    count = 0
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return count
+        conn.executemany(sql, batch)
+        count += len(batch)
+
+def sync_hospitals_from_csv(csv_path=HOSPITAL_CSV_PATH, batch_size=SEED_BATCH_SIZE):
+    """
+    Bulk-load (or re-sync) hospital_load from a registry CSV.
+
+    Rows are streamed with the csv module and upserted with executemany in
+    batches inside a single transaction, so memory stays flat for large
+    registries and a failed load leaves the table untouched. Returns the
+    number of rows written.
+    """
+    start = time.perf_counter()
+    conn = get_db_connection()
+    try:
+        with conn, open(csv_path, newline='', encoding='utf-8') as f:
+            count = _executemany_batched(conn, _UPSERT_SQL, _iter_seed_rows(f, datetime.now()), batch_size)
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else float('inf')
+    logger.info(f"Synced {count} hospitals from {csv_path} in {elapsed:.3f}s ({rate:,.0f} rows/s)")
+    return count
+
+def seed_default_hospitals():
+    """Seed the built-in Mumbai hospital list (used when no registry CSV exists)."""
+    # Real Mumbai Hospitals Data (Fallback)
+    hospitals = [
+        ("H001", "KEM Hospital", 19.002, 72.842, 50, 20, 5, 80, 100),
+        ("H002", "Sion Hospital", 19.046, 72.860, 30, 40, 2, 90, 80),
+        ("H003", "Tata Memorial Hospital", 19.003, 72.845, 80, 5, 10, 70, 120),
+        ("H004", "Lilavati Hospital", 19.051, 72.829, 40, 30, 3, 85, 90),
+        ("H005", "Nanavati Hospital", 19.096, 72.840, 60, 15, 6, 75, 110),
+        ("H006", "Breach Candy Hospital", 18.972, 72.804, 25, 50, 1, 95, 70),
+        ("H007", "Jaslok Hospital", 18.971, 72.809, 70, 10, 8, 65, 130),
+        ("H008", "P.D. Hinduja Hospital", 19.033, 72.838, 90, 2, 12, 60, 150),
+        ("H009", "Kokilaben Dhirubhai Ambani Hospital", 19.131, 72.822, 35, 35, 4, 88, 85),
+        ("H010", "Dr L H Hiranandani Hospital", 19.119, 72.917, 55, 18, 7, 78, 105),
+        ("H011", "Fortis Hospital Mulund", 19.161, 72.943, 45, 25, 5, 82, 95),
+        ("H012", "Sir J.J. Group of Hospitals", 18.962, 72.834, 20, 60, 0, 98, 60),
+    ]
+    now = datetime.now()
+    conn = get_db_connection()
+    try:
+        with conn:
+            conn.executemany(_UPSERT_SQL, [h + ('Green', now) for h in hospitals])
+    finally:
+        conn.close()
+    return len(hospitals)
+
+def get_state_version(name='hospital_load'):
+    """Monotonic write counter for a table (0 if unknown)."""
+    conn = get_db_connection()
+    row = conn.execute('SELECT version FROM state_version WHERE name = ?', (name,)).fetchone()
     conn.close()
+    return row[0] if row else 0
 
 def get_all_hospitals():
     conn = get_db_connection()
@@ -118,15 +279,19 @@ def get_all_hospitals():
     conn.close()
     return [dict(h) for h in hospitals]
 
+_LOAD_COLUMNS = ['er_admissions', 'bed_availability', 'ambulance_arrivals', 'staff_capacity', 'status']
+
 def update_hospital_data(hospital_id, data):
     conn = get_db_connection()
     query = 'UPDATE hospital_load SET timestamp = ?'
     params = [datetime.now()]
     
+    fields = []
     for key, value in data.items():
-        if key in ['er_admissions', 'bed_availability', 'ambulance_arrivals', 'staff_capacity', 'status']:
+        if key in _LOAD_COLUMNS:
             query += f', {key} = ?'
             params.append(value)
+            fields.append(key)
             
     query += ' WHERE hospital_id = ?'
     params.append(hospital_id)
@@ -134,6 +299,76 @@ def update_hospital_data(hospital_id, data):
     conn.execute(query, params)
     conn.commit()
     conn.close()
+    bus.publish(HOSPITAL_UPDATED, hospital_ids=[hospital_id], fields=fields)
+
+def update_hospitals_bulk(updates):
+    """
+    Apply many update_hospital_data() changes in one transaction.
+
+    `updates` is [(hospital_id, {column: value})]. Rows are grouped by which
+    columns they set, with one executemany per group, so each row only writes
+    the columns it changed. Returns the number of rows updated.
+    """
+    groups = {}
+    for hospital_id, data in updates:
+        columns = tuple(c for c in _LOAD_COLUMNS if c in data)
+        groups.setdefault(columns, []).append(tuple(data[c] for c in columns) + (hospital_id,))
+    if not groups:
+        return 0
+    now = datetime.now()
+    conn = get_db_connection()
+    try:
+        with conn:
+            for columns, rows in groups.items():
+                sets = "".join(f", {c} = ?" for c in columns)
+                conn.executemany(
+                    f'UPDATE hospital_load SET timestamp = ?{sets} WHERE hospital_id = ?',
+                    [(now,) + row for row in rows],
+                )
+    finally:
+        conn.close()
+    for columns, rows in groups.items():
+        bus.publish(HOSPITAL_UPDATED, hospital_ids=[row[-1] for row in rows], fields=list(columns))
+    return sum(len(rows) for rows in groups.values())
+
+def update_statuses_if_unchanged(updates):
+    """
+    Set status for [(hospital_id, status, timestamp as read)], skipping rows
+    written since that read (their timestamp moved on), so a status derived
+    from stale load values never overwrites a newer one. Returns the ids updated.
+    """
+    applied = []
+    now = datetime.now()
+    conn = get_db_connection()
+    try:
+        with conn:
+            for hospital_id, status, read_timestamp in updates:
+                cur = conn.execute(
+                    'UPDATE hospital_load SET timestamp = ?, status = ? WHERE hospital_id = ? AND timestamp IS ?',
+                    (now, status, hospital_id, read_timestamp),
+                )
+                if cur.rowcount:
+                    applied.append(hospital_id)
+    finally:
+        conn.close()
+    if applied:
+        bus.publish(HOSPITAL_UPDATED, hospital_ids=applied, fields=['status'])
+    return applied
+
+def get_hospitals(hospital_ids):
+    """Rows for the given ids (unknown ids are skipped)."""
+    hospital_ids = list(hospital_ids)
+    rows = []
+    conn = get_db_connection()
+    try:
+        # Stay under SQLite's default limit of 999 bound parameters
+        for start in range(0, len(hospital_ids), 900):
+            chunk = hospital_ids[start:start + 900]
+            marks = ", ".join("?" for _ in chunk)
+            rows += conn.execute(f'SELECT * FROM hospital_load WHERE hospital_id IN ({marks})', chunk).fetchall()
+    finally:
+        conn.close()
+    return [dict(h) for h in rows]
 
 def get_hospital(hospital_id):
     conn = get_db_connection()
@@ -151,6 +386,8 @@ def create_incident(data):
     incident_id = c.lastrowid
     conn.commit()
     conn.close()
+    bus.publish(INCIDENT_CREATED, incident_id=incident_id, hospital_id=data.get('assigned_hospital_id'),
+                patient_count=data['patient_count'])
     return incident_id
 
 def get_latest_incident():
@@ -176,6 +413,19 @@ def get_incoming_patient_count(hospital_id, minutes=60):
     conn.close()
     return result['total'] if result['total'] else 0
 
+def get_incoming_patient_counts(minutes=60):
+    """get_incoming_patient_count() for every hospital at once: {hospital_id: patients}."""
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT assigned_hospital_id, SUM(patient_count) as total
+        FROM incidents
+        WHERE assigned_hospital_id IS NOT NULL
+        AND timestamp >= datetime('now', ?)
+        GROUP BY assigned_hospital_id
+    ''', (f'-{minutes} minutes',)).fetchall()
+    conn.close()
+    return {r['assigned_hospital_id']: r['total'] or 0 for r in rows}
+
 def create_alert(hospital_id, message, severity):
     conn = get_db_connection()
     conn.execute('''
@@ -0,0 +1,115 @@
+"""
+Hospital selection for reported incidents.
+
+The policy used by POST /api/incidents, kept free of Flask and the database so
+the virtual-time simulation can replay incident streams through exactly the
+same decision (or through an alternative policy with the same signature).
+"""
+import math
+
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """
+    Calculate the great circle distance between two points
+    on the earth (specified in decimal degrees)
+    """
+    # convert decimal degrees to radians
+    lon1, lat1, lon2, lat2 = map(math.radians, [lon1, lat1, lon2, lat2])
+
+    # haversine formula
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
+    c = 2 * math.asin(math.sqrt(a))
+    r = 6371 # Radius of earth in kilometers. Use 3956 for miles
+    return c * r
+
+
+def select_hospital(hospitals, user_lat=None, user_lon=None, patient_count=1):
+    """
+    Pick the hospital for an incident. Returns (hospital, distance_km), or
+    (None, 0.0) when there are no hospitals. The hospital dicts get 'distance'
+    and 'total_score' keys when a location is given.
+    """
+    # Filter out hospitals with 0 beds
+    available_hospitals = [h for h in hospitals if h['bed_availability'] > 0]
+
+    if not available_hospitals:
+        # Fallback if ALL hospitals are full (should ideally trigger a different workflow)
+        available_hospitals = list(hospitals)
+    if not available_hospitals:
+        return None, 0.0
+
+    # Calculate distances and scores if user location is provided
+    if user_lat and user_lon:
+        try:
+            user_lat = float(user_lat)
+            user_lon = float(user_lon)
+
+            # Logic: Allow Red hospitals if patient count is low (<= 2)
+            # If few patients, we can squeeze them in even if busy, if it's much closer.
+            is_small_incident = patient_count <= 2
+
+            for h in available_hospitals:
+                # 1. Distance
+                dist = calculate_distance(user_lat, user_lon, h['latitude'], h['longitude'])
+                h['distance'] = dist
+
+                # 2. Bed Score (Inverse: more beds = lower score)
+                # Add 1 to avoid division by zero, though we filtered > 0 already
+                bed_score = (1 / (h['bed_availability'] + 1)) * 10
+
+                # 3. Status Penalty
+                status_penalty = 0
+                status = h.get('status', 'Green')
+
+                if status == 'Yellow':
+                    status_penalty = 5
+                elif status == 'Red':
+                    if is_small_incident:
+                        status_penalty = 10 # Reduced penalty (similar to Yellow)
+                    else:
+                        status_penalty = 100 # Heavy penalty for larger groups
+
+                # Total Score (Lower is better)
+                # User requested Distance weight = 70%
+                # We'll use 0.7 for distance and keep others as additive penalties
+                h['total_score'] = (dist * 0.7) + bed_score + status_penalty
+
+            # Pick the best one (lowest total score)
+            best_hospital = min(available_hospitals, key=lambda x: x.get('total_score', float('inf')))
+            return best_hospital, round(best_hospital['distance'], 1)
+
+        except (ValueError, TypeError):
+            # Fallback if coords are invalid
+            return available_hospitals[0], 0.0
+
+    # If no location, pick based on beds and status
+    # Simple score: Beds - StatusPenalty (Higher is better here, so we invert logic or just sort)
+    # Let's just sort by beds descending for now as fallback
+    return max(available_hospitals, key=lambda x: x['bed_availability']), 0.0
+
+
+def nearest_hospital(hospitals, user_lat=None, user_lon=None, patient_count=1):
+    """
+    Baseline policy: the closest hospital with a free bed, ignoring status.
+    Same signature and return value as select_hospital.
+    """
+    available_hospitals = [h for h in hospitals if h['bed_availability'] > 0] or list(hospitals)
+    if not available_hospitals:
+        return None, 0.0
+    try:
+        user_lat, user_lon = float(user_lat), float(user_lon)
+    except (TypeError, ValueError):
+        return max(available_hospitals, key=lambda x: x['bed_availability']), 0.0
+    best_hospital = min(
+        available_hospitals,
+        key=lambda h: calculate_distance(user_lat, user_lon, h['latitude'], h['longitude'])
+    )
+    return best_hospital, round(calculate_distance(user_lat, user_lon, best_hospital['latitude'], best_hospital['longitude']), 1)
+
+
+POLICIES = {
+    "default": select_hospital,
+    "nearest": nearest_hospital,
+}
@@ -0,0 +1,336 @@
+"""
+Discrete-event hospital simulation on virtual time, for capacity planning.
+
+Unlike the live HospitalSimulation (wall-clock sleeps, writes to hospital.db),
+VirtualSimulation works on a deep copy of the hospital rows and advances a
+virtual clock from event to event as fast as the CPU allows:
+  - "tick" events step every hospital at once with simulation.step_state, the
+    vectorized step the live loop uses, with the virtual hour fed to the model;
+  - "incident" events route an incident through a dispatch policy, count
+    its patients as incoming at the assigned hospital for `incoming_window`
+    virtual seconds (the live loop's 60-minute SQL window) and re-predict
+    that hospital's status, as the live status worker does.
+
+All randomness comes from RNGs seeded from `seed`, so the same inputs give the
+same report. Incident streams can be replayed from the incidents table
+(read-only), a JSON file, or generated as a Poisson process.
+
+Usage (from backend/):
+    python -m src.event_simulation --days 7 --seed 42
+    python -m src.event_simulation --days 7 --policy nearest --replay-db --out week.json
+"""
+import os
+import sys
+import copy
+import json
+import time
+import heapq
+import random
+import logging
+import argparse
+from collections import deque, Counter
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .simulation import SimulationState, RandomWalkTransition, STATUSES, step_state, predict_status
+from .dispatch import POLICIES, select_hospital
+
+logger = logging.getLogger(__name__)
+
+# Fixed default start so runs don't depend on when they were launched
+DEFAULT_START = datetime(2025, 1, 6)  # a Monday, 00:00
+
+
+# -----------------------------------------------------------------------------
+# Incident streams: lists of {"time": virtual seconds from start, "latitude",
+# "longitude", "patient_count", "severity"} sorted by time
+# -----------------------------------------------------------------------------
+def _city_bounds(hospitals):
+    lats = [h['latitude'] for h in hospitals if h.get('latitude') is not None]
+    lons = [h['longitude'] for h in hospitals if h.get('longitude') is not None]
+    return min(lats), max(lats), min(lons), max(lons)
+
+
+def generate_incidents(hospitals, duration, rate_per_hour, rng):
+    """Poisson arrivals at `rate_per_hour`, located uniformly over the hospitals' bounding box."""
+    lat_min, lat_max, lon_min, lon_max = _city_bounds(hospitals)
+    incidents = []
+    t = 0.0
+    rate = rate_per_hour / 3600.0
+    while rate > 0:
+        t += rng.expovariate(rate)
+        if t >= duration:
+            break
+        incidents.append({
+            "time": t,
+            "latitude": rng.uniform(lat_min, lat_max),
+            "longitude": rng.uniform(lon_min, lon_max),
+            # Mostly single patients, occasionally a multi-casualty incident
+            "patient_count": 1 if rng.random() < 0.7 else rng.randint(2, 10),
+            "severity": "Critical" if rng.random() < 0.2 else "Stable",
+        })
+    return incidents
+
+
+def load_incidents_from_db(limit=None):
+    """Recorded incidents (oldest first), timed relative to the first one. Read-only."""
+    from .database import get_db_connection
+    conn = get_db_connection()
+    try:
+        query = '''
+            SELECT latitude, longitude, patient_count, severity, timestamp
+            FROM incidents
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+            ORDER BY timestamp
+        '''
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        rows = conn.execute(query).fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        return []
+    first = datetime.fromisoformat(str(rows[0]['timestamp']))
+    return [
+        {
+            "time": (datetime.fromisoformat(str(r['timestamp'])) - first).total_seconds(),
+            "latitude": r['latitude'],
+            "longitude": r['longitude'],
+            "patient_count": r['patient_count'] or 1,
+            "severity": r['severity'] or "Stable",
+        }
+        for r in rows
+    ]
+
+
+def load_incidents_from_json(path, hospitals, rate_per_hour, rng):
+    """
+    Incidents from a JSON list (e.g. data/incidents.json). Missing fields are
+    filled in: times as Poisson arrivals at `rate_per_hour`, locations
+    uniformly over the city, patient_count from "patients".
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    lat_min, lat_max, lon_min, lon_max = _city_bounds(hospitals)
+    incidents = []
+    t = 0.0
+    for item in items:
+        if item.get("time") is not None:
+            t = float(item["time"])
+        else:
+            t += rng.expovariate(rate_per_hour / 3600.0)
+        lat, lon = item.get("latitude"), item.get("longitude")
+        if lat is None or lon is None:
+            lat, lon = rng.uniform(lat_min, lat_max), rng.uniform(lon_min, lon_max)
+        incidents.append({
+            "time": t,
+            "latitude": float(lat),
+            "longitude": float(lon),
+            "patient_count": int(item.get("patient_count", item.get("patients", 1)) or 1),
+            "severity": item.get("severity") or ("Critical" if item.get("critical") else "Stable"),
+        })
+    return sorted(incidents, key=lambda i: i["time"])
+
+
+def repeat_incidents(incidents, duration):
+    """Tile a recorded stream back to back until it covers `duration` seconds."""
+    if not incidents:
+        return []
+    span = incidents[-1]["time"] + 1.0
+    out = []
+    offset = 0.0
+    while offset < duration:
+        for incident in incidents:
+            t = incident["time"] + offset
+            if t >= duration:
+                return out
+            out.append({**incident, "time": t})
+        offset += span
+    return out
+
+
+# -----------------------------------------------------------------------------
+# Simulation
+# -----------------------------------------------------------------------------
+class VirtualSimulation:
+    def __init__(self, hospitals, seed=0, tick_interval=60.0, start=DEFAULT_START,
+                 transition=None, predict=None, router=select_hospital, incoming_window=3600.0):
+        # Isolated copy: nothing here touches the database or the caller's rows.
+        # The arrays drive the simulation; the dicts mirror them for the router.
+        self.hospitals = copy.deepcopy(list(hospitals))
+        self.state = SimulationState.from_rows(self.hospitals)
+        self._index = {hospital_id: i for i, hospital_id in enumerate(self.state.ids)}
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.tick_interval = float(tick_interval)
+        self.start = start
+        self.transition = transition or RandomWalkTransition()
+        self.predict = predict
+        self.router = router
+        self.incoming_window = float(incoming_window)
+
+        self.now = 0.0
+        self._queue = []  # (time, seq, kind, payload)
+        self._seq = 0
+        # (arrival time, hospital index, patients) still inside the window, oldest first
+        self._arrivals = deque()
+        self._incoming = np.zeros(len(self.state), dtype=np.int64)
+
+        self.events = Counter()
+        self.status_seconds = np.zeros((len(self.state), len(STATUSES)))  # virtual seconds per hospital/status
+        self.assignments = Counter()
+        self.assigned_status = Counter()
+        self.distance_total = 0.0
+        self.routed = 0
+        self.unassigned = 0
+        self.shortfalls = 0  # incidents whose hospital's incoming exceeded its free beds
+
+    def schedule(self, at, kind, payload=None):
+        heapq.heappush(self._queue, (at, self._seq, kind, payload))
+        self._seq += 1
+
+    def add_incidents(self, incidents):
+        for incident in incidents:
+            self.schedule(float(incident["time"]), "incident", incident)
+
+    def _expire_arrivals(self):
+        cutoff = self.now - self.incoming_window
+        while self._arrivals and self._arrivals[0][0] < cutoff:
+            _, i, patients = self._arrivals.popleft()
+            self._incoming[i] -= patients
+
+    def _tick(self):
+        self._expire_arrivals()
+        self.status_seconds[np.arange(len(self.state)), self.state.status] += self.tick_interval
+        hour = (self.start + timedelta(seconds=self.now)).hour
+        idx, masks = step_state(self.state, self._incoming, self.rng, self.transition, self.predict, hour)
+        for i, (_, changes) in zip(idx.tolist(), self.state.changes(idx, masks)):
+            self.hospitals[i].update(changes)
+        self.schedule(self.now + self.tick_interval, "tick")
+
+    def _incident(self, incident):
+        hospital, distance_km = self.router(
+            self.hospitals, incident["latitude"], incident["longitude"], incident["patient_count"]
+        )
+        if hospital is None:
+            self.unassigned += 1
+            return
+        i = self._index[hospital['hospital_id']]
+        patients = incident["patient_count"]
+        self._expire_arrivals()
+        self._arrivals.append((self.now, i, patients))
+        self._incoming[i] += patients
+        status_before = hospital.get('status') or 'Green'
+        hour = (self.start + timedelta(seconds=self.now)).hour
+        status = predict_status(self.state, np.array([i]), self._incoming, self.predict, hour)[0]
+        hospital['status'] = STATUSES[status]
+
+        self.routed += 1
+        self.distance_total += distance_km
+        self.assignments[hospital['hospital_id']] += 1
+        self.assigned_status[status_before] += 1
+        if self._incoming[i] > hospital['bed_availability']:
+            self.shortfalls += 1
+
+    def run(self, duration):
+        """Process events until `duration` virtual seconds have passed; returns report()."""
+        started = time.perf_counter()
+        if not any(kind == "tick" for _, _, kind, _ in self._queue):
+            self.schedule(self.now, "tick")
+        while self._queue and self._queue[0][0] < duration:
+            self.now, _, kind, payload = heapq.heappop(self._queue)
+            self.events[kind] += 1
+            if kind == "tick":
+                self._tick()
+            else:
+                self._incident(payload)
+        self.now = max(self.now, float(duration))
+        return self.report(time.perf_counter() - started)
+
+    def report(self, wall_seconds=None):
+        total_status = self.status_seconds.sum(axis=0)
+        status_total = total_status.sum() or 1.0
+        names = {h['hospital_id']: h['hospital_name'] for h in self.hospitals}
+
+        return {
+            "seed": self.seed,
+            "policy": getattr(self.router, "__name__", str(self.router)),
+            "virtual_start": self.start.isoformat(),
+            "virtual_end": (self.start + timedelta(seconds=self.now)).isoformat(),
+            "virtual_seconds": self.now,
+            "wall_seconds": round(wall_seconds, 3) if wall_seconds is not None else None,
+            "speedup": round(self.now / wall_seconds) if wall_seconds else None,
+            "hospitals": len(self.hospitals),
+            "events": dict(self.events),
+            "status_share": {s: round(float(total_status[i] / status_total), 4) for i, s in enumerate(STATUSES)},
+            "incidents": {
+                "routed": self.routed,
+                "unassigned": self.unassigned,
+                "mean_distance_km": round(self.distance_total / self.routed, 2) if self.routed else None,
+                "assigned_status_share": {
+                    s: round(self.assigned_status[s] / self.routed, 4) if self.routed else 0.0 for s in STATUSES
+                },
+                "bed_shortfalls": self.shortfalls,
+            },
+            "busiest_hospitals": [
+                {"hospital_id": hid, "hospital_name": names.get(hid), "incidents": n}
+                for hid, n in self.assignments.most_common(5)
+            ],
+            "final_state": [
+                {k: h.get(k) for k in ("hospital_id", "er_admissions", "bed_availability",
+                                       "ambulance_arrivals", "status")}
+                for h in self.hospitals
+            ],
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the hospital simulation on virtual time.")
+    parser.add_argument("--days", type=float, default=7.0, help="virtual days to simulate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tick", type=float, default=60.0, help="virtual seconds between simulation steps")
+    parser.add_argument("--rate", type=float, default=6.0, help="incidents per virtual hour (generated streams)")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="default")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--replay-db", action="store_true", help="replay the incidents table, repeated to fill the run")
+    source.add_argument("--replay-json", help="replay incidents from a JSON file")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    from .database import get_all_hospitals
+    hospitals = get_all_hospitals()
+    if not hospitals:
+        print("No hospitals in the database; run the app once to seed it.", file=sys.stderr)
+        return 1
+
+    duration = args.days * 86400
+    # Separate stream so the incidents don't depend on how many steps the simulator draws
+    incident_rng = random.Random(f"{args.seed}:incidents")
+    if args.replay_db:
+        incidents = repeat_incidents(load_incidents_from_db(), duration)
+    elif args.replay_json:
+        incidents = repeat_incidents(
+            load_incidents_from_json(args.replay_json, hospitals, args.rate, incident_rng), duration
+        )
+    else:
+        incidents = generate_incidents(hospitals, duration, args.rate, incident_rng)
+
+    sim = VirtualSimulation(hospitals, seed=args.seed, tick_interval=args.tick, router=POLICIES[args.policy])
+    sim.add_incidents(incidents)
+    report = sim.run(duration)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+        logger.info(f"Report written to {args.out}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""
+In-process event bus for hospital state changes.
+
+database.py publishes after each committed write:
+  - INCIDENT_CREATED  {"incident_id", "hospital_id", "patient_count"}
+  - HOSPITAL_UPDATED  {"hospital_ids": [...], "fields": [...columns written]}
+Every event also carries "topic" and "time" (epoch seconds at publish).
+
+Handlers run synchronously in the publishing thread (usually a request or
+the simulator), so they should only record the event and return; slow work
+belongs on a worker thread (see status_worker). A failing handler is logged
+and does not affect the publisher or the other handlers.
+
+The bus is per process: under gunicorn each worker only sees its own writes.
+"""
+import time
+import logging
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+INCIDENT_CREATED = "incident.created"
+HOSPITAL_UPDATED = "hospital.updated"
+
+
+class EventBus:
+    def __init__(self):
+        self._handlers = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic, handler):
+        """Call handler(event) for every event published on `topic`."""
+        with self._lock:
+            if handler not in self._handlers[topic]:
+                self._handlers[topic].append(handler)
+
+    def unsubscribe(self, topic, handler):
+        with self._lock:
+            if handler in self._handlers.get(topic, ()):
+                self._handlers[topic].remove(handler)
+
+    def publish(self, topic, **payload):
+        handlers = self._handlers.get(topic)
+        if not handlers:
+            return 0
+        event = {"topic": topic, "time": time.time(), **payload}
+        with self._lock:
+            handlers = list(handlers)
+        for handler in handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                logger.error(f"Event handler {getattr(handler, '__qualname__', handler)} failed on {topic}: {e}")
+        return len(handlers)
+
+
+bus = EventBus()
@@ -0,0 +1,160 @@
+# src/feature_engine.py
+"""
+Shared feature engine for training (step4), routing (step5) and forecasting (step7).
+
+All lag and rolling-window features are computed in one pass over a frame that is
+sorted once by (hospital_id, timestamp). Rolling means/stds use prefix sums over
+each hospital's block instead of one groupby().rolling() call per column, so the
+cost is a handful of NumPy array ops per target regardless of how many lags and
+windows are requested.
+"""
+import numpy as np
+import pandas as pd
+
+# prefix -> source column
+TARGETS = {
+    "adm": "admission",
+    "icu": "icu_occup",
+    "vent": "ventilators_used",
+}
+LAGS = (1, 2, 3, 7, 14, 30)
+WINDOWS = (3, 7, 14, 30)
+# targets that also get a rolling std per window
+STD_TARGETS = ("adm",)
+
+SAFETY_COLUMNS = [
+    "festival", "outbreak", "readiness_index", "patient_inflow", "avg_treatment_time",
+    "bed_occupancy_rate", "icu_occupancy_rate", "ventilator_utilization",
+    "staff_utilization", "hour", "dow", "is_peak", "is_night", "is_festival",
+    "pollution_season", "weather_surge", "is_weekend"
+]
+
+
+def _group_layout(ids: np.ndarray):
+    """Return (group_start_per_row, position_in_group) for rows already sorted by id."""
+    n = len(ids)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    is_start = np.ones(n, dtype=bool)
+    is_start[1:] = ids[1:] != ids[:-1]
+    starts = np.flatnonzero(is_start)
+    sizes = np.diff(np.append(starts, n))
+    row_start = np.repeat(starts, sizes)
+    return row_start, np.arange(n) - row_start
+
+
+def _lag(values: np.ndarray, pos: np.ndarray, lag: int) -> np.ndarray:
+    out = np.full(len(values), np.nan)
+    if lag < len(values):
+        out[lag:] = values[:-lag]
+        out[pos < lag] = np.nan
+    return out
+
+
+def _rolling_stats(values, row_start, windows, with_std):
+    """
+    Rolling mean (and optionally sample std) with min_periods=1, matching
+    pandas groupby().rolling(w, min_periods=1) semantics including NaN handling.
+    """
+    n = len(values)
+    idx = np.arange(n)
+    valid = ~np.isnan(values)
+
+    # center each hospital on its own mean to keep the sum-of-squares prefix well conditioned
+    starts = np.unique(row_start)
+    grp_sum = np.add.reduceat(np.where(valid, values, 0.0), starts) if n else np.zeros(0)
+    grp_cnt = np.add.reduceat(valid.astype(np.float64), starts) if n else np.zeros(0)
+    grp_mean = np.divide(grp_sum, grp_cnt, out=np.zeros_like(grp_sum), where=grp_cnt > 0)
+    shift = np.repeat(grp_mean, np.diff(np.append(starts, n)))
+    centered = np.where(valid, values - shift, 0.0)
+
+    c_cnt = np.concatenate(([0.0], np.cumsum(valid)))
+    c_sum = np.concatenate(([0.0], np.cumsum(centered)))
+    c_sq = np.concatenate(([0.0], np.cumsum(centered * centered))) if with_std else None
+
+    result = {}
+    for w in windows:
+        lo = np.maximum(idx - w + 1, row_start)
+        cnt = c_cnt[idx + 1] - c_cnt[lo]
+        s = c_sum[idx + 1] - c_sum[lo]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(cnt > 0, s / cnt, np.nan)
+            std = None
+            if with_std:
+                sq = c_sq[idx + 1] - c_sq[lo]
+                var = (sq - s * s / cnt) / (cnt - 1)
+                std = np.where(cnt > 1, np.sqrt(np.clip(var, 0.0, None)), np.nan)
+        result[w] = (mean + shift, std)
+    return result
+
+
+def add_lag_roll_features(df: pd.DataFrame, targets=TARGETS, lags=LAGS, windows=WINDOWS,
+                          std_targets=STD_TARGETS) -> pd.DataFrame:
+    """
+    Add {prefix}_lag_{k}, {prefix}_roll_{w} and {prefix}_roll_std_{w} columns.
+
+    `df` must already be sorted by (hospital_id, timestamp). Column order matches
+    the original per-column groupby implementation in step4 so saved feature
+    lists stay valid.
+    """
+    row_start, pos = _group_layout(df["hospital_id"].astype(str).to_numpy())
+    sources = {
+        prefix: pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)
+        if col in df.columns else np.full(len(df), np.nan)
+        for prefix, col in targets.items()
+    }
+
+    cols = {}
+    for lag in lags:
+        for prefix, values in sources.items():
+            cols[f"{prefix}_lag_{lag}"] = _lag(values, pos, lag)
+
+    stats = {
+        prefix: _rolling_stats(values, row_start, windows, prefix in std_targets)
+        for prefix, values in sources.items()
+    }
+    for w in windows:
+        for prefix in sources:
+            cols[f"{prefix}_roll_{w}"] = stats[prefix][w][0]
+        for prefix in sources:
+            if prefix in std_targets:
+                cols[f"{prefix}_roll_std_{w}"] = stats[prefix][w][1]
+
+    feats = pd.DataFrame(cols, index=df.index)
+    df = df.drop(columns=[c for c in feats.columns if c in df.columns])
+    return pd.concat([df, feats], axis=1)
+
+
+def add_calendar_features(df: pd.DataFrame) -> pd.DataFrame:
+    ts = df["timestamp"].dt
+    df["day_of_year"] = ts.dayofyear.fillna(0).astype(int)
+    df["week_of_year"] = ts.isocalendar().week.fillna(0).astype(int)
+    df["is_month_end"] = ts.is_month_end.astype(int)
+    df["is_month_start"] = ts.is_month_start.astype(int)
+    df["is_quarter_end"] = ts.is_quarter_end.astype(int)
+    df["is_quarter_start"] = ts.is_quarter_start.astype(int)
+    df["is_year_end"] = ts.is_year_end.astype(int)
+    df["is_year_start"] = ts.is_year_start.astype(int)
+    return df
+
+
+def build_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Full model feature frame: one sort, calendar features, lags/rolls, safety columns."""
+    df = df.copy()
+    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+    df = df.sort_values(["hospital_id", "timestamp"], kind="stable")
+
+    df = add_calendar_features(df)
+    df = add_lag_roll_features(df)
+
+    for col in SAFETY_COLUMNS:
+        if col not in df.columns:
+            df[col] = 0
+
+    return df
+
+
+def latest_with_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Latest row per hospital carrying history-derived lag/rolling features."""
+    feats = build_features(df)
+    return feats.groupby("hospital_id", sort=False).tail(1).reset_index(drop=True)
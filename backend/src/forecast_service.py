@@ -0,0 +1,163 @@
+import os
+import threading
+import logging
+from datetime import datetime
+
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNAPSHOT_PATH = os.path.join(BACKEND_DIR, "dataset", "clean_snapshot.csv")
+MODEL_DIR = os.path.join(BACKEND_DIR, "models")
+MODEL_FILES = [os.path.join(MODEL_DIR, f"{name}_model.joblib") for name in ("adm", "icu", "vent")]
+
+HORIZONS = (7, 30)
+REFRESH_INTERVAL = int(os.getenv("FORECAST_REFRESH_SECONDS", "3600"))
+CHECK_INTERVAL = 30  # how often to look for a changed snapshot/model
+
+
+def _fingerprint():
+    """(mtime, size) of every input; a change means cached forecasts are stale."""
+    fp = []
+    for path in [SNAPSHOT_PATH] + MODEL_FILES:
+        try:
+            st = os.stat(path)
+            fp.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            fp.append((path, None, None))
+    return tuple(fp)
+
+
+class ForecastService:
+    """
+    Precomputes forecasts in the background and serves them from memory.
+
+    One run of the longest horizon is computed per refresh; shorter horizons are
+    its leading days, so every horizon is consistent. Results are stored keyed by
+    (hospital_id, horizon) and swapped in as a whole, so readers never see a
+    half-built cache. A refresh happens every REFRESH_INTERVAL seconds, or within
+    CHECK_INTERVAL seconds of the snapshot or a model file changing.
+    """
+
+    def __init__(self, horizons=HORIZONS, refresh_interval=REFRESH_INTERVAL, check_interval=CHECK_INTERVAL):
+        self.horizons = tuple(sorted(horizons))
+        self.refresh_interval = refresh_interval
+        self.check_interval = check_interval
+        self._cache = None  # {"by_key": {(hid, h): [...]}, "all": {h: {hid: [...]}}, ...}
+        self._fingerprint = None
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+        self.thread = None
+        self.running = False
+        self.last_error = None
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self._run_loop, daemon=True)
+            self.thread.start()
+            logger.info("Forecast service started.")
+
+    def stop(self):
+        self.running = False
+        self._wake.set()
+        if self.thread:
+            self.thread.join()
+
+    def invalidate(self):
+        """Force a recompute on the next loop iteration (e.g. after retraining)."""
+        self._fingerprint = None
+        self._wake.set()
+
+    @property
+    def ready(self):
+        return self._cache is not None
+
+    def _run_loop(self):
+        last_refresh = 0.0
+        while self.running:
+            now = datetime.now().timestamp()
+            stale = _fingerprint() != self._fingerprint
+            if stale or now - last_refresh >= self.refresh_interval:
+                try:
+                    self.refresh()
+                    last_refresh = now
+                except Exception as e:
+                    self.last_error = str(e)
+                    logger.error(f"Forecast refresh failed: {e}")
+            self._wake.wait(self.check_interval)
+            self._wake.clear()
+
+    def refresh(self):
+        """Recompute all horizons and atomically replace the cache."""
+        with self._refresh_lock:
+            fingerprint = _fingerprint()
+            started = datetime.now()
+            # imported here so the API doesn't pay for pandas/joblib at startup
+            from .step7_forecast import ForecastEngine, load_history, load_models
+            engine = ForecastEngine(load_history(SNAPSHOT_PATH), load_models(MODEL_DIR))
+            df = engine.run(days=max(self.horizons), start=started.date())
+            df["date"] = df["date"].map(lambda d: d.isoformat())
+
+            records = {hid: grp.drop(columns="hospital_id").to_dict(orient="records")
+                       for hid, grp in df.groupby("hospital_id", sort=False)}
+            by_key, all_h = {}, {}
+            for h in self.horizons:
+                all_h[h] = {hid: rows[:h] for hid, rows in records.items()}
+                for hid, rows in all_h[h].items():
+                    by_key[(str(hid), h)] = rows
+
+            self._cache = {
+                "by_key": by_key,
+                "all": all_h,
+                "generated_at": started.isoformat(timespec="seconds"),
+                "compute_seconds": round((datetime.now() - started).total_seconds(), 3),
+            }
+            self._fingerprint = fingerprint
+            self.last_error = None
+            logger.info(f"Forecasts refreshed for {len(records)} hospitals in {self._cache['compute_seconds']}s")
+
+    def _horizon(self, horizon):
+        """Smallest precomputed horizon covering the request."""
+        for h in self.horizons:
+            if horizon <= h:
+                return h
+        return None
+
+    def get_all(self, horizon):
+        cache = self._cache
+        h = self._horizon(horizon)
+        if cache is None or h is None:
+            return None
+        return {
+            "horizon": horizon,
+            "generated_at": cache["generated_at"],
+            "forecasts": {hid: rows[:horizon] for hid, rows in cache["all"][h].items()},
+        }
+
+    def get_hospital(self, hospital_id, horizon):
+        cache = self._cache
+        h = self._horizon(horizon)
+        if cache is None or h is None:
+            return None
+        rows = cache["by_key"].get((str(hospital_id), h))
+        if rows is None:
+            return None
+        return {
+            "hospital_id": hospital_id,
+            "horizon": horizon,
+            "generated_at": cache["generated_at"],
+            "forecast": rows[:horizon],
+        }
+
+    def status(self):
+        cache = self._cache
+        return {
+            "ready": cache is not None,
+            "horizons": list(self.horizons),
+            "generated_at": cache["generated_at"] if cache else None,
+            "compute_seconds": cache["compute_seconds"] if cache else None,
+            "last_error": self.last_error,
+        }
+
+forecast_service = ForecastService()
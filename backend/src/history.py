@@ -0,0 +1,305 @@
+"""
+Append-only load history for hospital_load, with minute/hour/day rollups.
+
+Every insert or update of a hospital_load row is copied into
+hospital_load_history by SQLite triggers, so the simulator, admin updates and
+bulk seeding all record history without extra code at the call sites. Raw rows
+are stamped with epoch seconds to the millisecond and never replace each other,
+so a status write landing in the same second as a simulator tick is kept as its
+own sample. Rows are clustered by (hospital_id, ts) — a per-hospital time
+range is one index range scan.
+
+HistoryMaintainer periodically folds new raw rows into hospital_load_rollup
+(minute from raw, hour from minute, day from hour; each touched bucket is
+recomputed, so re-running is idempotent) and deletes rows past their
+retention. Queries over long ranges read rollups instead of raw rows.
+"""
+import os
+import time
+import threading
+import logging
+from datetime import datetime
+
+from .database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+MINUTE, HOUR, DAY = 60, 3600, 86400
+RESOLUTIONS = {"raw": None, "minute": MINUTE, "hour": HOUR, "day": DAY}
+
+# Retention in days per level (0 keeps forever)
+RETENTION_DAYS = {
+    "raw": float(os.getenv("HISTORY_RAW_DAYS", "7")),
+    "minute": float(os.getenv("HISTORY_MINUTE_DAYS", "30")),
+    "hour": float(os.getenv("HISTORY_HOUR_DAYS", "365")),
+    "day": float(os.getenv("HISTORY_DAY_DAYS", "0")),
+}
+MAINTENANCE_INTERVAL = int(os.getenv("HISTORY_MAINTENANCE_SECONDS", "60"))
+MAX_QUERY_ROWS = 10000
+
+_SAMPLE_COLUMNS = "er_admissions, bed_availability, ambulance_arrivals, staff_capacity, total_beds, status"
+# ts is epoch seconds to the millisecond, nudged 1 ms past the hospital's
+# last sample when two writes share a millisecond, so no sample replaces another
+_SNAPSHOT_TRIGGER_BODY = f'''
+    INSERT INTO hospital_load_history (hospital_id, ts, {_SAMPLE_COLUMNS})
+    VALUES (NEW.hospital_id,
+            MAX(ROUND((julianday('now') - 2440587.5) * 86400.0, 3),
+                COALESCE((SELECT MAX(ts) FROM hospital_load_history WHERE hospital_id = NEW.hospital_id) + 0.001, 0)),
+            NEW.er_admissions, NEW.bed_availability,
+            NEW.ambulance_arrivals, NEW.staff_capacity, NEW.total_beds, NEW.status);
+'''
+
+_ROLLUP_FROM_RAW = '''
+    INSERT INTO hospital_load_rollup (resolution, hospital_id, bucket, samples,
+        er_sum, er_min, er_max, beds_sum, beds_min, beds_max, amb_sum, staff_sum)
+    SELECT ?, hospital_id, (CAST(ts AS INTEGER) / ?) * ?, COUNT(*),
+        SUM(er_admissions), MIN(er_admissions), MAX(er_admissions),
+        SUM(bed_availability), MIN(bed_availability), MAX(bed_availability),
+        SUM(ambulance_arrivals), SUM(staff_capacity)
+    FROM hospital_load_history WHERE ts >= ?
+    GROUP BY hospital_id, CAST(ts AS INTEGER) / ?
+    ON CONFLICT (resolution, hospital_id, bucket) DO UPDATE SET
+        samples = excluded.samples, er_sum = excluded.er_sum, er_min = excluded.er_min, er_max = excluded.er_max,
+        beds_sum = excluded.beds_sum, beds_min = excluded.beds_min, beds_max = excluded.beds_max,
+        amb_sum = excluded.amb_sum, staff_sum = excluded.staff_sum
+'''
+
+_ROLLUP_FROM_ROLLUP = '''
+    INSERT INTO hospital_load_rollup (resolution, hospital_id, bucket, samples,
+        er_sum, er_min, er_max, beds_sum, beds_min, beds_max, amb_sum, staff_sum)
+    SELECT ?, hospital_id, (bucket / ?) * ?, SUM(samples),
+        SUM(er_sum), MIN(er_min), MAX(er_max),
+        SUM(beds_sum), MIN(beds_min), MAX(beds_max),
+        SUM(amb_sum), SUM(staff_sum)
+    FROM hospital_load_rollup WHERE resolution = ? AND bucket >= ?
+    GROUP BY hospital_id, bucket / ?
+    ON CONFLICT (resolution, hospital_id, bucket) DO UPDATE SET
+        samples = excluded.samples, er_sum = excluded.er_sum, er_min = excluded.er_min, er_max = excluded.er_max,
+        beds_sum = excluded.beds_sum, beds_min = excluded.beds_min, beds_max = excluded.beds_max,
+        amb_sum = excluded.amb_sum, staff_sum = excluded.staff_sum
+'''
+
+
+def init_history():
+    """Create history/rollup tables and the hospital_load triggers that feed them."""
+    conn = get_db_connection()
+    conn.executescript(f'''
+        CREATE TABLE IF NOT EXISTS hospital_load_history (
+            hospital_id TEXT NOT NULL,
+            ts REAL NOT NULL,
+            er_admissions INTEGER,
+            bed_availability INTEGER,
+            ambulance_arrivals INTEGER,
+            staff_capacity INTEGER,
+            total_beds INTEGER,
+            status TEXT,
+            PRIMARY KEY (hospital_id, ts)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_history_ts ON hospital_load_history (ts);
+
+        CREATE TABLE IF NOT EXISTS hospital_load_rollup (
+            resolution INTEGER NOT NULL,
+            hospital_id TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            er_sum REAL, er_min INTEGER, er_max INTEGER,
+            beds_sum REAL, beds_min INTEGER, beds_max INTEGER,
+            amb_sum REAL, staff_sum REAL,
+            PRIMARY KEY (resolution, hospital_id, bucket)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_rollup_bucket ON hospital_load_rollup (resolution, bucket);
+
+        CREATE TABLE IF NOT EXISTS history_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+
+        -- recreated on every start so existing databases pick up trigger changes
+        DROP TRIGGER IF EXISTS hospital_load_history_ins;
+        DROP TRIGGER IF EXISTS hospital_load_history_upd;
+        CREATE TRIGGER hospital_load_history_ins AFTER INSERT ON hospital_load
+        BEGIN {_SNAPSHOT_TRIGGER_BODY} END;
+        CREATE TRIGGER hospital_load_history_upd
+        AFTER UPDATE OF {_SAMPLE_COLUMNS} ON hospital_load
+        BEGIN {_SNAPSHOT_TRIGGER_BODY} END;
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def _floor(ts, step):
+    return (int(ts) // step) * step
+
+
+def rollup_history(now=None):
+    """
+    Fold raw rows written since the last run into minute/hour/day rollups.
+    Returns the number of minute buckets (re)computed.
+    """
+    now = int(now if now is not None else time.time())
+    conn = get_db_connection()
+    try:
+        with conn:
+            row = conn.execute("SELECT value FROM history_meta WHERE key = 'rollup_watermark'").fetchone()
+            # a few seconds of slack for rows stamped in the same second as the last run
+            watermark = (row[0] if row else 0) - 5
+            cur = conn.execute(_ROLLUP_FROM_RAW, (MINUTE, MINUTE, MINUTE, _floor(max(watermark, 0), MINUTE), MINUTE))
+            minutes = cur.rowcount
+            for res, finer in ((HOUR, MINUTE), (DAY, HOUR)):
+                conn.execute(_ROLLUP_FROM_ROLLUP, (res, res, res, finer, _floor(max(watermark, 0), res), res))
+            conn.execute(
+                "INSERT INTO history_meta (key, value) VALUES ('rollup_watermark', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (now,)
+            )
+        return minutes
+    finally:
+        conn.close()
+
+
+def apply_retention(now=None):
+    """Delete raw and rollup rows older than their RETENTION_DAYS. Returns rows deleted."""
+    now = int(now if now is not None else time.time())
+    deleted = 0
+    conn = get_db_connection()
+    try:
+        with conn:
+            if RETENTION_DAYS["raw"] > 0:
+                cutoff = now - int(RETENTION_DAYS["raw"] * DAY)
+                deleted += conn.execute("DELETE FROM hospital_load_history WHERE ts < ?", (cutoff,)).rowcount
+            for name in ("minute", "hour", "day"):
+                if RETENTION_DAYS[name] > 0:
+                    cutoff = now - int(RETENTION_DAYS[name] * DAY)
+                    deleted += conn.execute(
+                        "DELETE FROM hospital_load_rollup WHERE resolution = ? AND bucket < ?",
+                        (RESOLUTIONS[name], cutoff),
+                    ).rowcount
+    finally:
+        conn.close()
+    return deleted
+
+
+def _to_epoch(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    value = str(value)
+    if value.endswith(("Z", "z")):
+        value = value[:-1] + "+00:00"  # fromisoformat only accepts "Z" from Python 3.11
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+def query_history(hospital_id, since=None, until=None, resolution="hour", limit=1000):
+    """
+    Load samples for one hospital, oldest first.
+
+    `resolution` is raw|minute|hour|day; `since`/`until` are ISO timestamps or
+    epoch seconds (until is exclusive). Rollup rows carry avg/min/max values.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    limit = max(1, min(int(limit), MAX_QUERY_ROWS))
+    lo = _to_epoch(since) or 0
+    hi = _to_epoch(until) or 2 ** 62
+
+    conn = get_db_connection()
+    try:
+        if resolution == "raw":
+            rows = conn.execute(f'''
+                SELECT ts, {_SAMPLE_COLUMNS} FROM hospital_load_history
+                WHERE hospital_id = ? AND ts >= ? AND ts < ? ORDER BY ts LIMIT ?
+            ''', (str(hospital_id), lo, hi, limit)).fetchall()
+            return [
+                {"timestamp": datetime.fromtimestamp(r["ts"]).isoformat(), **{k: r[k] for k in r.keys() if k != "ts"}}
+                for r in rows
+            ]
+        rows = conn.execute('''
+            SELECT * FROM hospital_load_rollup
+            WHERE resolution = ? AND hospital_id = ? AND bucket >= ? AND bucket < ? ORDER BY bucket LIMIT ?
+        ''', (RESOLUTIONS[resolution], str(hospital_id), _floor(lo, RESOLUTIONS[resolution]), hi, limit)).fetchall()
+    finally:
+        conn.close()
+
+    return [{
+        "timestamp": datetime.fromtimestamp(r["bucket"]).isoformat(),
+        "samples": r["samples"],
+        "er_admissions_avg": round(r["er_sum"] / r["samples"], 3),
+        "er_admissions_min": r["er_min"],
+        "er_admissions_max": r["er_max"],
+        "bed_availability_avg": round(r["beds_sum"] / r["samples"], 3),
+        "bed_availability_min": r["beds_min"],
+        "bed_availability_max": r["beds_max"],
+        "ambulance_arrivals_avg": round(r["amb_sum"] / r["samples"], 3),
+        "staff_capacity_avg": round(r["staff_sum"] / r["samples"], 3),
+    } for r in rows]
+
+
+def training_samples(horizon=HOUR, resolution=MINUTE, since=None):
+    """
+    (features, target) rows for the congestion model from minute rollups:
+    averages at bucket t and the ER admissions average at t + horizon.
+    Returns a list of tuples (er, beds, ambulances, staff, hour, target_er).
+    """
+    lo = _to_epoch(since) or 0
+    conn = get_db_connection()
+    try:
+        rows = conn.execute('''
+            SELECT a.er_sum / a.samples, a.beds_sum / a.samples, a.amb_sum / a.samples,
+                   a.staff_sum / a.samples, a.bucket, b.er_sum / b.samples
+            FROM hospital_load_rollup a
+            JOIN hospital_load_rollup b
+              ON b.resolution = a.resolution AND b.hospital_id = a.hospital_id AND b.bucket = a.bucket + ?
+            WHERE a.resolution = ? AND a.bucket >= ?
+        ''', (int(horizon), int(resolution), lo)).fetchall()
+    finally:
+        conn.close()
+    return [(er, beds, amb, staff, datetime.fromtimestamp(bucket).hour, target)
+            for er, beds, amb, staff, bucket, target in rows]
+
+
+class HistoryMaintainer:
+    """Background rollup + retention loop; with a coordinator only the lease holder runs it."""
+
+    def __init__(self, interval=MAINTENANCE_INTERVAL, coordinator=None):
+        self.interval = interval
+        self.coordinator = coordinator
+        self.running = False
+        self.thread = None
+        self._wake = threading.Event()
+        self.last_run = None
+        self.last_error = None
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self._run_loop, daemon=True)
+            self.thread.start()
+            logger.info("History maintainer started.")
+
+    def stop(self):
+        self.running = False
+        self._wake.set()
+        if self.thread:
+            self.thread.join()
+
+    def run_once(self):
+        minutes = rollup_history()
+        deleted = apply_retention()
+        self.last_run = datetime.now()
+        if deleted:
+            logger.info(f"History retention removed {deleted} rows")
+        return {"minute_buckets": minutes, "deleted": deleted}
+
+    def _run_loop(self):
+        while self.running:
+            self._wake.wait(self.interval)
+            if not self.running:
+                break
+            if self.coordinator is not None and not self.coordinator.is_leader:
+                continue
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"History maintenance failed: {e}")
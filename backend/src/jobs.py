@@ -0,0 +1,194 @@
+import uuid
+import threading
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised by JobManager.submit when the bounded queue has no room."""
+
+    def __init__(self, retry_after):
+        super().__init__("job queue is full")
+        self.retry_after = retry_after
+
+
+class Job:
+    """A unit of background work with status and progress that the API can poll."""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.progress = 0.0
+        self.message = None
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def wait_seconds(self):
+        """Time spent queued before a worker picked the job up."""
+        if self.started_at is None:
+            return None
+        return (self.started_at - self.created_at).total_seconds()
+
+    def report(self, progress, message=None):
+        """Progress callback handed to the job function (progress in 0..1)."""
+        self.progress = max(0.0, min(1.0, float(progress)))
+        if message:
+            self.message = message
+
+    def to_dict(self, include_result=True):
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "message": self.message,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "wait_seconds": round(self.wait_seconds, 3) if self.wait_seconds is not None else None,
+        }
+        if include_result:
+            data["result"] = self.result
+        return data
+
+
+class JobManager:
+    """
+    Runs job functions on a small thread pool and keeps the most recent jobs
+    in memory for status lookups (every unfinished job, plus finished ones up
+    to `history` in total).
+
+    Job functions are called as fn(*args, progress=job.report, **kwargs); their
+    return value becomes job.result, an exception marks the job failed.
+
+    With max_queue set, at most that many jobs may wait for a worker; further
+    submits raise QueueFull carrying a Retry-After estimate in seconds.
+    """
+
+    def __init__(self, name, max_workers=1, history=100, max_queue=None):
+        self.name = name
+        self.history = history
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._submitted = 0
+        self._rejected = 0
+        self._waits = deque(maxlen=200)
+        self._durations = deque(maxlen=200)
+
+    def submit(self, fn, *args, kind=None, **kwargs):
+        job, _ = self._submit(fn, args, kwargs, kind, reuse_active=False)
+        return job
+
+    def submit_unique(self, fn, *args, kind=None, **kwargs):
+        """
+        Like submit(), but if a job of this kind is already queued or running,
+        return it instead of starting another. Returns (job, created).
+        """
+        return self._submit(fn, args, kwargs, kind, reuse_active=True)
+
+    def _submit(self, fn, args, kwargs, kind, reuse_active):
+        kind = kind or self.name
+        with self._lock:
+            if reuse_active:
+                active = next((j for j in self._jobs.values() if j.kind == kind and j.finished_at is None), None)
+                if active is not None:
+                    return active, False
+            if self.max_queue is not None and self._queued >= self.max_queue:
+                self._rejected += 1
+                raise QueueFull(self._retry_after())
+            job = Job(kind)
+            self._queued += 1
+            self._submitted += 1
+            self._jobs[job.id] = job
+            self._evict()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job, True
+
+    def _evict(self):
+        # called with the lock held: drop the oldest finished jobs beyond `history`;
+        # queued and running jobs are never dropped, so their ids stay pollable
+        excess = len(self._jobs) - self.history
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, j in self._jobs.items() if j.finished_at is not None]
+        for job_id in finished[:excess]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def queue_position(self, job):
+        """1-based position among queued jobs, or None once the job has started."""
+        if job.status != "queued":
+            return None
+        with self._lock:
+            queued = [j for j in self._jobs.values() if j.status == "queued"]
+        return next((i + 1 for i, j in enumerate(queued) if j is job), None)
+
+    def _retry_after(self):
+        # called with the lock held: time for the queue ahead to drain, at least 1s
+        avg = sum(self._durations) / len(self._durations) if self._durations else 1.0
+        return max(1, int(round(avg * (self._queued + 1) / self.max_workers)))
+
+    def stats(self):
+        """Queue depth, worker usage and recent wait/run times for monitoring."""
+        with self._lock:
+            waits = sorted(self._waits)
+            durations = list(self._durations)
+            return {
+                "name": self.name,
+                "workers": self.max_workers,
+                "running": self._running,
+                "queue_depth": self._queued,
+                "queue_capacity": self.max_queue,
+                "submitted": self._submitted,
+                "rejected": self._rejected,
+                "wait_seconds": {
+                    "avg": round(sum(waits) / len(waits), 3) if waits else None,
+                    "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else None,
+                    "max": round(waits[-1], 3) if waits else None,
+                },
+                "run_seconds_avg": round(sum(durations) / len(durations), 3) if durations else None,
+            }
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        job.started_at = datetime.now()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._waits.append(job.wait_seconds)
+        try:
+            job.result = fn(*args, progress=job.report, **kwargs)
+            job.status = "succeeded"
+            job.progress = 1.0
+        except Exception as e:
+            logger.error(f"{self.name} job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = datetime.now()
+            with self._lock:
+                self._running -= 1
+                self._durations.append((job.finished_at - job.started_at).total_seconds())
+                self._evict()
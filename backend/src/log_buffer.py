@@ -0,0 +1,194 @@
+"""
+In-memory log ring buffer served by /api/logs, and per-call-site rate limiting.
+
+`log_buffer` is a logging handler on the root logger that keeps the last
+LOG_BUFFER_SIZE records as small dicts with increasing ids. emit() formats the
+entry outside any lock, then assigns the id and appends under one small lock,
+so ids in the deque are always contiguous and in order; it never does I/O.
+Readers copy the deque and filter the copy. A cursor is the id of the last
+entry a client has seen.
+
+`RateLimitFilter` caps how often one call site (file + line) can emit within a
+window; the next record that gets through carries the number suppressed.
+"""
+import os
+import time
+import logging
+import itertools
+import threading
+from collections import deque
+from datetime import datetime
+
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", "2000"))
+# Per call site: at most LOG_RATE_LIMIT records every LOG_RATE_WINDOW seconds
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "5"))
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "10"))
+
+MAX_PAGE_SIZE = 1000
+
+
+class RingBufferHandler(logging.Handler):
+    def __init__(self, capacity=LOG_BUFFER_SIZE, level=logging.INFO):
+        super().__init__(level=level)
+        self._entries = deque(maxlen=capacity)
+        self._ids = itertools.count(1)
+        # Held only for next id + append; not the Handler's I/O lock
+        self._append_lock = threading.Lock()
+
+    @property
+    def capacity(self):
+        return self._entries.maxlen
+
+    def handle(self, record):
+        # No handler lock: emit takes its own lock just for the append
+        rv = self.filter(record)
+        if rv:
+            self.emit(record)
+        return rv
+
+    def emit(self, record):
+        try:
+            entry = {
+                "id": None,
+                "timestamp": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+                "created": record.created,
+                "level": record.levelname,
+                "levelno": record.levelno,
+                "logger": record.name,
+                "message": record.getMessage(),
+                "thread": record.threadName,
+            }
+            # Id and append together, so ids stay contiguous in deque order
+            with self._append_lock:
+                entry["id"] = next(self._ids)
+                self._entries.append(entry)
+        except Exception:
+            self.handleError(record)
+
+    def last_id(self):
+        entries = self._entries.copy()
+        return entries[-1]["id"] if entries else 0
+
+    def query(self, cursor=None, level=None, since=None, until=None, logger=None, limit=100):
+        """
+        Returns (entries, next_cursor, truncated), entries oldest first.
+
+        With a cursor: entries after it, up to `limit` (follow with next_cursor).
+        Without one: the newest `limit` matching entries. `truncated` is true when
+        entries after the cursor were already evicted from the buffer. `level` is
+        a minimum level; since/until are epoch seconds or ISO timestamps.
+        Raises ValueError for an unknown level or unparseable time.
+        """
+        entries = self._entries.copy()  # one C-level copy; appends may continue meanwhile
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        min_level = _level_number(level)
+        since, until = _to_timestamp(since), _to_timestamp(until)
+
+        truncated = False
+        if cursor is not None:
+            if entries and (entries[0]["id"] > cursor + 1 or cursor > entries[-1]["id"]):
+                # evicted past the cursor, or the cursor predates a restart
+                truncated = True
+                start = 0
+            else:
+                # ids are contiguous, so the cursor's position is arithmetic
+                start = cursor + 1 - entries[0]["id"] if entries else 0
+            candidates = itertools.islice(entries, start, None)
+        else:
+            candidates = reversed(entries)
+
+        matched = []
+        last_scanned = None
+        for e in candidates:
+            last_scanned = e["id"]
+            if e["levelno"] < min_level:
+                continue
+            if since is not None and e["created"] < since:
+                continue
+            if until is not None and e["created"] > until:
+                continue
+            if logger and not e["logger"].startswith(logger):
+                continue
+            matched.append(e)
+            if len(matched) >= limit:
+                break
+
+        if cursor is None:
+            matched.reverse()
+            next_cursor = entries[-1]["id"] if entries else 0
+        else:
+            next_cursor = last_scanned if last_scanned is not None else cursor
+        return [_public(e) for e in matched], next_cursor, truncated
+
+
+def _public(entry):
+    return {k: entry[k] for k in ("id", "timestamp", "level", "logger", "message", "thread")}
+
+
+def _to_timestamp(value):
+    """Epoch seconds or an ISO-8601 string (local time) -> epoch seconds."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value)).timestamp()
+
+
+def _level_number(level):
+    if level is None or level == "":
+        return logging.NOTSET
+    if isinstance(level, int) or str(level).isdigit():
+        return int(level)
+    number = logging.getLevelName(str(level).upper())
+    if not isinstance(number, int):
+        raise ValueError(f"unknown log level: {level}")
+    return number
+
+
+class RateLimitFilter(logging.Filter):
+    """Allow at most `limit` records per call site every `window` seconds."""
+
+    def __init__(self, limit=LOG_RATE_LIMIT, window=LOG_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._sites = {}  # (pathname, lineno) -> [window start, emitted, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site else 0
+                site = self._sites[key] = [now, 0, 0]
+            else:
+                suppressed = 0
+            if site[1] >= self.limit:
+                site[2] += 1
+                return False
+            site[1] += 1
+        if suppressed:
+            record.msg = f"{record.msg} [{suppressed} similar messages suppressed]"
+        return True
+
+
+def rate_limited_logger(name):
+    """logging.getLogger(name) with a RateLimitFilter attached (once)."""
+    logger = logging.getLogger(name)
+    if not any(isinstance(f, RateLimitFilter) for f in logger.filters):
+        logger.addFilter(RateLimitFilter())
+    return logger
+
+
+log_buffer = RingBufferHandler()
+
+
+def install(logger=None):
+    """Attach the ring buffer to `logger` (root by default); safe to call repeatedly."""
+    logger = logger or logging.getLogger()
+    if log_buffer not in logger.handlers:
+        logger.addHandler(log_buffer)
+    return log_buffer
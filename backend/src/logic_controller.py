@@ -1,6 +1,12 @@
 import subprocess
 import sys
 import os
+import logging
+
+from .metrics import stage
+from .tracing import span, current_span
+from .plan_archive import plan_writer
+from .plan_cache import plan_cache, make_key, current_state_version
 
 # --- New: Make paths explicit and robust ---
 # This finds the absolute path to the 'backend' directory.
@@ -8,6 +14,13 @@ import os
 # We go up two levels (from src/ to backend/) to get the root.
 BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+logger = logging.getLogger(__name__)
+
+
+def _tail(text, lines=20):
+    return "\n".join((text or "").splitlines()[-lines:])
+
+
 def run_script(script_name, input_str=None):
     """
     Runs a Python script using a subprocess, ensuring the correct
@@ -17,10 +30,7 @@ def run_script(script_name, input_str=None):
         # Construct the full, absolute path to the script to run
         script_path = os.path.join(BACKEND_DIR, 'src', script_name)
         
-        print(f"--- Running Subprocess ---")
-        print(f"Script: {script_path}")
-        print(f"Working Directory: {BACKEND_DIR}")
-        print(f"Input provided: {'Yes' if input_str else 'No'}")
+        logger.info(f"Running {script_name} (cwd={BACKEND_DIR}, input={'yes' if input_str else 'no'})")
 
         # --- FIX: Create a clean environment that forces Python to use UTF-8 ---
         # This is the most reliable way to prevent UnicodeEncodeError on Windows.
@@ -28,32 +38,30 @@ def run_script(script_name, input_str=None):
         env["PYTHONIOENCODING"] = "utf-8"
         
         # Execute the script
-        process = subprocess.run(
-            [sys.executable, script_path],
-            input=input_str,
-            text=True,
-            capture_output=True,
-            check=True,  # This will raise an exception if the script fails
-            cwd=BACKEND_DIR,  # IMPORTANT: Set the working directory
-            encoding='utf-8', 
-            errors='replace',
-            env=env # Pass the modified environment to the subprocess
-        )
-        print(f"--- Subprocess Success ---")
-        print(process.stdout)
+        with span("subprocess", script=script_name):
+            process = subprocess.run(
+                [sys.executable, script_path],
+                input=input_str,
+                text=True,
+                capture_output=True,
+                check=True,  # This will raise an exception if the script fails
+                cwd=BACKEND_DIR,  # IMPORTANT: Set the working directory
+                encoding='utf-8', 
+                errors='replace',
+                env=env # Pass the modified environment to the subprocess
+            )
+        logger.info(f"{script_name} succeeded ({len(process.stdout.splitlines())} lines of output)")
+        logger.debug(process.stdout)
         return True
     except subprocess.CalledProcessError as e:
         # This block catches errors from within the script itself
-        print(f"--- Subprocess FAILED ---")
-        print(f"Error running {script_name}:")
-        print(f"Return Code: {e.returncode}")
-        print("\n--- STDOUT ---")
-        print(e.stdout)
-        print("\n--- STDERR ---")
-        print(e.stderr)
+        logger.error(
+            f"{script_name} failed with return code {e.returncode}\n"
+            f"--- STDOUT (tail) ---\n{_tail(e.stdout)}\n--- STDERR (tail) ---\n{_tail(e.stderr)}"
+        )
         return False
     except FileNotFoundError:
-        print(f"Error: Script not found at {script_path}")
+        logger.error(f"Script not found at {script_path}")
         return False
 
 
@@ -84,3 +92,53 @@ def run_full_simulation(location: str, critical_patients: int, stable_patients:
 
     return True
 
+
+def generate_action_plan(location: str, critical_patients: int, stable_patients: int, scenario, use_cache=True):
+    """
+    In-process pipeline: step5 routing + step6 action plan, without subprocesses
+    or the last_routing.json round-trip.
+
+    The snapshot and models are cached between calls. The returned dict has the
+    same shape as plans/last_routing.json; it is handed to the background plan
+    writer for persistence and returned immediately.
+
+    Identical requests against unchanged hospital state and models are served
+    from plan_cache (and not archived again); pass use_cache=False to force a
+    fresh plan. Callers must treat the returned dict as read-only.
+    """
+    with span("generate_action_plan", scenario=str(scenario), critical=critical_patients,
+              stable=stable_patients, use_cache=use_cache):
+        return _generate_action_plan(location, critical_patients, stable_patients, scenario, use_cache)
+
+
+def _generate_action_plan(location, critical_patients, stable_patients, scenario, use_cache):
+    key = make_key(location, critical_patients, stable_patients, scenario)
+    version = current_state_version()
+    if use_cache:
+        cached = plan_cache.get(key, version)
+        current_span().set(cache_hit=cached is not None)
+        if cached is not None:
+            return cached
+
+    # pandas-heavy pipeline modules load on first use (or during warmup)
+    from .step5_agent_logic import load_latest_snapshot, resolve_scenario, route_incident, routing_payload
+    from .step6_action_plan import build_action_plan
+
+    scenario_name = resolve_scenario(scenario)
+    latest = load_latest_snapshot()
+    routing, scored, scaled_crit, scaled_stable = route_incident(
+        latest, location, critical_patients, stable_patients, scenario_name
+    )
+    with stage("action_plan", hospitals_used=len(routing)):
+        plan = routing_payload(location, scenario_name, scaled_crit, scaled_stable, routing, scored)
+        plan["action_plan"] = build_action_plan(plan)
+    plan_writer.submit(plan)
+    plan_cache.put(key, version, plan)
+    return plan
+
+
+def warmup():
+    """Import the pipeline and load the snapshot features and models ahead of the first plan."""
+    from .step5_agent_logic import load_latest_snapshot, load_model_and_features
+    load_latest_snapshot()
+    load_model_and_features()
@@ -0,0 +1,278 @@
+"""
+In-process metrics in the Prometheus text exposition format, served at /metrics.
+
+Counters and histograms are plain thread-safe objects kept in one registry:
+  - http_request_duration_seconds{method, route, status}: every Flask route
+  - plan_stage_duration_seconds{stage, outcome}: pipeline stages timed with
+    `with stage("geocode"): ...` (each also a tracing span)
+  - simulation_tick_duration_seconds, simulation_tick_lag_seconds and
+    simulation_stepped_hospitals_total{reason}: the adaptive simulator loop
+  - status_recomputes_total{result} and status_recompute_delay_seconds: the
+    event-driven status worker
+  - db_query_duration_seconds{operation, caller}: statements run through
+    database.TimedConnection, labelled by the calling function
+  - cache_requests_total{cache, result} and cache_hit_ratio{cache}
+  - trace_spans_dropped{reason}: spans the trace exporter lost (queue full or
+    a failed write)
+
+Values are per process; under gunicorn each worker exposes its own series, so
+scrape every worker (or aggregate by instance) rather than one load-balanced URL.
+No third-party client library is needed, which keeps this importable from the
+pipeline scripts as well.
+"""
+import os
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+try:
+    from .tracing import span, collector as trace_collector
+except ImportError:  # imported by the pipeline scripts run from backend/
+    from tracing import span, collector as trace_collector
+
+# Seconds; spans sub-millisecond queries up to slow multi-second plans
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def collect(self):
+        lines = self.header()
+        for key, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [per-bucket counts (last is +Inf), sum, count]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """{label values: {"buckets": cumulative counts, "sum": s, "count": n}}"""
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        out = {}
+        for key, (counts, total, count) in series.items():
+            cumulative, running = [], 0
+            for c in counts:
+                running += c
+                cumulative.append(running)
+            out[key] = {"buckets": cumulative, "sum": total, "count": count}
+        return out
+
+    def collect(self):
+        lines = self.header()
+        bounds = self.buckets + (float("inf"),)
+        for key, series in sorted(self.snapshot().items()):
+            for bound, count in zip(bounds, series["buckets"]):
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class GaugeFunction(_Metric):
+    """A gauge whose values are read at scrape time: fn() -> {label values tuple: value}."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, fn, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def collect(self):
+        lines = self.header()
+        for key, value in sorted(self.fn().items()):
+            if value is None:
+                continue
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name):
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def exposition(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Flask request latency by route template.",
+    ("method", "route", "status"),
+))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "plan_stage_duration_seconds", "Latency of internal plan pipeline stages.",
+    ("stage", "outcome"),
+))
+SIMULATION_TICK_SECONDS = REGISTRY.register(Histogram(
+    "simulation_tick_duration_seconds", "Duration of one hospital simulation step.",
+))
+SIMULATION_TICK_LAG_SECONDS = REGISTRY.register(Histogram(
+    "simulation_tick_lag_seconds", "How late simulation ticks start relative to their schedule.",
+))
+SIMULATION_STEPPED_HOSPITALS = REGISTRY.register(Counter(
+    "simulation_stepped_hospitals_total", "Hospitals stepped by the simulator, by why they were due.",
+    ("reason",),
+))
+STATUS_RECOMPUTES = REGISTRY.register(Counter(
+    "status_recomputes_total", "Event-driven hospital status re-predictions: changed, unchanged, or stale (row rewritten meanwhile).",
+    ("result",),
+))
+STATUS_RECOMPUTE_DELAY_SECONDS = REGISTRY.register(Histogram(
+    "status_recompute_delay_seconds", "Time from an incident/update event to its hospital's status recompute.",
+))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "db_query_duration_seconds", "SQLite statement execution time by operation and calling function.",
+    ("operation", "caller"),
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit/miss).",
+    ("cache", "result"),
+))
+
+
+def _cache_hit_ratios():
+    totals = {}
+    for (cache, result), value in CACHE_REQUESTS.values().items():
+        hits, total = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (value if result == "hit" else 0), total + value)
+    return {(cache,): round(hits / total, 4) for cache, (hits, total) in totals.items() if total}
+
+
+REGISTRY.register(GaugeFunction(
+    "cache_hit_ratio", "Hits / lookups per cache since process start.", _cache_hit_ratios, ("cache",),
+))
+REGISTRY.register(GaugeFunction(
+    "trace_spans_dropped", "Spans not exported since process start, by reason.",
+    lambda: {("queue_full",): trace_collector.overflowed, ("export_error",): trace_collector.dropped},
+    ("reason",),
+))
+
+_PROCESS_START = time.time()
+REGISTRY.register(GaugeFunction(
+    "process_start_time_seconds", "Start time of this process (unix seconds).",
+    lambda: {(): _PROCESS_START},
+))
+REGISTRY.register(GaugeFunction(
+    "process_pid", "PID of the worker exposing these series.", lambda: {(): os.getpid()},
+))
+
+
+@contextmanager
+def stage(name, **attributes):
+    """Time a pipeline stage into plan_stage_duration_seconds, as a trace span when traced."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        with span(name, **attributes) as sp:
+            yield sp
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name, outcome=outcome)
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def exposition():
+    return REGISTRY.exposition()
@@ -0,0 +1,323 @@
+"""
+Indexed archive of generated action plans.
+
+Replaces the flat plans/routing_<timestamp>.json history with one SQLite file:
+plans are stored as zlib-compressed compact JSON, with indexes on creation
+time, location, scenario and (via plan_hospitals) each assigned hospital.
+Ids grow with insertion time, so "newest first" is an index walk on id.
+A running counter in archive_meta keeps status checks O(1).
+
+The API persists plans through `plan_writer`, a single background thread, so
+serialization and disk writes stay off the request path.
+"""
+import os
+import re
+import json
+import zlib
+import glob
+import queue
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+try:
+    from .metrics import stage
+    from .tracing import capture, continue_trace
+except ImportError:  # imported by step6 run as a script from backend/
+    from metrics import stage
+    from tracing import capture, continue_trace
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLANS_DIR = os.getenv("PLANS_DIR", os.path.join(BACKEND_DIR, "plans"))
+ARCHIVE_PATH = os.getenv("PLAN_ARCHIVE_PATH", os.path.join(PLANS_DIR, "plan_archive.db"))
+LAST_PLAN_PATH = os.path.join(PLANS_DIR, "last_routing.json")
+
+MAX_QUERY_LIMIT = 500
+# How long a worker waits for another worker's legacy import to finish
+LEGACY_IMPORT_TIMEOUT_MS = 120000
+
+_LEGACY_NAME = re.compile(r"routing_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})\.json$")
+
+
+def get_archive_connection():
+    conn = sqlite3.connect(ARCHIVE_PATH, timeout=10)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_archive():
+    """Create the archive tables/indexes; import legacy JSON history on first use."""
+    os.makedirs(os.path.dirname(ARCHIVE_PATH), exist_ok=True)
+    conn = get_archive_connection()
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS plans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TEXT NOT NULL,
+            location TEXT,
+            location_key TEXT,
+            scenario TEXT,
+            total_critical INTEGER,
+            total_stable INTEGER,
+            hospitals_used INTEGER,
+            payload BLOB NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_plans_created ON plans (created_at);
+        CREATE INDEX IF NOT EXISTS idx_plans_location ON plans (location_key, id);
+        CREATE INDEX IF NOT EXISTS idx_plans_scenario ON plans (scenario, id);
+
+        CREATE TABLE IF NOT EXISTS plan_hospitals (
+            hospital_id TEXT NOT NULL,
+            plan_id INTEGER NOT NULL,
+            PRIMARY KEY (hospital_id, plan_id)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS archive_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO archive_meta (key, value) VALUES ('plan_count', 0);
+    ''')
+    conn.commit()
+
+    # Every app worker runs this at import: the check and the import share one
+    # write transaction, so one worker imports and the others wait for it and
+    # then find the 'legacy_imported' marker.
+    conn.isolation_level = None
+    conn.execute(f"PRAGMA busy_timeout = {LEGACY_IMPORT_TIMEOUT_MS}")
+    imported = 0
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            done = conn.execute("SELECT 1 FROM archive_meta WHERE key = 'legacy_imported'").fetchone()
+            if not done:
+                empty = conn.execute("SELECT value FROM archive_meta WHERE key = 'plan_count'").fetchone()[0] == 0
+                if empty:
+                    imported = _import_legacy(conn, PLANS_DIR)
+                conn.execute("INSERT INTO archive_meta (key, value) VALUES ('legacy_imported', ?)", (imported,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    if imported:
+        logger.info(f"Imported {imported} legacy plan files into {ARCHIVE_PATH}")
+
+
+def _encode(plan):
+    return zlib.compress(json.dumps(plan, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def _decode(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def _location_key(location):
+    return " ".join(str(location or "").lower().split())
+
+
+def _insert(conn, plan, created_at=None):
+    action_plan = plan.get("action_plan") or {}
+    created_at = (
+        created_at
+        or action_plan.get("action_plan_generated_at")
+        or plan.get("generated_at")
+        or datetime.now().isoformat(timespec="seconds")
+    )
+    assignments = plan.get("assignments") or []
+    hospital_ids = sorted({str(a.get("hospital_id")) for a in assignments if a.get("hospital_id") is not None})
+
+    cur = conn.execute('''
+        INSERT INTO plans (created_at, location, location_key, scenario, total_critical, total_stable, hospitals_used, payload)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        created_at, plan.get("incident_location"), _location_key(plan.get("incident_location")),
+        str(plan.get("scenario") or "normal").lower(),
+        int(plan.get("total_critical") or 0), int(plan.get("total_stable") or 0),
+        len(hospital_ids), _encode(plan),
+    ))
+    plan_id = cur.lastrowid
+    conn.executemany(
+        "INSERT OR IGNORE INTO plan_hospitals (hospital_id, plan_id) VALUES (?, ?)",
+        [(hid, plan_id) for hid in hospital_ids],
+    )
+    conn.execute("UPDATE archive_meta SET value = value + 1 WHERE key = 'plan_count'")
+    return plan_id
+
+
+def archive_plan(plan, created_at=None):
+    """Store one plan (routing + action_plan dict); returns its archive id."""
+    conn = get_archive_connection()
+    try:
+        with conn:
+            return _insert(conn, plan, created_at)
+    finally:
+        conn.close()
+
+
+def import_legacy_plans(plans_dir=PLANS_DIR):
+    """Load existing plans/routing_<timestamp>.json files into the archive (oldest first)."""
+    conn = get_archive_connection()
+    try:
+        with conn:
+            return _import_legacy(conn, plans_dir)
+    finally:
+        conn.close()
+
+
+def _import_legacy(conn, plans_dir):
+    # runs inside the caller's transaction
+    count = 0
+    for path in sorted(glob.glob(os.path.join(plans_dir, "routing_*.json"))):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                plan = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Skipping unreadable plan file {path}: {e}")
+            continue
+        m = _LEGACY_NAME.search(os.path.basename(path))
+        created_at = (
+            datetime.strptime(m.group(1), "%Y-%m-%d_%H-%M-%S").isoformat(timespec="seconds") if m else None
+        )
+        _insert(conn, plan, created_at)
+        count += 1
+    return count
+
+
+def count_plans():
+    conn = get_archive_connection()
+    try:
+        row = conn.execute("SELECT value FROM archive_meta WHERE key = 'plan_count'").fetchone()
+        return row[0] if row else 0
+    finally:
+        conn.close()
+
+
+def get_plan(plan_id):
+    conn = get_archive_connection()
+    try:
+        row = conn.execute("SELECT id, created_at, payload FROM plans WHERE id = ?", (plan_id,)).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    return {"plan_id": row["id"], "created_at": row["created_at"], **_decode(row["payload"])}
+
+
+def query_plans(location=None, scenario=None, hospital_id=None, since=None, until=None,
+                before_id=None, limit=50):
+    """
+    Plan summaries, newest first. `since`/`until` are ISO timestamps; `before_id`
+    pages backwards from a previous result's last plan_id.
+    """
+    limit = max(1, min(int(limit), MAX_QUERY_LIMIT))
+    sql = '''SELECT p.id, p.created_at, p.location, p.scenario, p.total_critical, p.total_stable, p.hospitals_used
+             FROM plans p'''
+    where, params = [], []
+    if hospital_id:
+        sql += " JOIN plan_hospitals ph ON ph.plan_id = p.id"
+        where.append("ph.hospital_id = ?")
+        params.append(str(hospital_id))
+    if location:
+        where.append("p.location_key = ?")
+        params.append(_location_key(location))
+    if scenario:
+        where.append("p.scenario = ?")
+        params.append(str(scenario).lower())
+    if since:
+        where.append("p.created_at >= ?")
+        params.append(since)
+    if until:
+        where.append("p.created_at < ?")
+        params.append(until)
+    if before_id:
+        where.append("p.id < ?")
+        params.append(int(before_id))
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY p.id DESC LIMIT ?"
+    params.append(limit)
+
+    conn = get_archive_connection()
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+    return [{"plan_id": r["id"], **{k: r[k] for k in r.keys() if k != "id"}} for r in rows]
+
+
+def save_latest_plan(plan, path=LAST_PLAN_PATH):
+    """Write plans/last_routing.json atomically (temp file + rename)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, indent=2, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+
+def persist_plan(plan):
+    """Save as the latest plan and archive it; returns the archive id."""
+    with stage("persistence", hospitals_used=len(plan.get("assignments") or ())):
+        save_latest_plan(plan)
+        return archive_plan(plan)
+
+
+class PlanWriter:
+    """
+    Persists plans on one background thread, in submission order.
+
+    submit() only enqueues, so callers return the plan without waiting on JSON
+    encoding, compression or SQLite commits. flush() blocks until everything
+    queued so far is written.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+        self.last_plan_id = None
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="plan-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, plan):
+        self._ensure_started()
+        # the write shows up as a span of the submitting request's trace
+        self._queue.put((plan, capture()))
+
+    def flush(self, timeout=None):
+        """Wait until all submitted plans are persisted (timeout in seconds)."""
+        if timeout is None:
+            self._queue.join()
+            return True
+        done = threading.Event()
+        threading.Thread(target=lambda: (self._queue.join(), done.set()), daemon=True).start()
+        return done.wait(timeout)
+
+    def pending(self):
+        return self._queue.unfinished_tasks
+
+    def _run(self):
+        while True:
+            plan, trace_parent = self._queue.get()
+            try:
+                with continue_trace(trace_parent, "plan_writer"):
+                    self.last_plan_id = persist_plan(plan)
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Failed to persist plan: {e}")
+            finally:
+                self._queue.task_done()
+
+
+plan_writer = PlanWriter()
@@ -0,0 +1,99 @@
+"""
+Memoization of generated plans for repeated identical requests.
+
+Entries are keyed by the normalized request (location, patient counts,
+scenario) plus a state version: the hospital_load write counter and the
+mtimes of the snapshot and model files. Any capacity update or retrain
+changes the version, so a stale plan is never served; TTL and LRU bound how
+long and how many plans are kept.
+"""
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+from .database import get_state_version
+from .metrics import cache_lookup
+
+logger = logging.getLogger(__name__)
+
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "256"))
+PLAN_CACHE_TTL = float(os.getenv("PLAN_CACHE_TTL", "30"))
+
+
+def make_key(location, critical_patients, stable_patients, scenario):
+    """Normalize request inputs so trivially different spellings share an entry."""
+    from .step5_agent_logic import resolve_scenario
+    return (
+        " ".join(str(location or "").lower().split()),
+        int(critical_patients),
+        int(stable_patients),
+        resolve_scenario(scenario),
+    )
+
+
+def current_state_version():
+    """Everything a plan depends on besides the request itself."""
+    from .step5_agent_logic import file_stamp, DATA_PATH, MODEL_PATH, ADM_MODEL_PATH, ICU_MODEL_PATH, VENT_MODEL_PATH
+    try:
+        db_version = get_state_version("hospital_load")
+    except Exception as e:
+        logger.warning(f"Could not read hospital_load version: {e}")
+        db_version = None
+    return (db_version, file_stamp(DATA_PATH, ADM_MODEL_PATH, ICU_MODEL_PATH, VENT_MODEL_PATH, MODEL_PATH))
+
+
+class PlanCache:
+    """Thread-safe TTL + LRU map from (request key, state version) to a plan."""
+
+    def __init__(self, maxsize=PLAN_CACHE_SIZE, ttl=PLAN_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version or now - entry[1] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                cache_lookup("plan", False)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            cache_lookup("plan", True)
+            return entry[2]
+
+    def put(self, key, version, plan):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), plan)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+            }
+
+
+plan_cache = PlanCache()
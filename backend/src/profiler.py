@@ -0,0 +1,320 @@
+"""
+On-demand sampling profiler for the plan pipeline.
+
+An admin starts a session for the next N matching requests or for a time
+window. While a session runs, a sampler thread reads sys._current_frames()
+every PROFILE_INTERVAL_MS and counts the stacks of the threads currently
+serving matching requests (or plan jobs), so optimize_routing, model inference
+and the SQLite layer show up with their callers. A profiled request that queues
+a background job hands it a token, so the job is sampled as part of that
+request and a request-count session only ends once the job has finished too. Stacks are kept in collapsed
+form ("root;caller;callee count"), which flamegraph.pl, speedscope and
+inferno read directly.
+
+When no session is active nothing runs: the request hooks check one attribute
+and return.
+"""
+import os
+import sys
+import time
+import uuid
+import threading
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+PROFILE_MAX_REQUESTS = 1000
+DEFAULT_ROUTES = ("/generate-plan",)
+
+# Functions whose inclusive share is reported separately
+FOCUS = {
+    "optimize_routing": ("optimize_routing",),
+    "model_inference": ("predict_surges", "predict_congestion"),
+    "database": ("database.py", "plan_archive.py", "history.py", "coordinator.py"),
+}
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class SamplingProfiler:
+    def __init__(self, interval_ms=PROFILE_INTERVAL_MS):
+        self.interval_ms = interval_ms
+        self._session = None
+        self._last = None
+        self._lock = threading.Lock()
+        self._tracked = {}  # thread ident -> label
+        self._labels = {}  # code object -> frame label
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def active(self):
+        return self._session is not None
+
+    # ---- session control ----
+    def start(self, requests=None, seconds=None, routes=DEFAULT_ROUTES, all_threads=False, interval_ms=None):
+        """Profile the next `requests` matching requests, or for `seconds` (whichever is given)."""
+        if (requests is None) == (seconds is None):
+            raise ValueError("give exactly one of requests or seconds")
+        if requests is not None and not 1 <= int(requests) <= PROFILE_MAX_REQUESTS:
+            raise ValueError(f"requests must be between 1 and {PROFILE_MAX_REQUESTS}")
+        if seconds is not None and not 0 < float(seconds) <= PROFILE_MAX_SECONDS:
+            raise ValueError(f"seconds must be in (0, {PROFILE_MAX_SECONDS}]")
+        interval = float(interval_ms or self.interval_ms)
+        if not 1 <= interval <= 1000:
+            raise ValueError("interval_ms must be between 1 and 1000")
+
+        with self._lock:
+            if self._session is not None:
+                raise ProfilerBusy(f"profiling session {self._session['id']} is already running")
+            now = time.time()
+            self._session = {
+                "id": uuid.uuid4().hex[:12],
+                "started_at": now,
+                # request-count sessions still end after PROFILE_MAX_SECONDS
+                "deadline": now + (float(seconds) if seconds is not None else PROFILE_MAX_SECONDS),
+                "requests": int(requests) if requests is not None else None,
+                "remaining": int(requests) if requests is not None else None,
+                "profiled_requests": 0,
+                "handed_off": 0,  # tokens given to jobs that have not started yet
+                "routes": tuple(routes or ()),
+                "all_threads": bool(all_threads),
+                "interval_ms": interval,
+                "samples": 0,
+                "stacks": Counter(),
+            }
+            self._tracked.clear()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+            logger.info(f"Profiling session {self._session['id']} started "
+                        f"({'%d requests' % requests if requests is not None else '%ss' % seconds}).")
+            return self._public(self._session)
+
+    def stop(self, reason="stopped"):
+        """End the running session (if any) and return its report."""
+        with self._lock:
+            session = self._session
+            if session is None:
+                return self._last
+            self._session = None
+            self._tracked.clear()
+            self._stop.set()
+            session["stopped_at"] = time.time()
+            session["stop_reason"] = reason
+            self._last = session
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        logger.info(f"Profiling session {session['id']} finished ({reason}, {session['samples']} samples).")
+        return session
+
+    # ---- request / job hooks ----
+    def enter_request(self, route):
+        """Called at request start; tracks this thread if it should be profiled."""
+        session = self._session
+        if session is None:
+            return False
+        if session["routes"] and route not in session["routes"]:
+            return False
+        with self._lock:
+            if self._session is not session:
+                return False
+            if session["remaining"] is not None:
+                if session["remaining"] <= 0:
+                    return False
+                session["remaining"] -= 1
+            session["profiled_requests"] += 1
+            self._tracked[threading.get_ident()] = route
+        return True
+
+    def exit_request(self):
+        self._untrack(self._session, threading.get_ident())
+
+    def hand_off(self):
+        """
+        Called by a profiled request that queues a job; returns a token for
+        track() so the job is sampled as part of this request. A token that
+        never reaches track() must be given back with release().
+        """
+        session = self._session
+        if session is None:
+            return None
+        with self._lock:
+            if self._session is not session:
+                return None
+            session["handed_off"] += 1
+        return session
+
+    def release(self, token):
+        """Give back a hand_off() token whose job will not run (e.g. queue full)."""
+        if token is None:
+            return
+        with self._lock:
+            if self._session is not token:
+                return
+            token["handed_off"] -= 1
+        self._untrack(token, ident=None)
+
+    def _untrack(self, session, ident):
+        """Stop tracking thread `ident`; end a request-count session once nothing is left to profile."""
+        if session is None:
+            return
+        with self._lock:
+            if ident is not None:
+                self._tracked.pop(ident, None)
+            done = (self._session is session and session["remaining"] == 0
+                    and not self._tracked and not session["handed_off"])
+        if done:
+            self.stop("request limit reached")
+
+    @contextmanager
+    def track(self, label, route=None, token=None):
+        """
+        Sample the current thread while a session is active (background plan
+        jobs). With a hand_off() token the job counts as the request that
+        queued it; without one it is sampled only by time-window sessions
+        whose routes include `route`.
+        """
+        session = self._session
+        if session is None:
+            yield
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            if self._session is not session:
+                tracked = False
+            elif token is not None:
+                tracked = token is session
+                if tracked:
+                    session["handed_off"] -= 1
+            else:
+                # untokened jobs were not counted against a request-count session
+                tracked = session["remaining"] is None and (not session["routes"] or route in session["routes"])
+            if tracked:
+                self._tracked[ident] = label
+        if not tracked:
+            yield
+            return
+        try:
+            yield
+        finally:
+            self._untrack(session, ident)
+
+    # ---- sampling ----
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _collapse(self, frame):
+        parts = []
+        while frame is not None:
+            parts.append(self._label(frame.f_code))
+            frame = frame.f_back
+        parts.reverse()
+        return ";".join(parts)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.is_set():
+            session = self._session
+            if session is None:
+                break
+            if time.time() >= session["deadline"]:
+                self.stop("time window elapsed" if session["requests"] is None else "timed out")
+                break
+            with self._lock:
+                tracked = dict(self._tracked)
+            frames = sys._current_frames()
+            if session["all_threads"]:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                targets = {ident: names.get(ident, str(ident)) for ident in frames if ident != own}
+            else:
+                targets = tracked
+            collapsed = [f"{label};{self._collapse(frames[ident])}"
+                         for ident, label in targets.items() if ident in frames]
+            del frames
+            if collapsed:
+                with self._lock:
+                    for stack in collapsed:
+                        session["stacks"][stack] += 1
+                    session["samples"] += 1
+            self._stop.wait(session["interval_ms"] / 1000.0)
+
+    # ---- reports ----
+    def _public(self, session):
+        return {
+            "id": session["id"],
+            "active": session is self._session,
+            "started_at": datetime.fromtimestamp(session["started_at"]).isoformat(timespec="seconds"),
+            "stopped_at": (datetime.fromtimestamp(session["stopped_at"]).isoformat(timespec="seconds")
+                           if session.get("stopped_at") else None),
+            "stop_reason": session.get("stop_reason"),
+            "requests": session["requests"],
+            "profiled_requests": session["profiled_requests"],
+            "routes": list(session["routes"]),
+            "all_threads": session["all_threads"],
+            "interval_ms": session["interval_ms"],
+            "samples": session["samples"],
+        }
+
+    def current(self):
+        return self._session or self._last
+
+    def _stacks(self, session):
+        with self._lock:
+            return Counter(session["stacks"])
+
+    def status(self):
+        session = self.current()
+        return self._public(session) if session else None
+
+    def collapsed(self):
+        """The current (or last) session's stacks in collapsed format, heaviest first."""
+        session = self.current()
+        if session is None:
+            return ""
+        stacks = self._stacks(session)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    def report(self, top=20):
+        session = self.current()
+        if session is None:
+            return None
+        stacks = self._stacks(session)
+        total = sum(stacks.values())
+        self_counts, inclusive = Counter(), Counter()
+        focus = Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(";")[1:]  # drop the thread/route label
+            if frames:
+                self_counts[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+            for name, needles in FOCUS.items():
+                if any(n in frame for frame in frames for n in needles):
+                    focus[name] += count
+
+        def share(counter):
+            return [{"frame": f, "samples": c, "share": round(c / total, 4)} for f, c in counter.most_common(top)]
+
+        return {
+            **self._public(session),
+            "stack_samples": total,
+            "distinct_stacks": len(stacks),
+            "focus": {name: {"samples": focus[name], "share": round(focus[name] / total, 4) if total else 0.0}
+                      for name in FOCUS},
+            "top_self": share(self_counts) if total else [],
+            "top_inclusive": share(inclusive) if total else [],
+        }
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,147 @@
+"""
+Event-driven status recomputation.
+
+StatusRecomputeWorker subscribes to the event bus and re-predicts congestion
+status for just the hospitals an event touched, on a background thread:
+  - INCIDENT_CREATED: the assigned hospital now has more incoming patients;
+  - HOSPITAL_UPDATED without "status" among the written fields: load changed
+    but nobody re-derived the status (e.g. a manual capacity edit).
+Writes that already set a status (the simulator's step, and this worker's own
+status-only writes) are ignored, so recomputation never feeds back into itself.
+A status is only written if the row is unchanged since it was read; if the
+simulator stepped the hospital in between, its fresher status stands.
+
+Events arriving within STATUS_RECOMPUTE_WINDOW of each other are coalesced
+into one batch: one read, one model call and one write transaction per burst.
+"""
+import os
+import time
+import logging
+import threading
+
+import numpy as np
+
+from .events import bus, INCIDENT_CREATED, HOSPITAL_UPDATED
+from .database import get_hospitals, get_incoming_patient_counts, update_statuses_if_unchanged
+from .simulation import SimulationState, STATUSES, predict_status
+from .metrics import STATUS_RECOMPUTES, STATUS_RECOMPUTE_DELAY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+STATUS_RECOMPUTE_WINDOW = float(os.getenv("STATUS_RECOMPUTE_WINDOW", "0.05"))
+
+
+class StatusRecomputeWorker:
+    def __init__(self, window=STATUS_RECOMPUTE_WINDOW):
+        self.window = window
+        self.running = False
+        self.thread = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = {}  # hospital_id -> time of the oldest event waiting for it
+        self.last_batch = None
+        self.last_error = None
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self._run_loop, name="status-worker", daemon=True)
+            self.thread.start()
+            bus.subscribe(INCIDENT_CREATED, self._on_incident)
+            bus.subscribe(HOSPITAL_UPDATED, self._on_hospital_updated)
+            logger.info("Status recompute worker started.")
+
+    def stop(self):
+        bus.unsubscribe(INCIDENT_CREATED, self._on_incident)
+        bus.unsubscribe(HOSPITAL_UPDATED, self._on_hospital_updated)
+        self.running = False
+        self._wake.set()
+        if self.thread:
+            self.thread.join()
+
+    # ---- event handlers (publisher's thread: record and return) ----
+    def _on_incident(self, event):
+        if event.get("hospital_id"):
+            self._enqueue([event["hospital_id"]], event["time"])
+
+    def _on_hospital_updated(self, event):
+        if "status" in event.get("fields", ()):
+            return  # status was derived alongside the change (or is ours)
+        self._enqueue(event.get("hospital_ids", ()), event["time"])
+
+    def _enqueue(self, hospital_ids, at):
+        with self._lock:
+            for hospital_id in hospital_ids:
+                self._pending.setdefault(hospital_id, at)
+        self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    # ---- worker ----
+    def _run_loop(self):
+        while self.running:
+            self._wake.wait()
+            self._wake.clear()
+            if not self.running:
+                break
+            # Let the rest of a burst arrive so it is handled as one batch
+            time.sleep(self.window)
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                continue
+            try:
+                self.recompute(batch)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Status recompute for {len(batch)} hospitals failed: {e}")
+
+    def recompute(self, batch):
+        """
+        Re-predict status for {hospital_id: event time}, counting patients on
+        their way; writes only the statuses that changed, on rows nobody wrote
+        since the read. Returns {hospital_id: new status} for the writes made.
+        """
+        rows = get_hospitals(batch)
+        if not rows:
+            return {}
+        state = SimulationState.from_rows(rows)
+        previous = state.status.copy()
+        incoming_counts = get_incoming_patient_counts()
+        incoming = [incoming_counts.get(hospital_id, 0) for hospital_id in state.ids]
+        predict_status(state, np.arange(len(state)), incoming)
+
+        changed = np.flatnonzero(state.status != previous)
+        timestamps = {r['hospital_id']: r['timestamp'] for r in rows}
+        updates = [(state.ids[i], STATUSES[state.status[i]], timestamps[state.ids[i]]) for i in changed.tolist()]
+        applied = set(update_statuses_if_unchanged(updates)) if updates else set()
+        written = {hospital_id: status for hospital_id, status, _ in updates if hospital_id in applied}
+        now = time.time()
+        for at in batch.values():
+            STATUS_RECOMPUTE_DELAY_SECONDS.observe(max(0.0, now - at))
+        STATUS_RECOMPUTES.inc(len(written), result="changed")
+        STATUS_RECOMPUTES.inc(len(updates) - len(written), result="stale")
+        STATUS_RECOMPUTES.inc(len(state) - len(updates), result="unchanged")
+        self.last_batch = {
+            "at": now,
+            "hospitals": len(state),
+            "changed": written,
+            "stale": len(updates) - len(written),
+        }
+        if written:
+            logger.info(f"Status recomputed for {len(state)} hospitals, {len(written)} changed")
+        return written
+
+    def status(self):
+        return {
+            "running": self.running,
+            "pending": self.pending(),
+            "last_batch": self.last_batch,
+            "last_error": self.last_error,
+        }
+
+
+status_worker = StatusRecomputeWorker()
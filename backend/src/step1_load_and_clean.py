@@ -1,24 +1,70 @@
 # src/step1_load_and_clean.py
+import re
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from pandas.tseries.api import guess_datetime_format
 import holidays
 
 DATA = Path("dataset/hospital_data.csv")
 OUT  = Path("dataset/clean_snapshot.csv")
 OUT.parent.mkdir(parents=True, exist_ok=True)
 
-def load_and_clean():
-    df = pd.read_csv(DATA)
+# Rolling features span this many rows per hospital
+ROLLING_WINDOW = 7
+ROLLING_SOURCES = {
+    "rolling_admissions_7": "admission",
+    "rolling_icu_7": "icu_occup",
+    "rolling_vent_7": "ventilators_used",
+}
+STREAM_CHUNKSIZE = 100_000
+# Hourly timestamps are synthesized from here when the input has no date column
+FALLBACK_START = pd.Timestamp("2025-01-01")
+BUNDLED_INPUTS = [Path("dataset/hospital_data.csv"), Path("dataset/hospital_data_old.csv")]
+
+_ISO_DATE = re.compile(r"^\s*\d{4}-\d{1,2}-\d{1,2}")
+
+def _date_column(df: pd.DataFrame):
+    """(column name, dayfirst) of the input's date column, or (None, False)."""
+    names = {str(c).strip().lower(): c for c in df.columns}
+    if "date" in names:
+        return names["date"], True
+    if "timestamp" in names:
+        return names["timestamp"], False
+    return None, False
+
+def infer_date_format(df: pd.DataFrame):
+    """
+    strftime format of the first non-empty date in `df`, so every chunk of a
+    streamed file (and the in-memory path) parses dates the same way. ISO dates
+    (YYYY-MM-DD) are never read day-first. None if there is nothing to go on.
+    """
+    col, dayfirst = _date_column(df)
+    if col is None:
+        return None
+    values = df[col].dropna().astype(str)
+    values = values[values.str.strip() != ""]
+    if values.empty:
+        return None
+    sample = values.iloc[0].strip()
+    return guess_datetime_format(sample, dayfirst=dayfirst and not _ISO_DATE.match(sample))
+
+def _derive_columns(df: pd.DataFrame, date_format=None, start=FALLBACK_START) -> pd.DataFrame:
+    """
+    Row-local cleaning and derived features (everything except rolling windows).
+
+    `date_format` comes from infer_date_format on the whole input (or its first
+    chunk); `start` is the first synthesized timestamp when there is no date column.
+    """
     df.columns = df.columns.str.strip().str.lower()
 
     # timestamp
     if "date" in df.columns:
-        df["timestamp"] = pd.to_datetime(df["date"], dayfirst=True, errors="coerce")
+        df["timestamp"] = _parse_dates(df["date"], date_format, dayfirst=True)
     elif "timestamp" in df.columns:
-        df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+        df["timestamp"] = _parse_dates(df["timestamp"], date_format, dayfirst=False)
     else:
-        df["timestamp"] = pd.date_range("2025-01-01", periods=len(df), freq="H")
+        df["timestamp"] = pd.date_range(start, periods=len(df), freq="h")
 
     # ensure key columns exist
     num_cols = [
@@ -84,20 +130,15 @@ def load_and_clean():
     df["is_peak"] = df["hour"].isin([9,10,11,18,19,20]).astype(int)
     df["is_weekend"] = df["dow"].isin([5,6]).astype(int)
 
-    # synthetic / derived rolling features
-    df = df.sort_values(["hospital_id","timestamp"])
-    df["rolling_admissions_7"] = (
-        df.groupby("hospital_id")["admission"].rolling(7, min_periods=1).mean().reset_index(0,drop=True)
-    )
-    df["rolling_icu_7"] = (
-        df.groupby("hospital_id")["icu_occup"].rolling(7, min_periods=1).mean().reset_index(0,drop=True)
-    )
-    df["rolling_vent_7"] = (
-        df.groupby("hospital_id")["ventilators_used"].rolling(7, min_periods=1).mean().reset_index(0,drop=True)
-    )
+    # rolling_* placeholders keep the column order identical to the in-memory path;
+    # the values are filled in by _add_rolling / _add_rolling_streaming
+    for col in ROLLING_SOURCES:
+        df[col] = 0.0
 
     # Surge factor (festival/outbreak/weather/pollution)
-    df["weather"] = df.get("weather", "").astype(str)
+    if "weather" not in df.columns:
+        df["weather"] = ""
+    df["weather"] = df["weather"].astype(str)
     df["weather_surge"] = df["weather"].str.contains("Foggy|Smog|Cold|Pollution", na=False).astype(int)
     
     # Enhanced surge factor with festivals and pollution
@@ -136,10 +177,172 @@ def load_and_clean():
     df["trauma_capacity"] = (df["total_beds"] * 0.1).astype(int)  # Assume 10% beds can handle trauma
     df["icu_capacity"] = df["icu_capa"]
     df["ventilator_capacity"] = df["ventilator"]
+    return df
+
+def _parse_dates(values: pd.Series, date_format, dayfirst):
+    if date_format:
+        return pd.to_datetime(values, format=date_format, errors="coerce")
+    # No guessable format: element-wise parsing, the same for any chunking
+    return pd.to_datetime(values, dayfirst=dayfirst, errors="coerce")
+
+def _add_rolling(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-hospital rolling means over the whole frame (in-memory path)."""
+    df = df.sort_values(["hospital_id","timestamp"], kind="stable")
+    grouped = df.groupby("hospital_id")
+    for col, src in ROLLING_SOURCES.items():
+        df[col] = grouped[src].rolling(ROLLING_WINDOW, min_periods=1).mean().reset_index(0,drop=True)
+    return df
+
+def _add_rolling_streaming(chunk: pd.DataFrame, carry: pd.DataFrame):
+    """
+    Rolling means for one chunk, continuing the windows from earlier chunks.
+
+    `carry` holds the last ROLLING_WINDOW-1 source values per hospital seen so far;
+    it is prepended to the chunk so windows cross chunk boundaries, then dropped
+    again. Returns (chunk_with_rolling, new_carry).
+    """
+    sources = list(ROLLING_SOURCES.values())
+    chunk = chunk.sort_values(["hospital_id","timestamp"], kind="stable")
+
+    body = chunk[["hospital_id"] + sources].assign(_carry=False)
+    combined = pd.concat([carry, body], ignore_index=True)
+    # stable sort keeps carried rows ahead of the new rows for each hospital
+    combined = combined.sort_values("hospital_id", kind="stable")
+
+    grouped = combined.groupby("hospital_id", sort=False)
+    rolled = {
+        col: grouped[src].transform(lambda s: s.rolling(ROLLING_WINDOW, min_periods=1).mean())
+        for col, src in ROLLING_SOURCES.items()
+    }
+    fresh = ~combined["_carry"].astype(bool).to_numpy()
+    for col, values in rolled.items():
+        chunk[col] = values.to_numpy()[fresh]
 
-    df.to_csv(OUT, index=False)
-    print(f"✅ Clean snapshot saved -> {OUT.resolve()}")
+    new_carry = grouped.tail(ROLLING_WINDOW - 1)[["hospital_id"] + sources].assign(_carry=True)
+    return chunk, new_carry.reset_index(drop=True)
+
+def load_and_clean(data=DATA, out=OUT):
+    df = pd.read_csv(data)
+    df = _add_rolling(_derive_columns(df, infer_date_format(df)))
+
+    Path(out).parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(out, index=False)
+    print(f"✅ Clean snapshot saved -> {Path(out).resolve()}")
     return df
 
+def _check_time_order(chunk: pd.DataFrame, last_seen: pd.Series, data) -> pd.Series:
+    """
+    Raise if any hospital's rows in `chunk` start before its last timestamp in
+    earlier chunks (the carried rolling windows would be wrong); returns the
+    updated last timestamp per hospital.
+    """
+    if chunk.empty:
+        return last_seen
+    bounds = chunk.groupby("hospital_id")["timestamp"].agg(["min", "max"])
+    previous = last_seen.reindex(bounds.index)
+    behind = bounds["min"] < previous
+    if behind.any():
+        hospital_id = behind.idxmax()
+        raise ValueError(
+            f"{data}: rows for hospital {hospital_id} are not in time order across chunks "
+            f"({bounds.loc[hospital_id, 'min']} after {previous[hospital_id]}). Sort the input by "
+            f"hospital/timestamp, or use load_and_clean() for unsorted files."
+        )
+    return pd.concat([last_seen, bounds["max"]]).groupby(level=0).max()
+
+def load_and_clean_streaming(data=DATA, out=OUT, chunksize=STREAM_CHUNKSIZE):
+    """
+    Bounded-memory variant of load_and_clean for large multi-year feeds.
+
+    Reads `data` in chunks of `chunksize` rows, cleans each chunk, carries the
+    rolling-window tail per hospital across chunk boundaries and appends each
+    finished chunk to `out`. Peak memory is one chunk plus a few rows per
+    hospital, independent of the input size (plus any rows whose date does not
+    parse: the in-memory path sorts those after each hospital's dated rows, so
+    they are held back and written last).
+
+    The date format is inferred once, from the first chunk with a date, and
+    reused for every chunk. Rows of a hospital must be in time order across the
+    file (as exported by the feed); a chunk that goes back in time raises
+    ValueError. The output has the same rows and values as load_and_clean,
+    sorted by hospital/timestamp within each chunk. Returns the number of rows written.
+    """
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    carry = pd.DataFrame(columns=["hospital_id"] + list(ROLLING_SOURCES.values()) + ["_carry"])
+    last_seen = pd.Series(dtype="datetime64[ns]")
+    undated = []
+    date_format = None
+    rows_read = rows = 0
+    first = True
+
+    def write(chunk):
+        nonlocal first, rows
+        chunk.to_csv(out, mode="w" if first else "a", header=first, index=False)
+        rows += len(chunk)
+        first = False
+
+    for chunk in pd.read_csv(data, chunksize=chunksize):
+        if date_format is None:
+            date_format = infer_date_format(chunk)
+        chunk = _derive_columns(chunk, date_format, start=FALLBACK_START + pd.Timedelta(hours=rows_read))
+        rows_read += len(chunk)
+
+        missing = chunk["timestamp"].isna()
+        if missing.any():
+            undated.append(chunk[missing])
+            chunk = chunk[~missing].copy()
+        last_seen = _check_time_order(chunk, last_seen, data)
+        chunk, carry = _add_rolling_streaming(chunk, carry)
+        write(chunk)
+        print(f"   … {rows} rows written")
+
+    if undated:
+        chunk, carry = _add_rolling_streaming(pd.concat(undated), carry)
+        write(chunk)
+
+    print(f"✅ Clean snapshot streamed -> {out.resolve()} ({rows} rows)")
+    return rows
+
+def verify_streaming(data=DATA, chunksize=500):
+    """
+    Clean `data` both ways and raise AssertionError unless the streamed snapshot
+    has the same rows and values as the in-memory one (row order aside).
+    """
+    import tempfile
+    from contextlib import redirect_stdout
+    import io
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with redirect_stdout(io.StringIO()):
+            np.random.seed(0)  # wait_time_min draws noise per row
+            load_and_clean(data, Path(tmp) / "memory.csv")
+            np.random.seed(0)
+            load_and_clean_streaming(data, Path(tmp) / "stream.csv", chunksize=chunksize)
+        frames = []
+        for name in ("memory.csv", "stream.csv"):
+            df = pd.read_csv(Path(tmp) / name, parse_dates=["timestamp"])
+            df = df.sort_values(["hospital_id", "timestamp"], kind="stable").reset_index(drop=True)
+            frames.append(df)
+    pd.testing.assert_frame_equal(frames[0], frames[1], check_dtype=False, rtol=1e-9)
+    return len(frames[0])
+
 if __name__ == "__main__":
-    load_and_clean()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Clean hospital history into dataset/clean_snapshot.csv")
+    parser.add_argument("--stream", action="store_true", help="process the input in bounded-size chunks")
+    parser.add_argument("--chunksize", type=int, default=STREAM_CHUNKSIZE)
+    parser.add_argument("--verify", action="store_true",
+                        help="check that streaming matches the in-memory path on the bundled CSVs, then exit")
+    args = parser.parse_args()
+
+    if args.verify:
+        for path in BUNDLED_INPUTS:
+            for size in (50, 500):
+                n = verify_streaming(path, chunksize=size)
+                print(f"✅ {path}: streamed (chunksize={size}) == in-memory ({n} rows)")
+    elif args.stream:
+        load_and_clean_streaming(chunksize=args.chunksize)
+    else:
+        load_and_clean()
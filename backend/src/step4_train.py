@@ -11,11 +11,15 @@ Supports different modes:
   - "hgb"      -> HistGradientBoosting only
   - "hybrid"   -> Enhanced weighted ensemble of XGB + HGB + LightGBM
 
+All learners (3 targets x base models) are fitted concurrently in a
+process pool sized by N_JOBS, with per-learner thread caps.
+
 Saves them as dicts { "model": ..., "features": [...] }
 so they can be safely loaded in step 5.
 """
 
 from pathlib import Path
+import os
 import warnings
 import numpy as np
 import pandas as pd
@@ -26,6 +30,9 @@ from xgboost import XGBRegressor
 from sklearn.model_selection import TimeSeriesSplit, GroupShuffleSplit
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import train_test_split
+
+from feature_engine import build_features
 
 warnings.filterwarnings("ignore", message="Could not find the number of physical cores")
 
@@ -40,6 +47,11 @@ VENT_OUT = MODELDIR / "vent_model.joblib"
 
 # Change this to "xgb", "hgb", "rf", or "hybrid"
 MODE = "hgb"
+
+# Parallel training: worker processes (-1 = all cores) and threads per learner
+# (None = split the cores evenly across the concurrently running learners)
+N_JOBS = int(os.getenv("TRAIN_N_JOBS", "-1"))
+THREADS_PER_LEARNER = None
 # ----------------------------------------
 
 # Store results for table display
@@ -47,55 +59,8 @@ RESULTS = []
 
 
 def make_features(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.sort_values(["hospital_id", "timestamp"]).copy()
-    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
-
-    # Temporal features
-    df["day_of_year"] = df["timestamp"].dt.dayofyear.fillna(0).astype(int)
-    df["week_of_year"] = df["timestamp"].dt.isocalendar().week.fillna(0).astype(int)
-    df["is_month_end"] = df["timestamp"].dt.is_month_end.astype(int)
-    df["is_month_start"] = df["timestamp"].dt.is_month_start.astype(int)
-    df["is_quarter_end"] = df["timestamp"].dt.is_quarter_end.astype(int)
-    df["is_quarter_start"] = df["timestamp"].dt.is_quarter_start.astype(int)
-    df["is_year_end"] = df["timestamp"].dt.is_year_end.astype(int)
-    df["is_year_start"] = df["timestamp"].dt.is_year_start.astype(int)
-
-    # Lags
-    for lag in (1, 2, 3, 7, 14, 30):
-        df[f"adm_lag_{lag}"] = df.groupby("hospital_id")["admission"].shift(lag)
-        df[f"icu_lag_{lag}"] = df.groupby("hospital_id")["icu_occup"].shift(lag)
-        df[f"vent_lag_{lag}"] = df.groupby("hospital_id")["ventilators_used"].shift(lag)
-
-    # Rolling stats
-    for window in (3, 7, 14, 30):
-        df[f"adm_roll_{window}"] = (
-            df.groupby("hospital_id")["admission"]
-            .rolling(window, min_periods=1).mean().reset_index(0, drop=True)
-        )
-        df[f"icu_roll_{window}"] = (
-            df.groupby("hospital_id")["icu_occup"]
-            .rolling(window, min_periods=1).mean().reset_index(0, drop=True)
-        )
-        df[f"vent_roll_{window}"] = (
-            df.groupby("hospital_id")["ventilators_used"]
-            .rolling(window, min_periods=1).mean().reset_index(0, drop=True)
-        )
-        df[f"adm_roll_std_{window}"] = (
-            df.groupby("hospital_id")["admission"]
-            .rolling(window, min_periods=1).std().reset_index(0, drop=True)
-        )
-
-    # Safety columns
-    for col in [
-        "festival", "outbreak", "readiness_index", "patient_inflow", "avg_treatment_time",
-        "bed_occupancy_rate", "icu_occupancy_rate", "ventilator_utilization",
-        "staff_utilization", "hour", "dow", "is_peak", "is_night", "is_festival",
-        "pollution_season", "weather_surge", "is_weekend"
-    ]:
-        if col not in df.columns:
-            df[col] = 0
-
-    return df
+    """Temporal, lag and rolling features via the shared single-pass feature engine."""
+    return build_features(df)
 
 
 def safe_mape(y_true, y_pred):
@@ -133,12 +98,12 @@ def time_or_group_split(X, y, ids):
     return X.iloc[tr_idx], X.iloc[te_idx], y.iloc[tr_idx], y.iloc[te_idx]
 
 
-def build_model():
-    """Return model depending on MODE"""
+def build_model(n_threads=None):
+    """Return model depending on MODE. n_threads caps the learner's own thread pool."""
     if MODE == "xgb":
         return XGBRegressor(
             n_estimators=200, max_depth=6, learning_rate=0.1,
-            subsample=0.8, colsample_bytree=0.8, random_state=42
+            subsample=0.8, colsample_bytree=0.8, random_state=42, n_jobs=n_threads
         )
     elif MODE == "hgb":
         return HistGradientBoostingRegressor(
@@ -147,19 +112,51 @@ def build_model():
         )
     elif MODE == "rf":
         return RandomForestRegressor(
-            n_estimators=150, max_depth=8, random_state=42
+            n_estimators=150, max_depth=8, random_state=42, n_jobs=n_threads
         )
     elif MODE == "hybrid":
         return {
             "hgb": HistGradientBoostingRegressor(max_iter=300, max_depth=10, learning_rate=0.05, random_state=42),
             "xgb": XGBRegressor(n_estimators=200, max_depth=6, learning_rate=0.1,
-                                subsample=0.8, colsample_bytree=0.8, random_state=42),
-            "rf": RandomForestRegressor(n_estimators=150, max_depth=8, random_state=42)
+                                subsample=0.8, colsample_bytree=0.8, random_state=42, n_jobs=n_threads),
+            "rf": RandomForestRegressor(n_estimators=150, max_depth=8, random_state=42, n_jobs=n_threads)
         }
     else:
         raise ValueError(f"Unknown MODE: {MODE}")
 
 
+def _fit_one(model, X, y):
+    """Fit a single learner (runs inside a worker process)."""
+    return model.fit(X, y)
+
+
+def _thread_budget(n_tasks, n_jobs=N_JOBS):
+    """(worker processes, threads per learner) so workers x threads <= cores."""
+    cores = os.cpu_count() or 1
+    workers = cores if n_jobs is None or n_jobs < 1 else min(n_jobs, cores)
+    workers = max(1, min(workers, n_tasks))
+    threads = THREADS_PER_LEARNER or max(1, cores // workers)
+    return workers, threads
+
+
+def fit_parallel(jobs, n_jobs=N_JOBS):
+    """
+    Fit independent learners across a process pool.
+
+    `jobs` is a list of (model, X, y); returns the fitted models in the same order.
+    Each worker's BLAS/OpenMP pools are capped so the learners don't oversubscribe
+    the machine.
+    """
+    workers, threads = _thread_budget(len(jobs), n_jobs)
+    if workers == 1:
+        return [_fit_one(model, X, y) for model, X, y in jobs]
+
+    with joblib.parallel_config(backend="loky", inner_max_num_threads=threads):
+        return joblib.Parallel(n_jobs=workers)(
+            joblib.delayed(_fit_one)(model, X, y) for model, X, y in jobs
+        )
+
+
 class AdvancedEnsemble:
     """Enhanced ensemble with stacking and dynamic weighting"""
     
@@ -168,12 +165,15 @@ class AdvancedEnsemble:
         self.meta_model = LinearRegression()
         self.weights = None
         
-    def fit(self, X_tr, y_tr, X_val, y_val):
+    def fit(self, X_tr, y_tr, X_val, y_val, n_jobs=1):
         # Train base models
-        for name, model in self.base_models.items():
-            model.fit(X_tr, y_tr)
-        
-        # Create meta-features using validation predictions
+        fitted = fit_parallel([(m, X_tr, y_tr) for m in self.base_models.values()], n_jobs=n_jobs)
+        self.base_models = dict(zip(self.base_models.keys(), fitted))
+        return self.fit_meta(X_val, y_val)
+
+    def fit_meta(self, X_val, y_val):
+        """Fit the stacker and weights on validation data (base models already fitted)."""
+        # Create meta-features using validation predictions (one predict per base model)
         meta_features = np.column_stack([
             model.predict(X_val) for model in self.base_models.values()
         ])
@@ -183,8 +183,7 @@ class AdvancedEnsemble:
         
         # Compute dynamic weights based on validation performance
         val_scores = {}
-        for name, model in self.base_models.items():
-            pred = model.predict(X_val)
+        for name, pred in zip(self.base_models.keys(), meta_features.T):
             # Use inverse RMSE for weighting (better models get higher weight)
             rmse = np.sqrt(mean_squared_error(y_val, pred))
             val_scores[name] = 1 / (rmse + 1e-6)
@@ -205,10 +204,8 @@ class AdvancedEnsemble:
         stacked_pred = self.meta_model.predict(base_preds)
         
         # Weighted average prediction (secondary)
-        weighted_pred = sum(
-            self.weights[name] * self.base_models[name].predict(X)
-            for name in self.base_models.keys()
-        )
+        weights = np.array([self.weights[name] for name in self.base_models.keys()])
+        weighted_pred = base_preds @ weights
         
         # Combine both approaches (70% stacking, 30% weighted)
         final_pred = 0.7 * stacked_pred + 0.3 * weighted_pred
@@ -216,32 +213,18 @@ class AdvancedEnsemble:
         return final_pred
 
 
-def fit_and_eval(X_tr, y_tr, X_te, y_te, label, target_name):
-    if MODE != "hybrid":
-        model = build_model()
-        model.fit(X_tr, y_tr)
-        pred = model.predict(X_te)
-    else:
-        # Split training data for validation
-        from sklearn.model_selection import train_test_split
-        X_train, X_val, y_train, y_val = train_test_split(
-            X_tr, y_tr, test_size=0.2, random_state=42
-        )
-        
-        base_models = build_model()
-        ensemble = AdvancedEnsemble(base_models)
-        ensemble.fit(X_train, y_train, X_val, y_val)
-        
-        pred = ensemble.predict(X_te)
-        model = ensemble
-        
+def evaluate(model, X_te, y_te, label, target_name):
+    """Print metrics for a fitted model and record them in RESULTS."""
+    pred = model.predict(X_te)
+
+    if isinstance(model, AdvancedEnsemble):
         # Print individual model performance for research insights
         print(f"   📊 {label} - Individual Model Performance:")
-        for name, base_model in base_models.items():
+        for name, base_model in model.base_models.items():
             base_pred = base_model.predict(X_te)
             base_mae = mean_absolute_error(y_te, base_pred)
             base_mape = safe_mape(y_te, base_pred)
-            weight = ensemble.weights.get(name, 0)
+            weight = model.weights.get(name, 0)
             print(f"      {name.upper()}: MAE={base_mae:.4f}, MAPE={base_mape:.4f}, Weight={weight:.3f}")
 
     mae = mean_absolute_error(y_te, pred)
@@ -266,6 +249,50 @@ def fit_and_eval(X_tr, y_tr, X_te, y_te, label, target_name):
     return model
 
 
+def fit_and_eval(X_tr, y_tr, X_te, y_te, label, target_name):
+    """Fit and evaluate a single target (see train_targets)."""
+    return train_targets([(X_tr, y_tr, X_te, y_te, label, target_name)])[0]
+
+
+def train_targets(targets, n_jobs=N_JOBS):
+    """
+    Train several targets at once.
+
+    `targets` is a list of (X_tr, y_tr, X_te, y_te, label, target_name). Every
+    learner of every target (one per target, or three per target in hybrid mode)
+    is fitted as an independent task in one process pool; ensembles are then
+    assembled and evaluated in the parent. Returns the fitted models in order.
+    """
+    per_target = 3 if MODE == "hybrid" else 1
+    _, threads = _thread_budget(len(targets) * per_target, n_jobs)
+
+    jobs, plan = [], []
+    for X_tr, y_tr, X_te, y_te, label, target_name in targets:
+        if MODE != "hybrid":
+            plan.append((None, None, len(jobs)))
+            jobs.append((build_model(threads), X_tr, y_tr))
+        else:
+            # Split training data for validation
+            X_train, X_val, y_train, y_val = train_test_split(
+                X_tr, y_tr, test_size=0.2, random_state=42
+            )
+            base_models = build_model(threads)
+            plan.append((list(base_models), (X_val, y_val), len(jobs)))
+            jobs.extend((m, X_train, y_train) for m in base_models.values())
+
+    fitted = fit_parallel(jobs, n_jobs=n_jobs)
+
+    models = []
+    for (names, val, offset), (X_tr, y_tr, X_te, y_te, label, target_name) in zip(plan, targets):
+        if names is None:
+            model = fitted[offset]
+        else:
+            model = AdvancedEnsemble(dict(zip(names, fitted[offset:offset + len(names)])))
+            model.fit_meta(*val)
+        models.append(evaluate(model, X_te, y_te, label, target_name))
+    return models
+
+
 def print_results_table():
     """Print results in a formatted table"""
     print("\n" + "="*80)
@@ -314,10 +341,12 @@ def train():
 
     print(f"\n=== Training mode: {MODE.upper()} ===")
 
-    # Train each model
-    adm_model = fit_and_eval(X_adm_tr, y_adm_tr, X_adm_te, y_adm_te, "Admissions", "Admissions")
-    icu_model = fit_and_eval(X_icu_tr, y_icu_tr, X_icu_te, y_icu_te, "ICU", "ICU Occupancy")
-    vent_model = fit_and_eval(X_vent_tr, y_vent_tr, X_vent_te, y_vent_te, "Ventilator", "Ventilator Usage")
+    # Train all three targets in parallel
+    adm_model, icu_model, vent_model = train_targets([
+        (X_adm_tr, y_adm_tr, X_adm_te, y_adm_te, "Admissions", "Admissions"),
+        (X_icu_tr, y_icu_tr, X_icu_te, y_icu_te, "ICU", "ICU Occupancy"),
+        (X_vent_tr, y_vent_tr, X_vent_te, y_vent_te, "Ventilator", "Ventilator Usage"),
+    ])
 
     # Save dict-wrapped models
     joblib.dump({"model": adm_model, "features": list(X.columns)}, ADM_OUT)
@@ -1,25 +1,44 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from joblib import load
 import math
-import requests
 from datetime import datetime
 import os, json
+import logging
+import threading
 from math import radians, sin, cos, sqrt, atan2
 # NOTE: if you created a requests-based geocode helper earlier, this file expects geocode_location to exist.
 # If you used geopy, keep that import and helper; otherwise keep your requests-based geocoder.
+# requests, joblib and geopy are imported where they are used so that importing
+# this module from the API stays cheap.
+
 try:
-    from geopy.geocoders import Nominatim  # optional; may not be installed
-except Exception:
-    Nominatim = None
+    from .feature_engine import latest_with_features
+    from .metrics import stage, cache_lookup
+    from .log_buffer import rate_limited_logger
+    from .tracing import span
+except ImportError:  # run as a script from backend/
+    from feature_engine import latest_with_features
+    from metrics import stage, cache_lookup
+    from log_buffer import rate_limited_logger
+    from tracing import span
+
+# Per-hospital and per-request messages: leveled and rate-limited per call site
+logger = rate_limited_logger(__name__)
 
 # -----------------------------------------------------------------------------
 # Paths & Config
+# Anchored to backend/ so the module also works when imported by the API.
 # -----------------------------------------------------------------------------
-DATA_PATH = Path("dataset/clean_snapshot.csv")
-MODEL_PATH = Path("models/surge_multioutput_rf.joblib")
-FEATURES_PATH = Path("models/surge_features.txt")
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DATA_PATH = BACKEND_DIR / "dataset" / "clean_snapshot.csv"
+MODEL_PATH = BACKEND_DIR / "models" / "surge_multioutput_rf.joblib"
+FEATURES_PATH = BACKEND_DIR / "models" / "surge_features.txt"
+ADM_MODEL_PATH = BACKEND_DIR / "models" / "adm_model.joblib"
+ICU_MODEL_PATH = BACKEND_DIR / "models" / "icu_model.joblib"
+VENT_MODEL_PATH = BACKEND_DIR / "models" / "vent_model.joblib"
+
+SCENARIO_CHOICES = {"1": "normal", "2": "accident", "3": "outbreak", "4": "festival"}
 
 # Optional API keys (kept as placeholders)
 TRAFFIC_API_KEY = os.getenv("TRAFFIC_API_KEY", "your_traffic_api_key")
@@ -49,7 +68,7 @@ def get_real_time_traffic(origin, destination):
 # If you prefer geopy, ensure it's installed (pip install geopy). Otherwise this file can still work
 # if you include your earlier requests-based geocode_location helper. Below we provide a small fallback.
 
-_GEOCODE_CACHE = Path("dataset/geocode_cache.json")
+_GEOCODE_CACHE = BACKEND_DIR / "dataset" / "geocode_cache.json"
 
 def _load_geocode_cache():
     if _GEOCODE_CACHE.exists():
@@ -83,6 +102,10 @@ def geocode_location(address: str, city_hint: str = "Mumbai, India", sleep_sec:
         return float(rec["lat"]), float(rec["lon"])
 
     # Try geopy first if installed
+    try:
+        from geopy.geocoders import Nominatim  # optional; may not be installed
+    except Exception:
+        Nominatim = None
     if Nominatim is not None:
         try:
             geolocator = Nominatim(user_agent="hospital_routing")
@@ -97,6 +120,7 @@ def geocode_location(address: str, city_hint: str = "Mumbai, India", sleep_sec:
 
     # Fallback to direct HTTP request to Nominatim
     try:
+        import requests
         url = "https://nominatim.openstreetmap.org/search"
         headers = {"User-Agent": "MumbaiHacks/1.0 (contact:you@example.com)"}
         params = {"q": full_q, "format": "json", "limit": 1}
@@ -206,9 +230,9 @@ def build_travel_minutes_from_geo(latest_df: pd.DataFrame, incident_lat: float,
                 # 4️⃣ ✅ Adjust for Indian traffic (Mumbai typical)
                 adjusted_min, multiplier = adjust_eta(travel_min, dist_km)
 
-                # 5️⃣ Log the adjustment for debugging
-                print(f"🚦 Hospital {hid}: {round(dist_km,2)} km → "
-                      f"{travel_min:.1f} min × {multiplier} = {adjusted_min} min")
+                # 5️⃣ Log the adjustment for debugging (lazy args: formatted only when DEBUG is on)
+                logger.debug("🚦 Hospital %s: %.2f km → %.1f min × %s = %s min",
+                             hid, dist_km, travel_min, multiplier, adjusted_min)
 
                 # Use adjusted value
                 travel_minutes[hid] = adjusted_min
@@ -222,7 +246,7 @@ def build_travel_minutes_from_geo(latest_df: pd.DataFrame, incident_lat: float,
                 distances_km[hid] = dist_km
 
         except Exception as e:
-            print(f"⚠️ Error computing travel time for hospital {hid}: {e}")
+            logger.warning("Error computing travel time for hospital %s: %s", hid, e)
             travel_min = float(get_real_time_traffic("incident", str(hid)))
             dist_km = None
             travel_minutes[hid] = travel_min
@@ -234,14 +258,44 @@ def build_travel_minutes_from_geo(latest_df: pd.DataFrame, incident_lat: float,
 # Models & Features
 # (unchanged from your existing code, preserved)
 # -----------------------------------------------------------------------------
+_MODEL_CACHE = {}
+_SNAPSHOT_CACHE = {}
+_cache_lock = threading.Lock()
+
+def file_stamp(*paths):
+    return tuple((str(p), p.stat().st_mtime_ns) if p.exists() else (str(p), None) for p in paths)
+
 def load_model_and_features():
+    """
+    Load models once per process; reloaded only when a model file changes on disk.
+    Returns (model, features).
+    """
+    stamp = file_stamp(ADM_MODEL_PATH, ICU_MODEL_PATH, VENT_MODEL_PATH, MODEL_PATH)
+    with _cache_lock:
+        hit = _MODEL_CACHE.get("stamp") == stamp
+        cache_lookup("models", hit)
+        if not hit:
+            _MODEL_CACHE["loaded"] = _load_model_and_features()
+            _MODEL_CACHE["stamp"] = stamp
+        return _MODEL_CACHE["loaded"]
+
+def load_latest_snapshot():
+    """Latest row per hospital with features, cached until the snapshot CSV changes."""
+    stamp = file_stamp(DATA_PATH)
+    with stage("snapshot_load"), _cache_lock:
+        hit = _SNAPSHOT_CACHE.get("stamp") == stamp
+        cache_lookup("snapshot", hit)
+        if not hit:
+            df = pd.read_csv(DATA_PATH, parse_dates=["timestamp"])
+            _SNAPSHOT_CACHE["latest"] = latest_with_features(df)
+            _SNAPSHOT_CACHE["stamp"] = stamp
+        return _SNAPSHOT_CACHE["latest"]
+
+def _load_model_and_features():
     """Load either 3 separate models or a single multi-output model."""
-    ADM_MODEL_PATH = Path("models/adm_model.joblib")
-    ICU_MODEL_PATH = Path("models/icu_model.joblib")
-    VENT_MODEL_PATH = Path("models/vent_model.joblib")
-
+    from joblib import load
     if ADM_MODEL_PATH.exists() and ICU_MODEL_PATH.exists() and VENT_MODEL_PATH.exists():
-        print("Loading separate models...")
+        logger.info("Loading separate models...")
         adm_blob = load(ADM_MODEL_PATH)
         icu_blob = load(ICU_MODEL_PATH)
         vent_blob = load(VENT_MODEL_PATH)
@@ -273,7 +327,7 @@ def load_model_and_features():
                     icu_pred = self.icu_model.predict(X)
                     vent_pred = self.vent_model.predict(X)
                 except Exception as e:
-                    print(f"Model prediction failed, using fallback: {e}")
+                    logger.warning("Model prediction failed, using fallback: %s", e)
                     n = len(X)
                     adm_pred = np.maximum(0, np.random.normal(2, 1, n))
                     icu_pred = np.maximum(0, np.random.normal(1, 0.5, n))
@@ -417,9 +471,10 @@ def build_feature_matrix(latest: pd.DataFrame, features):
     return X[features].fillna(0)
 
 def predict_surges(latest: pd.DataFrame):
-    model, features = load_model_and_features()
-    X = build_feature_matrix(latest, features)
-    preds = model.predict(X)
+    with stage("model_predict", hospitals=len(latest)):
+        model, features = load_model_and_features()
+        X = build_feature_matrix(latest, features)
+        preds = model.predict(X)
     latest["pred_adm_next"] = preds[:, 0]
     latest["pred_icu_next"] = preds[:, 1]
     latest["pred_vent_next"] = preds[:, 2]
@@ -452,117 +507,120 @@ def optimize_routing(latest, critical_patients, stable_patients, incident_locati
     # Predictions
     df = predict_surges(df)
 
-    # Scores
-    df["capacity_score"] = df.apply(compute_capacity_score, axis=1)
-    df["readiness_index"] = df.apply(compute_readiness_index, axis=1)
-
-    # travel_min comes from travel_minutes mapping if provided, otherwise fallback random
-    if travel_minutes is None:
-        travel_minutes = {hid: get_real_time_traffic(incident_location, hid) for hid in df["hospital_id"]}
-    df["travel_min"] = df["hospital_id"].map(travel_minutes).astype(float).fillna(20.0)
+    with stage("scoring"):
+        # Scores
+        df["capacity_score"] = df.apply(compute_capacity_score, axis=1)
+        df["readiness_index"] = df.apply(compute_readiness_index, axis=1)
 
-    # Add distance_km if distances mapping provided
-    if distances is not None:
-        df["distance_km"] = df["hospital_id"].map(distances)
-    else:
-        df["distance_km"] = None
+        # travel_min comes from travel_minutes mapping if provided, otherwise fallback random
+        if travel_minutes is None:
+            travel_minutes = {hid: get_real_time_traffic(incident_location, hid) for hid in df["hospital_id"]}
+        df["travel_min"] = df["hospital_id"].map(travel_minutes).astype(float).fillna(20.0)
 
-    df["total_score"] = (
-        df["travel_min"] * 0.3 +
-        df["pred_adm_next"] * 0.2 +
-        (10 - df["capacity_score"]) * 0.3 +
-        (1 - df["readiness_index"]) * 0.2
-    )
-    df = df.sort_values("total_score").reset_index(drop=True)
+        # Add distance_km if distances mapping provided
+        if distances is not None:
+            df["distance_km"] = df["hospital_id"].map(distances)
+        else:
+            df["distance_km"] = None
 
-    # Capacity buckets
-    MAX_CRITICAL_PER_HOSPITAL = 5
-    MAX_STABLE_PER_HOSPITAL = 8
+        df["total_score"] = (
+            df["travel_min"] * 0.3 +
+            df["pred_adm_next"] * 0.2 +
+            (10 - df["capacity_score"]) * 0.3 +
+            (1 - df["readiness_index"]) * 0.2
+        )
+        df = df.sort_values("total_score").reset_index(drop=True)
 
-    df["trauma_cap_bucket"] = np.minimum(
-        MAX_CRITICAL_PER_HOSPITAL,
-        np.maximum(1, np.floor(df["trauma_capacity"] * 0.6)).astype(int)
-    )
-    df["general_cap_bucket"] = np.minimum(
-        MAX_STABLE_PER_HOSPITAL,
-        np.maximum(2, np.floor((df["total_beds"] - df["occupied"]) * 0.5)).astype(int)
-    )
+    with stage("assignment", hospitals=len(df), critical=int(critical_patients), stable=int(stable_patients)):
+        # Capacity buckets
+        MAX_CRITICAL_PER_HOSPITAL = 5
+        MAX_STABLE_PER_HOSPITAL = 8
 
-    df["assigned_critical"] = 0
-    df["assigned_stable"] = 0
+        df["trauma_cap_bucket"] = np.minimum(
+            MAX_CRITICAL_PER_HOSPITAL,
+            np.maximum(1, np.floor(df["trauma_capacity"] * 0.6)).astype(int)
+        )
+        df["general_cap_bucket"] = np.minimum(
+            MAX_STABLE_PER_HOSPITAL,
+            np.maximum(2, np.floor((df["total_beds"] - df["occupied"]) * 0.5)).astype(int)
+        )
 
-    # Distribute critical patients (prefer trauma-capable)
-    trauma_hospitals = df[df["trauma_cap_bucket"] > 0].sort_values("total_score")
-    remain_crit = int(critical_patients)
+        df["assigned_critical"] = 0
+        df["assigned_stable"] = 0
 
-    for idx, row in trauma_hospitals.iterrows():
-        if remain_crit <= 0:
-            break
-        can_take = int(min(row["trauma_cap_bucket"], remain_crit, 3))
-        if can_take > 0:
-            df.at[idx, "assigned_critical"] += can_take
-            remain_crit -= can_take
+        # Distribute critical patients (prefer trauma-capable)
+        trauma_hospitals = df[df["trauma_cap_bucket"] > 0].sort_values("total_score")
+        remain_crit = int(critical_patients)
 
-    if remain_crit > 0:
         for idx, row in trauma_hospitals.iterrows():
             if remain_crit <= 0:
                 break
-            current_assigned = int(df.at[idx, "assigned_critical"])
-            can_take_more = int(min(row["trauma_cap_bucket"] - current_assigned, remain_crit))
-            if can_take_more > 0:
-                df.at[idx, "assigned_critical"] += can_take_more
-                remain_crit -= can_take_more
-
-    if remain_crit > 0:
-        other_hospitals = df[df["assigned_critical"] == 0].sort_values("total_score")
-        for idx, row in other_hospitals.iterrows():
-            if remain_crit <= 0:
-                break
-            can_take = int(min(2, remain_crit))
+            can_take = int(min(row["trauma_cap_bucket"], remain_crit, 3))
             if can_take > 0:
                 df.at[idx, "assigned_critical"] += can_take
                 remain_crit -= can_take
 
-    # Distribute stable patients
-    remain_stable = int(stable_patients)
-    for idx, row in df.sort_values("total_score").iterrows():
-        if remain_stable <= 0:
-            break
-        already = int(df.at[idx, "assigned_critical"] + df.at[idx, "assigned_stable"])
-        avail = int(max(df.at[idx, "general_cap_bucket"] - already, 0))
-        take = int(min(avail, remain_stable, 4))
-        if take > 0:
-            df.at[idx, "assigned_stable"] += take
-            remain_stable -= take
-
-    while remain_stable > 0:
-        assigned_any = False
+        if remain_crit > 0:
+            for idx, row in trauma_hospitals.iterrows():
+                if remain_crit <= 0:
+                    break
+                current_assigned = int(df.at[idx, "assigned_critical"])
+                can_take_more = int(min(row["trauma_cap_bucket"] - current_assigned, remain_crit))
+                if can_take_more > 0:
+                    df.at[idx, "assigned_critical"] += can_take_more
+                    remain_crit -= can_take_more
+
+        if remain_crit > 0:
+            other_hospitals = df[df["assigned_critical"] == 0].sort_values("total_score")
+            for idx, row in other_hospitals.iterrows():
+                if remain_crit <= 0:
+                    break
+                can_take = int(min(2, remain_crit))
+                if can_take > 0:
+                    df.at[idx, "assigned_critical"] += can_take
+                    remain_crit -= can_take
+
+        # Distribute stable patients
+        remain_stable = int(stable_patients)
         for idx, row in df.sort_values("total_score").iterrows():
             if remain_stable <= 0:
                 break
             already = int(df.at[idx, "assigned_critical"] + df.at[idx, "assigned_stable"])
             avail = int(max(df.at[idx, "general_cap_bucket"] - already, 0))
-            if avail > 0:
-                df.at[idx, "assigned_stable"] += 1
-                remain_stable -= 1
-                assigned_any = True
-        if not assigned_any:
-            print(f"⚠️  Warning: Could not assign {remain_stable} remaining stable patients")
-            break
-
-    # Recommendations per hospital
-    recs = []
-    for _, row in df.iterrows():
-        recs.append(
-            recommend_staff_and_supplies(
-                row,
-                pred_adm=row["pred_adm_next"],
-                pred_icu=row["pred_icu_next"],
-                pred_vent=row["pred_vent_next"],
-                critical_cases=row["assigned_critical"],
+            take = int(min(avail, remain_stable, 4))
+            if take > 0:
+                df.at[idx, "assigned_stable"] += take
+                remain_stable -= take
+
+        while remain_stable > 0:
+            assigned_any = False
+            for idx, row in df.sort_values("total_score").iterrows():
+                if remain_stable <= 0:
+                    break
+                already = int(df.at[idx, "assigned_critical"] + df.at[idx, "assigned_stable"])
+                avail = int(max(df.at[idx, "general_cap_bucket"] - already, 0))
+                if avail > 0:
+                    df.at[idx, "assigned_stable"] += 1
+                    remain_stable -= 1
+                    assigned_any = True
+            if not assigned_any:
+                logger.warning("Could not assign %s remaining stable patients", remain_stable)
+                break
+
+    with stage("recommendations"):
+        # Recommendations per hospital
+        recs = []
+        for _, row in df.iterrows():
+            recs.append(
+                recommend_staff_and_supplies(
+                    row,
+                    pred_adm=row["pred_adm_next"],
+                    pred_icu=row["pred_icu_next"],
+                    pred_vent=row["pred_vent_next"],
+                    critical_cases=row["assigned_critical"],
+                )
             )
-        )
-    df["recommendation"] = recs
+        df["recommendation"] = recs
 
     # Ensure there's a standard hospital_name column for output (try several common fields)
     if "hospital_name" not in df.columns:
@@ -586,12 +644,53 @@ def optimize_routing(latest, critical_patients, stable_patients, incident_locati
     scored = df[["hospital_id", "hospital_name", "travel_min","pred_adm_next","capacity_score","readiness_index","total_score"]].copy()
     return out, scored
 
+# -----------------------------------------------------------------------------
+# Pipeline (shared by the CLI and the API)
+# -----------------------------------------------------------------------------
+def resolve_scenario(choice) -> str:
+    """Map a menu choice ("1"-"4") or scenario name to a scenario name."""
+    choice = str(choice or "").strip().lower()
+    return SCENARIO_CHOICES.get(choice, choice if choice in SCENARIO_CHOICES.values() else "normal")
+
+def route_incident(latest, incident_location, critical_patients, stable_patients, scenario):
+    """
+    Scenario scaling, geocoded travel times and routing for one incident.
+    Returns (routing, scored, scaled_critical, scaled_stable).
+    """
+    scaled_crit, scaled_stable = apply_scenario(critical_patients, stable_patients, scenario)
+
+    with span("route_incident", hospitals=len(latest), scenario=scenario,
+              critical=scaled_crit, stable=scaled_stable) as sp:
+        # ---- Geocode → travel minutes & distances mapping (preferred) ----
+        with stage("geocode", location=incident_location):
+            incident_lat, incident_lon = geocode_location(incident_location)
+        travel_minutes = None
+        distances = None
+        if incident_lat is not None and incident_lon is not None:
+            with stage("travel_times", hospitals=len(latest)):
+                travel_minutes, distances = build_travel_minutes_from_geo(latest, incident_lat, incident_lon, speed_kmh=30.0)
+
+        routing, scored = optimize_routing(latest, scaled_crit, scaled_stable, incident_location, travel_minutes, distances)
+        sp.set(hospitals_used=len(routing), geocoded=incident_lat is not None)
+    return routing, scored, scaled_crit, scaled_stable
+
+def routing_payload(incident_location, scenario, scaled_crit, scaled_stable, routing, scored):
+    """The routing result as a plain dict (the input step6 builds the action plan from)."""
+    return {
+        "incident_location": incident_location,
+        "scenario": scenario,
+        "total_critical": scaled_crit,
+        "total_stable": scaled_stable,
+        "assignments": routing.to_dict(orient="records"),
+        "hospital_scores": scored.to_dict(orient="records"),
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
 # -----------------------------------------------------------------------------
 # Main
 # -----------------------------------------------------------------------------
 def main():
-    df = pd.read_csv(DATA_PATH, parse_dates=["timestamp"])
-    latest = latest_per_hospital(df)
+    latest = load_latest_snapshot()
 
     # ---- Inputs ----
     incident_location = input("Enter incident location (e.g. Marine Drive): ")
@@ -604,22 +703,12 @@ def main():
     print("3. Outbreak (both up)")
     print("4. Festival Crowd (stable spike)")
 
-    choice = input("Enter choice (1-4 or name): ").strip().lower()
-    scenario_map = {"1": "normal", "2": "accident", "3": "outbreak", "4": "festival"}
-    scenario = scenario_map.get(choice, choice if choice in {"normal","accident","outbreak","festival"} else "normal")
-
-    # Apply scenario scaling
-    scaled_crit, scaled_stable = apply_scenario(critical_patients, stable_patients, scenario)
-
-    # ---- Geocode → travel minutes & distances mapping (preferred) ----
-    incident_lat, incident_lon = geocode_location(incident_location)
-    travel_minutes = None
-    distances = None
-    if incident_lat is not None and incident_lon is not None:
-        travel_minutes, distances = build_travel_minutes_from_geo(latest, incident_lat, incident_lon, speed_kmh=30.0)
+    scenario = resolve_scenario(input("Enter choice (1-4 or name): "))
 
     # ---- Routing ----
-    routing, scored = optimize_routing(latest, scaled_crit, scaled_stable, incident_location, travel_minutes, distances)
+    routing, scored, scaled_crit, scaled_stable = route_incident(
+        latest, incident_location, critical_patients, stable_patients, scenario
+    )
 
     # ---- Output ----
     print("🏥 AI Emergency Load Balancer - Optimized Routing (IMPROVED)")
@@ -670,20 +759,12 @@ def main():
 
     # ---- Save JSON for Step 6 ----
     os.makedirs("plans", exist_ok=True)
-    output = {
-        "incident_location": incident_location,
-        "scenario": scenario,
-        "total_critical": scaled_crit,
-        "total_stable": scaled_stable,
-        "assignments": routing.to_dict(orient="records"),
-        # --- FIX IS HERE: Add the scoring data to the JSON output ---
-        "hospital_scores": scored.to_dict(orient="records"),
-        "generated_at": datetime.now().isoformat(timespec="seconds"),
-    }
+    output = routing_payload(incident_location, scenario, scaled_crit, scaled_stable, routing, scored)
     with open("plans/last_routing.json", "w") as f:
         json.dump(output, f, indent=2)
 
     print("💾 Saved routing → plans/last_routing.json")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     main()
@@ -4,226 +4,350 @@ import joblib
 from pathlib import Path
 from datetime import datetime, timedelta
 import numpy as np
-import random
+import warnings
 
-print("🔄 Loading historical data and models...")
+try:
+    from .feature_engine import build_features
+except ImportError:  # run as a script from backend/
+    from feature_engine import build_features
 
 # Paths
 DATA = Path("dataset/clean_snapshot.csv")
 FORECAST_OUT = Path("dataset/hospital_forecast.csv")
+BANDS_OUT = Path("dataset/hospital_forecast_bands.csv")
 MODELDIR = Path("models")
 
-# Load models
-adm_bundle = joblib.load(MODELDIR / "adm_model.joblib")
-icu_bundle = joblib.load(MODELDIR / "icu_model.joblib")
-vent_bundle = joblib.load(MODELDIR / "vent_model.joblib")
+# Forecast horizon
+FORECAST_DAYS = 7
 
-adm_model, adm_features = adm_bundle["model"], adm_bundle["features"]
-icu_model, icu_features = icu_bundle["model"], icu_bundle["features"]
-vent_model, vent_features = vent_bundle["model"], vent_bundle["features"]
+# Monte Carlo ensemble: reported percentiles and max rows per batched predict
+PERCENTILES = (10, 50, 90)
+ENSEMBLE_BATCH_ROWS = 50_000
 
-print("✅ Loaded models with features:")
-print(f"Admissions model features: {len(adm_features)}")
-print(f"ICU model features: {len(icu_features)}")
-print(f"Ventilator model features: {len(vent_features)}")
+TARGETS = ("adm", "icu", "vent")
 
-# Load dataset
-df = pd.read_csv(DATA)
-df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+# Category levels for the one-hot columns the models were trained on
+SEASONS = ['Winter', 'Spring', 'Summer', 'Fall']
+WEATHERS = ['Clear', 'Rainy', 'Snowy', 'Stormy']
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+FESTIVALS = ['None', 'Small', 'Medium', 'Large']
+OUTBREAKS = ['None', 'Mild', 'Moderate', 'Severe']
 
-# Convert all columns to numeric where possible
-for col in df.columns:
-    if col not in ['timestamp', 'hospital_id']:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-        df[col] = df[col].fillna(0)
+# Sampling weights for the scenario drivers (mostly clear / no festival / no outbreak)
+WEATHER_CHOICES = np.array([1, 1, 1, 2, 2, 3, 4])
+FESTIVAL_CHOICES = np.array([0, 0, 0, 0, 1, 2, 3])
+OUTBREAK_CHOICES = np.array([0, 0, 0, 0, 1, 2])
 
-# Forecast horizon
-FORECAST_DAYS = 7
-forecast_start = datetime.now().date()
-print(f"📅 Forecast start date: {forecast_start}")
-print(f"📆 Forecasting {FORECAST_DAYS} days for each hospital")
-
-# Get all expected features
-all_features = sorted(set(adm_features + icu_features + vent_features))
-print(f"📊 Total unique features expected: {len(all_features)}")
-
-# Store forecasts for all hospitals
-all_forecasts = []
-
-# Process each hospital
-for hid, group in df.groupby("hospital_id"):
-    group = group.sort_values("timestamp").dropna(subset=["timestamp"])
-    if group.empty:
-        continue
-
-    print(f"\n🏥 Hospital {hid} - Processing...")
-    
-    # Use the last available data for this hospital
-    last_data = group.iloc[-1:].copy()
-    
-    # Get hospital-specific baseline for realistic predictions
-    avg_admissions = group['admissions'].mean() if 'admissions' in group.columns else 5
-    avg_emergency = group['emergency_cases'].mean() if 'emergency_cases' in group.columns else 10
-    
-    forecasts = []
-    current_state = last_data.copy()
-    
-    for day in range(1, FORECAST_DAYS + 1):
-        forecast_date = forecast_start + timedelta(days=day)
-        
-        # Create prediction row from current state
-        pred_row = current_state.copy()
-        pred_row["timestamp"] = pd.to_datetime(forecast_date)
-        
-        # Update time-based features
-        pred_row["day_of_week"] = forecast_date.weekday()
-        pred_row["month"] = forecast_date.month
-        pred_row["day"] = forecast_date.day
-        pred_row["is_weekend"] = 1 if forecast_date.weekday() >= 5 else 0
-        
-        # Season calculation
-        month = forecast_date.month
-        if month in [12, 1, 2]:
-            season = 1  # Winter
-        elif month in [3, 4, 5]:
-            season = 2  # Spring
-        elif month in [6, 7, 8]:
-            season = 3  # Summer
+
+def load_models(modeldir=MODELDIR):
+    """Load the three step4 bundles -> {"adm": (model, features), ...}."""
+    models = {}
+    for name in TARGETS:
+        bundle = joblib.load(Path(modeldir) / f"{name}_model.joblib")
+        models[name] = (bundle["model"], list(bundle["features"]))
+    return models
+
+
+def load_history(data=DATA):
+    """Snapshot history with every non-key column numeric and lag features computed."""
+    df = pd.read_csv(data)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+
+    # Convert all columns to numeric where possible
+    for col in df.columns:
+        if col not in ['timestamp', 'hospital_id']:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+    # Lag/rolling features computed exactly as in training
+    return build_features(df)
+
+
+def _season_of(month):
+    if month in [12, 1, 2]:
+        return 1  # Winter
+    if month in [3, 4, 5]:
+        return 2  # Spring
+    if month in [6, 7, 8]:
+        return 3  # Summer
+    return 4  # Fall
+
+
+class ForecastEngine:
+    """
+    Batched multi-hospital forecaster.
+
+    Holds one state row per hospital as a NumPy matrix over the union of model
+    features. Each horizon step builds the feature matrix for every hospital at
+    once, runs one predict per target and advances the state with array ops.
+    """
+
+    def __init__(self, history: pd.DataFrame, models: dict):
+        self.models = models
+        self.features = sorted(set().union(*(feats for _, feats in models.values())))
+        self.col = {f: i for i, f in enumerate(self.features)}
+        self.model_idx = {
+            name: np.array([self.col[f] for f in feats]) for name, (_, feats) in models.items()
+        }
+
+        history = history.dropna(subset=["timestamp"])
+        last = history.groupby("hospital_id", sort=True).tail(1).set_index("hospital_id")
+        self.hospital_ids = last.index.to_numpy()
+
+        # Hospital-specific baseline for realistic emergency volumes
+        if "emergency_cases" in history.columns:
+            self.avg_emergency = history.groupby("hospital_id")["emergency_cases"].mean().reindex(last.index).to_numpy()
         else:
-            season = 4  # Fall
-        pred_row["season"] = season
-        
-        # Set realistic defaults with some variation
-        defaults = {
-            'weather': random.choice([1, 1, 1, 2, 2, 3, 4]),  # Mostly clear, some variation
-            'festival': random.choice([0, 0, 0, 0, 1, 2, 3]),  # Mostly no festival
-            'outbreak': random.choice([0, 0, 0, 0, 1, 2]),     # Mostly no outbreak
-            'emergency_cases': max(5, avg_emergency * random.uniform(0.8, 1.5)),
-            'staff_availability': random.uniform(0.7, 0.95),
-            'aqi': random.randint(30, 80)
+            self.avg_emergency = np.full(len(last), 10.0)
+
+        numeric = [c for c in last.columns if c in self.col and c != "timestamp"]
+        self.base = np.zeros((len(last), len(self.features)))
+        for c in numeric:
+            self.base[:, self.col[c]] = pd.to_numeric(last[c], errors="coerce").fillna(0).to_numpy()
+
+        # occupancy/state columns advanced between steps
+        self.occupied = last["occupied_beds"].to_numpy(dtype=float) if "occupied_beds" in last.columns else np.zeros(len(last))
+        self.total_beds = last["total_beds"].to_numpy(dtype=float) if "total_beds" in last.columns else np.full(len(last), 250.0)
+
+    def _set(self, X, name, values):
+        i = self.col.get(name)
+        if i is not None:
+            X[:, i] = values
+
+    def _one_hot(self, X, prefix, levels, codes, offset=0):
+        """One-hot `codes` (level k has code k + offset); unknown codes fall back to levels[0]."""
+        idx = np.asarray(codes, dtype=int) - offset
+        idx = np.where((idx >= 0) & (idx < len(levels)), idx, 0)
+        for k, level in enumerate(levels):
+            self._set(X, f"{prefix}_{level}", (idx == k).astype(float))
+
+    def feature_matrix(self, state: np.ndarray, forecast_date, drivers: dict) -> np.ndarray:
+        """Features for one horizon step: current state + calendar + sampled scenario drivers."""
+        n = state.shape[0]
+        X = state.copy()
+        weekday = forecast_date.weekday()
+        season = _season_of(forecast_date.month)
+
+        # Update time-based features
+        self._set(X, "day_of_week", weekday)
+        self._set(X, "month", forecast_date.month)
+        self._set(X, "day", forecast_date.day)
+        self._set(X, "is_weekend", 1 if weekday >= 5 else 0)
+        self._set(X, "season", season)
+
+        for name, values in drivers.items():
+            self._set(X, name, values)
+
+        self._one_hot(X, "season", SEASONS, np.full(n, season), offset=1)
+        self._one_hot(X, "weather", WEATHERS, drivers["weather"], offset=1)
+        self._one_hot(X, "day_of_week", DAYS, np.full(n, weekday))
+        self._one_hot(X, "festival", FESTIVALS, drivers["festival"])
+        self._one_hot(X, "outbreak", OUTBREAKS, drivers["outbreak"])
+        return X
+
+    def sample_drivers(self, rng, n, avg_emergency):
+        """Random weather/festival/outbreak/etc. for n rows."""
+        return {
+            'weather': rng.choice(WEATHER_CHOICES, n),
+            'festival': rng.choice(FESTIVAL_CHOICES, n),
+            'outbreak': rng.choice(OUTBREAK_CHOICES, n),
+            'emergency_cases': np.maximum(5, avg_emergency * rng.uniform(0.8, 1.5, n)),
+            'staff_availability': rng.uniform(0.7, 0.95, n),
+            'aqi': rng.integers(30, 81, n),
         }
-        
-        for col, default_val in defaults.items():
-            if col in pred_row.columns:
-                pred_row[col] = default_val
-            else:
-                pred_row[col] = default_val
-        
-        # Create feature vector with proper one-hot encoding
-        feature_dict = {}
-        
-        # Add all numeric features
-        numeric_cols = [col for col in pred_row.columns if col not in ['timestamp', 'hospital_id']]
-        for col in numeric_cols:
-            if col in all_features:
-                feature_dict[col] = float(pred_row[col].iloc[0])
-        
-        # Create one-hot encoded features
-        season_map = {1: 'Winter', 2: 'Spring', 3: 'Summer', 4: 'Fall'}
-        weather_map = {1: 'Clear', 2: 'Rainy', 3: 'Snowy', 4: 'Stormy'}
-        day_map = {0: 'Monday', 1: 'Tuesday', 2: 'Wednesday', 3: 'Thursday', 
-                  4: 'Friday', 5: 'Saturday', 6: 'Sunday'}
-        festival_map = {0: 'None', 1: 'Small', 2: 'Medium', 3: 'Large'}
-        outbreak_map = {0: 'None', 1: 'Mild', 2: 'Moderate', 3: 'Severe'}
-        
-        # Season one-hot
-        current_season = season_map.get(season, 'Winter')
-        for s in ['Winter', 'Spring', 'Summer', 'Fall']:
-            feature_dict[f'season_{s}'] = 1 if s == current_season else 0
-        
-        # Weather one-hot
-        weather_val = int(pred_row.get('weather', 1).iloc[0])
-        current_weather = weather_map.get(weather_val, 'Clear')
-        for w in ['Clear', 'Rainy', 'Snowy', 'Stormy']:
-            feature_dict[f'weather_{w}'] = 1 if w == current_weather else 0
-        
-        # Day of week one-hot
-        dow_val = int(pred_row['day_of_week'].iloc[0])
-        current_dow = day_map.get(dow_val, 'Monday')
-        for d in ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']:
-            feature_dict[f'day_of_week_{d}'] = 1 if d == current_dow else 0
-        
-        # Festival one-hot
-        festival_val = int(pred_row.get('festival', 0).iloc[0])
-        current_festival = festival_map.get(festival_val, 'None')
-        for f in ['None', 'Small', 'Medium', 'Large']:
-            feature_dict[f'festival_{f}'] = 1 if f == current_festival else 0
-        
-        # Outbreak one-hot
-        outbreak_val = int(pred_row.get('outbreak', 0).iloc[0])
-        current_outbreak = outbreak_map.get(outbreak_val, 'None')
-        for o in ['None', 'Mild', 'Moderate', 'Severe']:
-            feature_dict[f'outbreak_{o}'] = 1 if o == current_outbreak else 0
-        
-        # Fill missing features with 0
-        for feature in all_features:
-            if feature not in feature_dict:
-                feature_dict[feature] = 0
-        
-        # Create feature DataFrame
-        feature_df = pd.DataFrame([feature_dict])
-        
-        # Make predictions
-        X_adm = feature_df.reindex(columns=adm_features, fill_value=0)
-        X_icu = feature_df.reindex(columns=icu_features, fill_value=0)
-        X_vent = feature_df.reindex(columns=vent_features, fill_value=0)
-        
-        # Get base predictions
-        base_pred_adm = max(0, float(adm_model.predict(X_adm)[0]))
-        base_pred_icu = max(0, float(icu_model.predict(X_icu)[0]))
-        base_pred_vent = max(0, float(vent_model.predict(X_vent)[0]))
-        
+
+    def predict(self, X: np.ndarray) -> dict:
+        """One batched predict call per target over all rows of X."""
+        out = {}
+        for name, (model, feats) in self.models.items():
+            # The column gather puts features in the model's training order and
+            # yields a column-major copy, which the tree predictors walk several
+            # times faster than row-major input. Passing the bare array also skips
+            # sklearn's per-column DataFrame validation.
+            with warnings.catch_warnings():
+                warnings.filterwarnings("ignore", message="X does not have valid feature names")
+                pred = model.predict(X[:, self.model_idx[name]])
+            out[name] = np.maximum(0, np.asarray(pred, dtype=float))
+        return out
+
+    def step(self, state, occupied, total_beds, forecast_date, rng, avg_emergency):
+        """Advance every row one day. Returns (predictions dict, new_state, new_occupied)."""
+        n = state.shape[0]
+        X = self.feature_matrix(state, forecast_date, self.sample_drivers(rng, n, avg_emergency))
+        base = self.predict(X)
+
         # Add realistic variation to avoid zeros
-        pred_adm = max(1, base_pred_adm + random.randint(0, 5))
-        pred_icu = max(0, base_pred_icu + random.randint(0, 2))
-        pred_vent = max(0, base_pred_vent + random.randint(0, 1))
-        
-        # Calculate occupancy
-        current_occupied = float(current_state["occupied_beds"].iloc[0]) if "occupied_beds" in current_state.columns else 0
-        total_beds = float(current_state["total_beds"].iloc[0]) if "total_beds" in current_state.columns else 250
-        
+        pred_adm = np.maximum(1, base["adm"] + rng.integers(0, 6, n))
+        pred_icu = np.maximum(0, base["icu"] + rng.integers(0, 3, n))
+        pred_vent = np.maximum(0, base["vent"] + rng.integers(0, 2, n))
+
         # Realistic occupancy model
-        estimated_discharges = current_occupied * 0.12
-        new_occupied = current_occupied + pred_adm - estimated_discharges
-        new_occupied = max(0, min(total_beds, new_occupied))
-        
-        # Store forecast
-        forecasts.append({
-            "hospital_id": hid,
-            "date": forecast_date,
-            "predicted_admissions": round(pred_adm),
-            "predicted_icu": round(pred_icu),
-            "predicted_ventilators": round(pred_vent),
-            "predicted_occupied_beds": round(new_occupied),
-            "available_beds": round(total_beds - new_occupied),
-            "occupancy_rate": round((new_occupied / total_beds) * 100, 1) if total_beds > 0 else 0
-        })
-        
+        estimated_discharges = occupied * 0.12
+        new_occupied = np.clip(occupied + pred_adm - estimated_discharges, 0, total_beds)
+
         # Update state for next iteration
-        current_state["occupied_beds"] = new_occupied
-        current_state["admissions"] = pred_adm
-        current_state["icu_occupied"] = pred_icu
-        current_state["ventilators_used"] = pred_vent
-    
-    all_forecasts.extend(forecasts)
-
-# Save all forecasts
-forecast_df = pd.DataFrame(all_forecasts)
-forecast_df.to_csv(FORECAST_OUT, index=False)
-
-print("\n📊 Forecast Summary:")
-print("=" * 80)
-for hid in forecast_df['hospital_id'].unique():
-    hospital_forecast = forecast_df[forecast_df['hospital_id'] == hid]
-    print(f"\n🏥 {hid} - {FORECAST_DAYS}-Day Forecast:")
-    print("-" * 40)
-    for _, row in hospital_forecast.iterrows():
-        print(f"📅 {row['date']}: {row['predicted_admissions']} admissions, "
-              f"{row['predicted_icu']} ICU, {row['predicted_ventilators']} vents, "
-              f"{row['predicted_occupied_beds']}/{row['available_beds'] + row['predicted_occupied_beds']} beds "
-              f"({row['occupancy_rate']}%)")
-
-print(f"\n✅ Forecast saved to {FORECAST_OUT}")
-print(f"📈 Total forecast records: {len(forecast_df)}")
-print(f"🏥 Hospitals forecasted: {forecast_df['hospital_id'].nunique()}")
-print(f"📅 Forecast period: {FORECAST_DAYS} days from {forecast_start}")
\ No newline at end of file
+        state = state.copy()
+        self._set(state, "occupied_beds", new_occupied)
+        self._set(state, "admissions", pred_adm)
+        self._set(state, "icu_occupied", pred_icu)
+        self._set(state, "ventilators_used", pred_vent)
+
+        preds = {"adm": pred_adm, "icu": pred_icu, "vent": pred_vent}
+        return preds, state, new_occupied
+
+    def run(self, days=FORECAST_DAYS, start=None, seed=None) -> pd.DataFrame:
+        """Single-trajectory forecast for all hospitals -> long DataFrame (hospital x day)."""
+        rng = np.random.default_rng(seed)
+        start = start or datetime.now().date()
+        state, occupied = self.base, self.occupied
+        frames = []
+        for day in range(1, days + 1):
+            forecast_date = start + timedelta(days=day)
+            preds, state, occupied = self.step(state, occupied, self.total_beds, forecast_date, rng, self.avg_emergency)
+            occ_rate = np.where(self.total_beds > 0, np.round(occupied / np.maximum(self.total_beds, 1e-9) * 100, 1), 0)
+            frames.append(pd.DataFrame({
+                "hospital_id": self.hospital_ids,
+                "date": forecast_date,
+                "predicted_admissions": np.round(preds["adm"]).astype(int),
+                "predicted_icu": np.round(preds["icu"]).astype(int),
+                "predicted_ventilators": np.round(preds["vent"]).astype(int),
+                "predicted_occupied_beds": np.round(occupied).astype(int),
+                "available_beds": np.round(self.total_beds - occupied).astype(int),
+                "occupancy_rate": occ_rate,
+            }))
+        out = pd.concat(frames, ignore_index=True)
+        return out.sort_values(["hospital_id", "date"], kind="stable").reset_index(drop=True)
+
+    def run_ensemble(self, n_paths=1000, days=FORECAST_DAYS, start=None, seed=None,
+                     percentiles=PERCENTILES, batch_rows=ENSEMBLE_BATCH_ROWS) -> pd.DataFrame:
+        """
+        Monte Carlo scenario ensemble -> percentile bands per hospital and day.
+
+        Every hospital is replicated `n_paths` times; each path samples its own
+        weather/festival/outbreak/noise trajectory. Paths are pushed through the
+        same batched step as `run`, in blocks of at most `batch_rows` rows so the
+        feature matrix stays bounded. Seeded for reproducible bands.
+        """
+        rng = np.random.default_rng(seed)
+        start = start or datetime.now().date()
+        n_hosp = len(self.hospital_ids)
+        paths_per_block = max(1, batch_rows // max(n_hosp, 1))
+
+        # results[metric] has shape (days, hospitals, paths)
+        metrics = ("admissions", "icu", "ventilators", "occupied_beds")
+        results = {m: np.empty((days, n_hosp, n_paths), dtype=np.float32) for m in metrics}
+
+        for p0 in range(0, n_paths, paths_per_block):
+            p1 = min(n_paths, p0 + paths_per_block)
+            reps = p1 - p0
+            # row layout: hospital-major, path-minor
+            state = np.repeat(self.base, reps, axis=0)
+            occupied = np.repeat(self.occupied, reps)
+            total_beds = np.repeat(self.total_beds, reps)
+            avg_emergency = np.repeat(self.avg_emergency, reps)
+            for day in range(days):
+                forecast_date = start + timedelta(days=day + 1)
+                preds, state, occupied = self.step(state, occupied, total_beds, forecast_date, rng, avg_emergency)
+                results["admissions"][day, :, p0:p1] = preds["adm"].reshape(n_hosp, reps)
+                results["icu"][day, :, p0:p1] = preds["icu"].reshape(n_hosp, reps)
+                results["ventilators"][day, :, p0:p1] = preds["vent"].reshape(n_hosp, reps)
+                results["occupied_beds"][day, :, p0:p1] = occupied.reshape(n_hosp, reps)
+
+        dates = [start + timedelta(days=d + 1) for d in range(days)]
+        out = pd.DataFrame({
+            "hospital_id": np.tile(self.hospital_ids, days),
+            "date": np.repeat(dates, n_hosp),
+        })
+        for m in metrics:
+            bands = np.percentile(results[m], percentiles, axis=2)  # (len(percentiles), days, hospitals)
+            for q, band in zip(percentiles, bands):
+                out[f"{m}_p{q}"] = np.round(band.reshape(-1), 1)
+        occ = np.percentile(results["occupied_beds"], percentiles, axis=2)
+        beds = np.maximum(self.total_beds, 1e-9)
+        for q, band in zip(percentiles, occ):
+            out[f"occupancy_rate_p{q}"] = np.round((band / beds).reshape(-1) * 100, 1)
+        out["paths"] = n_paths
+        return out.sort_values(["hospital_id", "date"], kind="stable").reset_index(drop=True)
+
+
+def forecast_all(history=None, models=None, days=FORECAST_DAYS, start=None, seed=None):
+    """Forecast every hospital `days` ahead in batched steps."""
+    history = load_history() if history is None else history
+    models = load_models() if models is None else models
+    return ForecastEngine(history, models).run(days=days, start=start, seed=seed)
+
+
+def forecast_bands(history=None, models=None, n_paths=1000, days=FORECAST_DAYS, start=None, seed=None):
+    """p10/p50/p90 bands for every hospital from a seeded Monte Carlo ensemble."""
+    history = load_history() if history is None else history
+    models = load_models() if models is None else models
+    return ForecastEngine(history, models).run_ensemble(n_paths=n_paths, days=days, start=start, seed=seed)
+
+
+def print_summary(forecast_df, days):
+    print("\n📊 Forecast Summary:")
+    print("=" * 80)
+    for hid, hospital_forecast in forecast_df.groupby("hospital_id", sort=False):
+        print(f"\n🏥 {hid} - {days}-Day Forecast:")
+        print("-" * 40)
+        for row in hospital_forecast.itertuples(index=False):
+            print(f"📅 {row.date}: {row.predicted_admissions} admissions, "
+                  f"{row.predicted_icu} ICU, {row.predicted_ventilators} vents, "
+                  f"{row.predicted_occupied_beds}/{row.available_beds + row.predicted_occupied_beds} beds "
+                  f"({row.occupancy_rate}%)")
+
+
+def print_bands_summary(bands_df, days, n_paths):
+    print(f"\n📊 Forecast Bands (p10 / p50 / p90 over {n_paths} scenario paths):")
+    print("=" * 80)
+    for hid, hospital_bands in bands_df.groupby("hospital_id", sort=False):
+        print(f"\n🏥 {hid} - {days}-Day Forecast:")
+        print("-" * 40)
+        for row in hospital_bands.itertuples(index=False):
+            print(f"📅 {row.date}: admissions {row.admissions_p10:g}/{row.admissions_p50:g}/{row.admissions_p90:g}, "
+                  f"ICU {row.icu_p10:g}/{row.icu_p50:g}/{row.icu_p90:g}, "
+                  f"vents {row.ventilators_p10:g}/{row.ventilators_p50:g}/{row.ventilators_p90:g}, "
+                  f"occupancy {row.occupancy_rate_p10}-{row.occupancy_rate_p90}%")
+
+
+def main(days=FORECAST_DAYS, seed=None, paths=None):
+    print("🔄 Loading historical data and models...")
+    models = load_models()
+    print("✅ Loaded models with features:")
+    print(f"Admissions model features: {len(models['adm'][1])}")
+    print(f"ICU model features: {len(models['icu'][1])}")
+    print(f"Ventilator model features: {len(models['vent'][1])}")
+
+    history = load_history()
+    forecast_start = datetime.now().date()
+    print(f"📅 Forecast start date: {forecast_start}")
+    print(f"📆 Forecasting {days} days for each hospital")
+
+    if paths:
+        bands_df = forecast_bands(history, models, n_paths=paths, days=days, start=forecast_start, seed=seed)
+        bands_df.to_csv(BANDS_OUT, index=False)
+        print_bands_summary(bands_df, days, paths)
+        print(f"\n✅ Forecast bands saved to {BANDS_OUT}")
+        print(f"🏥 Hospitals forecasted: {bands_df['hospital_id'].nunique()}")
+        return bands_df
+
+    forecast_df = forecast_all(history, models, days=days, start=forecast_start, seed=seed)
+    forecast_df.to_csv(FORECAST_OUT, index=False)
+
+    print_summary(forecast_df, days)
+    print(f"\n✅ Forecast saved to {FORECAST_OUT}")
+    print(f"📈 Total forecast records: {len(forecast_df)}")
+    print(f"🏥 Hospitals forecasted: {forecast_df['hospital_id'].nunique()}")
+    print(f"📅 Forecast period: {days} days from {forecast_start}")
+    return forecast_df
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Forecast admissions/ICU/ventilators for every hospital")
+    parser.add_argument("--days", type=int, default=FORECAST_DAYS)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--paths", type=int, default=None,
+                        help="run a Monte Carlo ensemble with this many scenario paths and write p10/p50/p90 bands")
+    args = parser.parse_args()
+    main(days=args.days, seed=args.seed, paths=args.paths)
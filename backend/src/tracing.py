@@ -0,0 +1,297 @@
+"""
+Request tracing: unique ids and nested spans through incident and plan flows.
+
+The current span lives in a contextvar, so `with span("geocode"): ...` nests
+under whatever is open in the same thread without passing ids around. Work
+handed to another thread (plan jobs, the plan writer) carries `capture()` and
+reopens it there with `continue_trace(parent, name)`.
+
+Outside a trace, span() is a no-op, so pipeline code run from scripts and
+benchmarks pays one contextvar lookup per stage.
+
+Finished spans go to `collector`, which keeps the most recent traces in
+memory for /api/admin/traces and appends every span as one JSON line to
+TRACE_EXPORT_PATH from a background thread (a local collector file that can be
+tailed or shipped elsewhere). At most TRACE_QUEUE_SIZE spans wait for export;
+when the exporter falls behind further, new spans are dropped (and counted)
+instead of piling up in memory.
+"""
+import os
+import json
+import time
+import queue
+import random
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+# Empty string disables the file export (in-memory traces only)
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", os.path.join(BACKEND_DIR, "traces", "spans.jsonl"))
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_RECENT = int(os.getenv("TRACE_RECENT", "200"))
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+def new_id(nbytes=16):
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "end", "attributes", "status", "error", "thread")
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.end = None
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.error = None
+        self.thread = threading.current_thread().name
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    @property
+    def duration_ms(self):
+        return round(((self.end or time.time()) - self.start) * 1000, 3)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "thread": self.thread,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    trace_id = None
+    span_id = None
+
+    def set(self, **attributes):
+        return self
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+# -----------------------------------------------------------------------------
+# Opening and closing spans
+# -----------------------------------------------------------------------------
+def begin(name, trace_id=None, parent_id=None, **attributes):
+    """
+    Open a root span (a new trace unless trace_id is given) and make it current.
+    Returns (span, token) for finish(); (NOOP_SPAN, None) when not traced.
+    """
+    if not TRACING_ENABLED:
+        return NOOP_SPAN, None
+    if trace_id is None and TRACE_SAMPLE_RATE < 1.0 and random.random() >= TRACE_SAMPLE_RATE:
+        return NOOP_SPAN, None
+    sp = Span(name, trace_id or new_id(), parent_id, attributes)
+    return sp, _current.set(sp)
+
+
+def finish(sp, token, error=None):
+    if sp is NOOP_SPAN:
+        return
+    sp.end = time.time()
+    if error is not None:
+        sp.status = "error"
+        sp.error = f"{type(error).__name__}: {error}"
+    if token is not None:
+        _current.reset(token)
+    collector.record(sp)
+
+
+@contextmanager
+def _open(sp, token):
+    try:
+        yield sp
+    except BaseException as e:
+        finish(sp, token, e)
+        raise
+    else:
+        finish(sp, token)
+
+
+def trace(name, trace_id=None, parent_id=None, **attributes):
+    """Context manager for a root span."""
+    sp, token = begin(name, trace_id, parent_id, **attributes)
+    if sp is NOOP_SPAN:
+        return _noop()
+    return _open(sp, token)
+
+
+def span(name, **attributes):
+    """Context manager for a child of the current span; a no-op outside a trace."""
+    parent = _current.get()
+    if parent is None:
+        return _noop()
+    sp = Span(name, parent.trace_id, parent.span_id, attributes)
+    return _open(sp, _current.set(sp))
+
+
+@contextmanager
+def _noop():
+    yield NOOP_SPAN
+
+
+def current_span():
+    return _current.get() or NOOP_SPAN
+
+
+def current_trace_id():
+    sp = _current.get()
+    return sp.trace_id if sp is not None else None
+
+
+def capture():
+    """(trace_id, span_id) of the current span, to continue the trace on another thread."""
+    sp = _current.get()
+    return (sp.trace_id, sp.span_id) if sp is not None else None
+
+
+def continue_trace(parent, name, **attributes):
+    """Open `name` as a child of a captured span (e.g. in a worker thread); no-op if parent is None."""
+    if parent is None:
+        return _noop()
+    return trace(name, trace_id=parent[0], parent_id=parent[1], **attributes)
+
+
+# -----------------------------------------------------------------------------
+# Collection and export
+# -----------------------------------------------------------------------------
+class SpanCollector:
+    def __init__(self, path=TRACE_EXPORT_PATH, recent=TRACE_RECENT, max_bytes=TRACE_FILE_MAX_BYTES,
+                 queue_size=TRACE_QUEUE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._recent = OrderedDict()  # trace_id -> [span dicts]
+        self._recent_limit = recent
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self.exported = 0
+        self.dropped = 0  # spans whose export write failed
+        self.overflowed = 0  # spans dropped because the export queue was full
+
+    def record(self, sp):
+        data = sp.to_dict()
+        with self._lock:
+            spans = self._recent.get(sp.trace_id)
+            if spans is None:
+                spans = self._recent[sp.trace_id] = []
+                while len(self._recent) > self._recent_limit:
+                    self._recent.popitem(last=False)
+            spans.append(data)
+        if self.path:
+            if self._thread is None or not self._thread.is_alive():
+                self._start()
+            try:
+                self._queue.put_nowait(data)
+            except queue.Full:
+                self.overflowed += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 500:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.warning(f"Could not export {len(batch)} spans to {self.path}: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        try:
+            if os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+        except FileNotFoundError:
+            pass
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(d, default=str) + "\n" for d in batch))
+
+    def flush(self):
+        self._queue.join()
+
+    def get_trace(self, trace_id):
+        with self._lock:
+            spans = list(self._recent.get(trace_id, ()))
+        return sorted(spans, key=lambda s: s["start_time"])
+
+    def recent(self, min_ms=0.0, name=None, limit=50):
+        """Root-span summaries of recent traces, newest first, with each trace's slowest child span."""
+        with self._lock:
+            traces = [list(spans) for spans in self._recent.values()]
+        out = []
+        for spans in reversed(traces):
+            roots = [s for s in spans if s["parent_id"] is None]
+            if not roots:
+                continue  # root still open
+            root = roots[0]
+            if root["duration_ms"] < min_ms or (name and name not in root["name"]):
+                continue
+            children = [s for s in spans if s["parent_id"] is not None]
+            slowest = max(children, key=lambda s: s["duration_ms"], default=None)
+            out.append({
+                "trace_id": root["trace_id"],
+                "name": root["name"],
+                "start_time": root["start_time"],
+                "duration_ms": root["duration_ms"],
+                "status": root["status"],
+                "attributes": root["attributes"],
+                "span_count": len(spans),
+                "slowest_span": {"name": slowest["name"], "duration_ms": slowest["duration_ms"],
+                                 "attributes": slowest["attributes"]} if slowest else None,
+            })
+            if len(out) >= limit:
+                break
+        return out
+
+    def stats(self):
+        return {
+            "enabled": TRACING_ENABLED,
+            "sample_rate": TRACE_SAMPLE_RATE,
+            "export_path": self.path or None,
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "overflowed": self.overflowed,
+            "pending": self._queue.unfinished_tasks,
+        }
+
+
+collector = SpanCollector()
@@ -9,9 +9,9 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 # Import the correct, powerful functions from your agent logic file
+from feature_engine import latest_with_features
 from step5_agent_logic import (
     optimize_routing,
-    latest_per_hospital,
     geocode_location,
     build_travel_minutes_from_geo,
     apply_scenario,
@@ -34,7 +34,7 @@ def run_routing(location: str, critical: int, stable: int, scenario: str):
 
     print(f"✅ Using cleaned hospital dataset: {dataset_path}")
     df = pd.read_csv(dataset_path, parse_dates=["timestamp"])
-    latest_df = latest_per_hospital(df)
+    latest_df = latest_with_features(df)
 
     # 1. Apply scenario scaling to patient numbers
     scaled_crit, scaled_stable = apply_scenario(critical, stable, scenario)